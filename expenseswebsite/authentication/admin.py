@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import OutboxEmail
 
-# Register your models here.
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to')
+
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
@@ -0,0 +1,31 @@
+from django.core.cache import cache
+from django.contrib.auth.backends import ModelBackend
+
+
+# how long a loaded user is reused; saving or deleting the user drops it straight away
+USER_CACHE_TIMEOUT = 60 * 15
+
+
+def user_cache_key(user_id):
+    return 'auth_user_%s' % user_id
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user(), run by every authenticated request, is answered from the cache."""
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, USER_CACHE_TIMEOUT)
+            return user
+
+        # the same check ModelBackend applies to users it loads
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,187 @@
+import uuid
+import logging
+import threading
+import datetime
+from django.conf import settings
+from django.utils import timezone
+from django.db import transaction, connection
+from django.db.models import Min
+from .models import OutboxEmail
+from concurrent.futures import ThreadPoolExecutor
+from django.core.mail import EmailMessage, get_connection
+
+
+logger = logging.getLogger(__name__)
+
+# a claimed email is retried after this long if its sender died before finishing
+CLAIM_TIMEOUT = datetime.timedelta(minutes = 10)
+
+
+def queue_email(subject, body, from_email, to):
+    """Store an email in the outbox and wake the sender pool once the transaction commits."""
+    email = OutboxEmail.objects.create(subject = subject, body = body, from_email = from_email, to = to)
+    transaction.on_commit(sender_pool.wake)
+    return email
+
+
+def retry_delay(attempts):
+    # exponential backoff: base, 2 x base, 4 x base, ...
+    return datetime.timedelta(seconds = settings.EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size):
+    """Claim up to batch_size due emails for this sender and return them.
+
+    The claim is one conditional UPDATE: it only takes rows that are still due and moves them out of
+    reach (status sending, next_attempt_at pushed forward) in the same statement, so a row is claimed
+    once however many senders race for it, on any database. A claim left behind by a sender that died
+    is due again after CLAIM_TIMEOUT.
+    """
+    while True:
+        now = timezone.now()
+        claim = uuid.uuid4().hex
+        due = OutboxEmail.objects.filter(status__in = [OutboxEmail.PENDING, OutboxEmail.SENDING],
+                                         next_attempt_at__lte = now)
+        ids = list(due.order_by('next_attempt_at').values_list('id', flat = True)[:batch_size])
+        if not ids:
+            return []
+        
+        claimed = due.filter(id__in = ids).update(status = OutboxEmail.SENDING, claimed_by = claim,
+                                                  next_attempt_at = now + CLAIM_TIMEOUT)
+        # another sender took every one of these first: look again
+        if claimed:
+            return list(OutboxEmail.objects.filter(status = OutboxEmail.SENDING, claimed_by = claim))
+
+
+def record_failure(email, error):
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        email.status = OutboxEmail.FAILED
+    else:
+        email.status = OutboxEmail.PENDING
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+
+
+def send_batch(emails, backend = None):
+    """Deliver emails over one connection; returns the number sent."""
+    sent = 0
+    mail_connection = get_connection(backend)
+    
+    for email in emails:
+        email.attempts += 1
+    
+    try:
+        mail_connection.open()
+    except Exception as ex:
+        # could not reach the mail server: the whole batch is retried later
+        for email in emails:
+            record_failure(email, ex)
+    else:
+        try:
+            for email in emails:
+                message = EmailMessage(email.subject, email.body, email.from_email, email.to,
+                                       connection = mail_connection)
+                try:
+                    mail_connection.send_messages([message])
+                except Exception as ex:
+                    record_failure(email, ex)
+                else:
+                    email.status = OutboxEmail.SENT
+                    email.sent_at = timezone.now()
+                    sent += 1
+        finally:
+            mail_connection.close()
+                
+    for email in emails:
+        email.claimed_by = ''
+    OutboxEmail.objects.bulk_update(emails, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'claimed_by'])
+    return sent
+
+
+def drain_outbox(batch_size = None, backend = None):
+    """Send every due email, one batch (and one SMTP connection) at a time."""
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    total = 0
+    
+    while True:
+        emails = claim_batch(batch_size)
+        if not emails:
+            return total
+        total += send_batch(emails, backend)
+
+
+def next_due():
+    """When the earliest email still to send is due (a retry's backoff, or an expired claim), or None."""
+    return OutboxEmail.objects.filter(status__in = [OutboxEmail.PENDING, OutboxEmail.SENDING]).aggregate(
+        due = Min('next_attempt_at'))['due']
+
+
+class EmailSenderPool:
+    # a fixed number of sender threads; extra wake-ups while they are busy are folded into their next pass.
+    # Failed emails wait out their backoff, so after a pass the pool sets a timer for the first one due.
+    def __init__(self, workers):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.running = 0
+        self.pending_wake = False
+        self.executor = None
+        self.timer = None
+        self.timer_due = None
+
+    def wake(self):
+        with self.lock:
+            if self.running >= self.workers:
+                self.pending_wake = True
+                return
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers = self.workers, thread_name_prefix = 'outbox')
+            self.running += 1
+            
+        self.executor.submit(self.run)
+
+    def wake_at(self, when):
+        """Wake the pool at `when`, unless a timer already wakes it earlier."""
+        with self.lock:
+            if self.timer is not None:
+                if self.timer_due <= when:
+                    return
+                self.timer.cancel()
+            self.timer = threading.Timer(max(0, (when - timezone.now()).total_seconds()), self.timed_wake)
+            self.timer.daemon = True
+            self.timer_due = when
+            self.timer.start()
+
+    def timed_wake(self):
+        with self.lock:
+            # a later wake_at() may already have replaced this timer with an earlier one
+            if self.timer is threading.current_thread():
+                self.timer = None
+        self.wake()
+
+    def run(self):
+        finished = False
+        try:
+            while True:
+                drain_outbox()
+                with self.lock:
+                    if not self.pending_wake:
+                        self.running -= 1
+                        finished = True
+                        break
+                    self.pending_wake = False
+                    
+            due = next_due()
+            if due is not None:
+                self.wake_at(due)
+        except Exception:
+            # whatever was left stays in the outbox for the next wake-up or `manage.py send_outbox`
+            logger.exception('Sending the email outbox failed')
+            if not finished:
+                with self.lock:
+                    self.running -= 1
+        finally:
+            # threads get their own database connection; don't leave it open
+            connection.close()
+
+
+sender_pool = EmailSenderPool(settings.EMAIL_SENDER_WORKERS)
@@ -0,0 +1,118 @@
+import time
+import logging
+import random
+import resource
+import threading
+from collections import Counter
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, override_settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from authentication.throttling import LOGIN_HASH_CONCURRENCY
+
+
+LOADTEST_USERNAME = 'loginloadtest'
+LOADTEST_PASSWORD = 'loginloadtest-password'
+
+# phase name -> settings.LOGIN_THROTTLING
+PHASES = {
+    'unthrottled': False,
+    'throttled': True,
+}
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0
+
+
+class Command(BaseCommand):
+    help = ('Flood the login view in-process with wrong passwords, without and then with login throttling, '
+            'and report the CPU the password hashing takes and how a real user\'s login fares meanwhile.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type = float, default = 60, help = 'Seconds per phase.')
+        parser.add_argument('--workers', type = int, default = 8, help = 'Attacking threads.')
+        parser.add_argument('--rate', type = float, default = 50, help = 'Attempts per second, across the workers.')
+        parser.add_argument('--ips', type = int, default = 1, help = 'Addresses the attack comes from.')
+        parser.add_argument('--usernames', type = int, default = 100, help = 'Usernames the attack tries.')
+        parser.add_argument('--phases', nargs = '+', choices = list(PHASES), default = list(PHASES))
+
+    def handle(self, *args, **options):
+        # allows the test client's host; the 429s are expected here, so they are not logged
+        setup_test_environment()
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        if not User.objects.filter(username = LOADTEST_USERNAME).exists():
+            User.objects.create_user(LOADTEST_USERNAME, 'loginloadtest@example.com', LOADTEST_PASSWORD)
+
+        self.stdout.write('%d workers, %g attempts/s for %gs, from %d addresses against %d usernames '
+                          '(%d hashes at a time when throttled)' % (
+            options['workers'], options['rate'], options['duration'], options['ips'], options['usernames'],
+            LOGIN_HASH_CONCURRENCY))
+        self.stdout.write('%-12s %10s %10s %10s %10s  %-22s %11s  %s' % (
+            'phase', 'attempts', 'hashed', 'rejected', 'CPU cores', 'user login p50/max ms', 'user logins',
+            'user 429s'))
+
+        for phase, throttling in PHASES.items():
+            if phase not in options['phases']:
+                continue
+            with override_settings(LOGIN_THROTTLING = throttling):
+                self.run_phase(phase, options)
+
+    def run_phase(self, phase, options):
+        # fresh addresses and usernames each run, so earlier runs' throttling state does not carry over
+        run = random.randrange(1 << 30)
+        ips = ['10.%d.%d.%d' % (run % 200, i // 250 % 250, i % 250 + 1) for i in range(options['ips'])]
+        usernames = ['attack%d_%d' % (run, i) for i in range(options['usernames'])]
+        deadline = time.perf_counter() + options['duration']
+        statuses = Counter()
+
+        # paced rather than back to back: in-process, a spinning client would take the CPU being measured
+        interval = options['workers'] / options['rate']
+
+        def attack():
+            client, counts = Client(), Counter()
+            due = time.perf_counter()
+            while time.perf_counter() < deadline:
+                response = client.post('/authentication/login', {
+                    'username': random.choice(usernames), 'password': 'wrong-password'}, REMOTE_ADDR = random.choice(ips))
+                counts[response.status_code] += 1
+                due += interval
+                time.sleep(max(0, due - time.perf_counter()))
+            statuses.update(counts)
+            connection.close()
+
+        workers = [threading.Thread(target = attack) for _ in range(options['workers'])]
+        started, cpu_started = time.perf_counter(), cpu_seconds()
+        for worker in workers:
+            worker.start()
+
+        # meanwhile a real user logs in now and then, from an address of their own
+        user_latencies, user_statuses = [], Counter()
+        while time.perf_counter() < deadline:
+            client = Client()
+            request_started = time.perf_counter()
+            response = client.post('/authentication/login', {'username': LOADTEST_USERNAME, 'password': LOADTEST_PASSWORD},
+                                   REMOTE_ADDR = '192.0.2.1')
+            user_latencies.append((time.perf_counter() - request_started) * 1000)
+            user_statuses[response.status_code] += 1
+            time.sleep(2)
+
+        for worker in workers:
+            worker.join()
+        wall, cpu = time.perf_counter() - started, cpu_seconds() - cpu_started
+
+        user_latencies.sort()
+        # the real user's 429s are the throttling's false positives: each is a legitimate login turned away
+        self.stdout.write('%-12s %10d %10d %10d %10.2f  %-22s %11s  %d' % (
+            phase, sum(statuses.values()), statuses[200], statuses[429], cpu / wall,
+            '%.0f / %.0f' % (percentile(user_latencies, 50), user_latencies[-1] if user_latencies else 0),
+            '%d/%d' % (user_statuses[302], sum(user_statuses.values())), user_statuses[429]))
+        if user_statuses[429]:
+            self.stderr.write('%s: the legitimate user was turned away %d of %d times.' % (
+                phase, user_statuses[429], sum(user_statuses.values())))
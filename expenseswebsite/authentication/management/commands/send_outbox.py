@@ -0,0 +1,55 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from authentication.models import OutboxEmail
+from authentication.mailer import drain_outbox
+
+
+BACKENDS = {
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+    'console': 'django.core.mail.backends.console.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+}
+
+
+class Command(BaseCommand):
+    help = 'Send due emails from the outbox (once, in a loop, or as an offline load test).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices = sorted(BACKENDS), help = 'Override settings.EMAIL_BACKEND.')
+        parser.add_argument('--file-path', help = 'Directory for the file backend (EMAIL_FILE_PATH).')
+        parser.add_argument('--batch-size', type = int, default = settings.EMAIL_BATCH_SIZE)
+        parser.add_argument('--loop', type = float, metavar = 'SECONDS', help = 'Keep polling every SECONDS.')
+        parser.add_argument('--loadtest', type = int, metavar = 'N',
+                            help = 'Queue N test emails and time how long sending them takes.')
+
+    def handle(self, *args, **options):
+        backend = BACKENDS[options['backend']] if options['backend'] else None
+        if options['file_path']:
+            settings.EMAIL_FILE_PATH = options['file_path']
+            
+        if options['loadtest']:
+            return self.loadtest(options['loadtest'], backend or BACKENDS['locmem'], options['batch_size'])
+        
+        while True:
+            sent = drain_outbox(options['batch_size'], backend)
+            self.stdout.write('Sent %d emails.' % sent)
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def loadtest(self, count, backend, batch_size):
+        OutboxEmail.objects.bulk_create([
+            OutboxEmail(subject = 'Load test %d' % i, body = 'Load test email', from_email = 'noreply@hiexpense.com',
+                        to = ['loadtest%d@example.com' % i])
+            for i in range(count)
+        ], batch_size = 1000)
+        
+        started = time.perf_counter()
+        sent = drain_outbox(batch_size, backend)
+        elapsed = time.perf_counter() - started
+        
+        OutboxEmail.objects.filter(subject__startswith = 'Load test ').delete()
+        self.stdout.write('Sent %d emails in %.2fs (%.0f emails/sec, %d per connection) using %s' % (
+            sent, elapsed, sent / elapsed, batch_size, backend.rsplit('.', 2)[-2]))
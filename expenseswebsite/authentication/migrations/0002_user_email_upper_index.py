@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # case-insensitive email lookups (UPPER(email) = UPPER(%s)) use this index on SQLite and PostgreSQL
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_upper_idx ON auth_user (UPPER(email))',
+            'DROP INDEX IF EXISTS auth_user_email_upper_idx',
+        ),
+    ]
@@ -1,3 +1,32 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OutboxEmail(models.Model):
+    # emails are written here first and delivered by the sender pool (authentication.mailer)
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+    
+    subject = models.CharField(max_length = 255)
+    body = models.TextField()
+    from_email = models.CharField(max_length = 255)
+    to = models.JSONField()
+    status = models.CharField(max_length = 10, choices = STATUS_CHOICES, default = PENDING)
+    attempts = models.IntegerField(default = 0)
+    next_attempt_at = models.DateTimeField(default = timezone.now)
+    # the claim of the sender delivering it (status sending), so two senders never both send it
+    claimed_by = models.CharField(max_length = 32, blank = True)
+    last_error = models.TextField(blank = True)
+    created_at = models.DateTimeField(auto_now_add = True)
+    sent_at = models.DateTimeField(blank = True, null = True)
+    
+    def __str__(self):
+        return '%s to %s' % (self.subject, ', '.join(self.to))
+    
+    class Meta:
+        indexes = [
+            models.Index(fields = ['status', 'next_attempt_at'], name = 'outbox_due_idx'),
+        ]
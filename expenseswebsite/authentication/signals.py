@@ -0,0 +1,11 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
+from .backends import forget_user
+
+
+@receiver(post_save, sender = User)
+@receiver(post_delete, sender = User)
+def user_changed(sender, instance, **kwargs):
+    # password changes (and with them the session hash), deactivation, last_login...
+    forget_user(instance.pk)
@@ -1,3 +1,39 @@
-from django.test import TestCase
+from django.test import TestCase, RequestFactory, override_settings
+from .validation import client_ip
+from .throttling import hash_slot
 
-# Create your tests here.
+
+@override_settings(TRUSTED_PROXIES = ['10.0.0.1', '10.0.0.2'])
+class ClientIpTests(TestCase):
+
+    def ip(self, remote_addr, forwarded = None):
+        headers = {'HTTP_X_FORWARDED_FOR': forwarded} if forwarded is not None else {}
+        return client_ip(RequestFactory().get('/', REMOTE_ADDR = remote_addr, **headers))
+
+    def test_direct_client(self):
+        # a client talking to the server directly cannot pick its address with the header
+        self.assertEqual(self.ip('192.0.2.7', '198.51.100.1'), '192.0.2.7')
+
+    def test_behind_proxies(self):
+        self.assertEqual(self.ip('10.0.0.1', '192.0.2.7'), '192.0.2.7')
+        self.assertEqual(self.ip('10.0.0.1', '192.0.2.7, 10.0.0.2'), '192.0.2.7')
+
+    def test_spoofed_hops_are_ignored(self):
+        # entries left of the first untrusted hop were written by the client
+        self.assertEqual(self.ip('10.0.0.1', '198.51.100.1, 192.0.2.7'), '192.0.2.7')
+
+    def test_proxy_without_header(self):
+        self.assertEqual(self.ip('10.0.0.1'), '10.0.0.1')
+
+
+@override_settings(LOGIN_THROTTLING = True)
+class HashSlotTests(TestCase):
+
+    def test_one_attempt_per_client(self):
+        with hash_slot('192.0.2.7') as slot:
+            self.assertTrue(slot.acquired)
+            # a second attempt from the same address is turned away rather than queued
+            with hash_slot('192.0.2.7') as again:
+                self.assertFalse(again.acquired)
+        with hash_slot('192.0.2.7') as slot:
+            self.assertTrue(slot.acquired)
@@ -0,0 +1,135 @@
+import os
+import math
+import time
+import hashlib
+import threading
+from django.conf import settings
+from django.core.cache import cache
+
+
+# scope -> (attempts allowed per sliding window, window in seconds); past the allowance every further
+# attempt doubles the wait before the next one, from THROTTLE_BASE_DELAY up to the whole window
+THROTTLES = {
+    # failed logins: from one address (whether or not the accounts exist), and against one account
+    # from one address (keyed on both, so guessing from elsewhere never locks the owner out); a
+    # successful login clears the latter
+    'login_ip': (20, 300),
+    'login_username': (5, 900),
+    # every request, as each can send an email
+    'reset_ip': (10, 300),
+    'reset_email': (3, 900),
+}
+THROTTLE_BASE_DELAY = 1
+
+# password checks one process runs at a time, half its cores, which bounds the CPU logins can take
+# even when the attack is spread out. An attempt that got past the throttles queues for a slot, but
+# each client address may only have one attempt queued or hashing: further ones are turned away at
+# once, so an attacker's parallel requests cannot crowd out a real user, who queues behind at most
+# one attempt per other address. A hash takes about 0.6 s on a small server; LOGIN_HASH_WAIT only
+# bounds how long a worker thread is held when the queue is pathologically long
+LOGIN_HASH_CONCURRENCY = max(1, (os.cpu_count() or 2) // 2)
+LOGIN_HASH_WAIT = 30
+hash_slots = threading.BoundedSemaphore(LOGIN_HASH_CONCURRENCY)
+hashing_clients = set()
+hashing_clients_lock = threading.Lock()
+
+
+def throttle_key(kind, scope, ident, *parts):
+    # hashed so any user input makes a safe cache key
+    digest = hashlib.md5(str(ident).lower().encode('utf-8')).hexdigest()
+    return '_'.join(['throttle', kind, scope, digest] + [str(part) for part in parts])
+
+
+def lock_key(scope, ident):
+    return throttle_key('lock', scope, ident)
+
+
+def count_key(scope, ident, window_index):
+    return throttle_key('count', scope, ident, window_index)
+
+
+def throttle_wait(checks):
+    """Seconds until every (scope, ident) of checks may try again; 0 when none is waiting.
+
+    One cache read and no database or hasher work, so a rejected attempt costs next to nothing.
+    """
+    if not settings.LOGIN_THROTTLING:
+        return 0
+
+    now = time.time()
+    locks = cache.get_many([lock_key(scope, ident) for scope, ident in checks])
+    return max([math.ceil(until - now) for until in locks.values() if until > now] or [0])
+
+
+def sliding_count(scope, ident, now):
+    """Add one attempt and estimate the attempts of the last window.
+
+    The previous fixed window's count is weighted by how much of it still overlaps the sliding one:
+    two counters per key instead of a timestamp per attempt.
+    """
+    _, window = THROTTLES[scope]
+    index, offset = divmod(now, window)
+    current = count_key(scope, ident, int(index))
+
+    # add() only sets the key if it is missing; each counter outlives the window that follows it
+    cache.add(current, 0, window * 2)
+    try:
+        count = cache.incr(current)
+    except ValueError:
+        # the key expired between add() and incr()
+        cache.set(current, 1, window * 2)
+        count = 1
+
+    previous = cache.get(count_key(scope, ident, int(index) - 1), 0)
+    return count + previous * (1 - offset / window)
+
+
+def record_attempt(checks):
+    """Count an attempt against each (scope, ident); past a scope's allowance, lock it progressively longer."""
+    if not settings.LOGIN_THROTTLING:
+        return
+
+    now = time.time()
+    for scope, ident in checks:
+        allowed, window = THROTTLES[scope]
+        over = sliding_count(scope, ident, now) - allowed
+        if over > 0:
+            delay = min(THROTTLE_BASE_DELAY * 2 ** (math.ceil(over) - 1), window)
+            cache.set(lock_key(scope, ident), now + delay, math.ceil(delay))
+
+
+def clear_attempts(scope, ident):
+    _, window = THROTTLES[scope]
+    index = int(time.time() // window)
+    cache.delete_many([lock_key(scope, ident), count_key(scope, ident, index), count_key(scope, ident, index - 1)])
+
+
+class hash_slot:
+    """Holds one of the process's password-check slots for client `ip`.
+
+    `acquired` is False when that client already has an attempt queued or hashing, or (rarely) when
+    no slot freed up within LOGIN_HASH_WAIT.
+    """
+
+    def __init__(self, ip):
+        self.ip = ip
+
+    def __enter__(self):
+        self.queued = self.held = False
+        if not settings.LOGIN_THROTTLING:
+            self.acquired = True
+            return self
+
+        with hashing_clients_lock:
+            self.queued = self.ip not in hashing_clients
+            hashing_clients.add(self.ip)
+        self.held = self.queued and hash_slots.acquire(timeout = LOGIN_HASH_WAIT)
+        self.acquired = self.held
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.held:
+            hash_slots.release()
+        if self.queued:
+            with hashing_clients_lock:
+                hashing_clients.discard(self.ip)
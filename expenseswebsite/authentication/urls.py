@@ -1,4 +1,4 @@
-from .views import RegistrationView, CompletePasswordReset, UsernameValidationView, EmailValidationView, VerificationView, LoginView, LogoutView, RequestPasswordResetEmail
+from .views import RegistrationView, CompletePasswordReset, UsernameValidationView, EmailValidationView, RegistrationValidationView, VerificationView, LoginView, LogoutView, RequestPasswordResetEmail
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
 
@@ -9,6 +9,7 @@ urlpatterns = [
     path('logout', LogoutView.as_view(), name = "logout"),
     path('validate-username', csrf_exempt(UsernameValidationView.as_view()), name = "validate-username"),
     path('validate-email', csrf_exempt(EmailValidationView.as_view()), name = "validate_email"),
+    path('validate-registration', csrf_exempt(RegistrationValidationView.as_view()), name = "validate-registration"),
     path('activate/<uidb64>/<token>', VerificationView.as_view(), name = "activate"), 
     path('set-new-password/<uidb64>/<token>', CompletePasswordReset.as_view(), name = "reset-user-password"),
     path('request-reset-link', RequestPasswordResetEmail.as_view(), name = "request-password")
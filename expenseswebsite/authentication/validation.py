@@ -0,0 +1,114 @@
+import hashlib
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Value
+from django.db.models.functions import Upper
+from django.contrib.auth.models import User
+from validate_email import validate_email
+
+
+# availability answers are cached briefly; registration itself always re-checks the database
+VALIDATION_CACHE_TIMEOUT = 30
+# requests allowed per client IP per window (seconds) across the validation endpoints
+VALIDATION_RATE_LIMIT = 60
+VALIDATION_RATE_WINDOW = 60
+
+
+@lru_cache(maxsize = 4096)
+def email_is_valid(email):
+    return validate_email(email)
+
+
+def email_in_use(email):
+    # UPPER(email) = UPPER(%s) matches the auth_user_email_upper_idx expression index
+    return User.objects.alias(email_upper = Upper('email')).filter(email_upper = Upper(Value(email))).exists()
+
+
+def username_in_use(username):
+    return User.objects.filter(username = username).exists()
+
+
+async def aemail_in_use(email):
+    return await User.objects.alias(email_upper = Upper('email')).filter(email_upper = Upper(Value(email))).aexists()
+
+
+async def ausername_in_use(username):
+    return await User.objects.filter(username = username).aexists()
+
+
+def cache_key(kind, value):
+    # hashed so any user input makes a safe cache key. Only emails are matched case-insensitively;
+    # usernames are case-sensitive, so "Alice" and "alice" must not share an answer
+    if kind == 'email':
+        value = value.lower()
+    return 'validation_%s_%s' % (kind, hashlib.md5(value.encode('utf-8')).hexdigest())
+
+
+async def cached_lookup(kind, value, lookup):
+    key = cache_key(kind, value)
+    in_use = await cache.aget(key)
+    
+    if in_use is None:
+        in_use = await lookup(value)
+        await cache.aset(key, in_use, VALIDATION_CACHE_TIMEOUT)
+        
+    return in_use
+
+
+async def check_username(username):
+    """(error message, status) for an unusable username, or None if it is free."""
+    if not str(username).isalnum():
+        return 'Username should only contain alphanumeric characters.', 400
+    
+    if await cached_lookup('username', username, ausername_in_use):
+        return 'Username is already in use, please try another choice.', 409
+    
+    return None
+
+
+async def check_email(email):
+    """(error message, status) for an unusable email, or None if it is free."""
+    if not email_is_valid(email):
+        return 'Email is invalid.', 400
+    
+    if await cached_lookup('email', email, aemail_in_use):
+        return 'Email is in use. Please use another one.', 409
+    
+    return None
+
+
+def forget(username, email):
+    # called once an account is created so the next check sees it straight away
+    cache.delete_many([cache_key('username', username), cache_key('email', email)])
+
+
+def client_ip(request):
+    """The address the request came from, looking through settings.TRUSTED_PROXIES.
+
+    Each trusted proxy appends the address it received the request from to CLIENT_IP_HEADER, so the
+    header is read from the right, past the trusted proxies; anything further left was sent by the
+    client and cannot be trusted.
+    """
+    ip = request.META.get('REMOTE_ADDR', '')
+    if ip not in settings.TRUSTED_PROXIES:
+        return ip
+
+    forwarded = [hop.strip() for hop in request.META.get(settings.CLIENT_IP_HEADER, '').split(',') if hop.strip()]
+    while forwarded and ip in settings.TRUSTED_PROXIES:
+        ip = forwarded.pop()
+    return ip
+
+
+async def rate_limited(request, scope, limit = VALIDATION_RATE_LIMIT, window = VALIDATION_RATE_WINDOW):
+    """Count this request against the client's fixed window; True once the limit is exceeded."""
+    key = 'ratelimit_%s_%s' % (scope, client_ip(request))
+    
+    # add() only sets the key if it is missing, so the window starts at the first request
+    await cache.aadd(key, 0, window)
+    try:
+        return await cache.aincr(key) > limit
+    except ValueError:
+        # the key expired between add() and incr()
+        await cache.aset(key, 1, window)
+        return False
@@ -1,12 +1,12 @@
 import json
-import threading
 from django.views import View
 from django.urls import reverse
 from django.conf import settings
 from django.http import JsonResponse
-from django.core.mail import EmailMessage
+from .mailer import queue_email
+from .validation import check_email, check_username, email_in_use, email_is_valid, forget, rate_limited, client_ip
+from .throttling import throttle_wait, record_attempt, clear_attempts, hash_slot
 from django.contrib import messages, auth
-from validate_email import validate_email 
 from django.contrib.auth.models import User
 from .utils import account_activation_token
 from django.shortcuts import render, redirect
@@ -16,44 +16,68 @@ from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 
 
-# Multithreading to send emails faster over the network
-class EmailThread(threading.Thread):
-    def __init__(self, email):
-        self.email = email
-        threading.Thread.__init__(self)
-    
-    def run(self):
-        self.email.send(fail_silently=False)
+def too_many_requests():
+    return JsonResponse({'error': 'Too many requests, please slow down.'}, status=429)
+
+
+def throttled(request, template, wait):
+    messages.error(request, 'Too many attempts. Please wait %d seconds and try again.' % wait)
+    response = render(request, template, status=429)
+    response['Retry-After'] = str(wait)
+    return response
 
 
 class EmailValidationView(View):
-    def post(self, request):
+    # async: under ASGI the cache and database lookups no longer tie up a worker thread
+    async def post(self, request):
+        if await rate_limited(request, 'validation'):
+            return too_many_requests()
+        
         data = json.loads(request.body)
         email = data['email']
         
-        if not validate_email(email):
-            return JsonResponse({'email_error':'Email is invalid.'}, status=400)
-        
-        if User.objects.filter(email=email).exists():
-            return JsonResponse({'email_error':'Email is in use. Please use another one.'}, status=409)
+        error = await check_email(email)
+        if error:
+            return JsonResponse({'email_error': error[0]}, status=error[1])
         
         return JsonResponse({'email_valid': True})
     
     
 class UsernameValidationView(View):
-    def post(self, request):
+    async def post(self, request):
+        if await rate_limited(request, 'validation'):
+            return too_many_requests()
+        
         data = json.loads(request.body)
         username = data['username']
         
-        if not str(username).isalnum():
-            return JsonResponse({'username_error':'Username should only contain alphanumeric characters.'}, status=400)
-        
-        if User.objects.filter(username=username).exists():
-            return JsonResponse({'username_error':'Username is already in use, please try another choice.'}, status=409)
+        error = await check_username(username)
+        if error:
+            return JsonResponse({'username_error': error[0]}, status=error[1])
         
         return JsonResponse({'username_valid': True})
     
     
+class RegistrationValidationView(View):
+    # checks the username and/or email in one round trip; each field reports on its own
+    async def post(self, request):
+        if await rate_limited(request, 'validation'):
+            return too_many_requests()
+        
+        data = json.loads(request.body)
+        result = {}
+        
+        for field, check in (('username', check_username), ('email', check_email)):
+            if data.get(field):
+                error = await check(data[field])
+                if error:
+                    result[field + '_error'] = error[0]
+                else:
+                    result[field + '_valid'] = True
+                    
+        return JsonResponse(result)
+    
+    
 class RegistrationView(View):
     def get(self, request):
         return render(request, 'authentication/register.html')
@@ -69,7 +93,7 @@ class RegistrationView(View):
         }
         
         if not User.objects.filter(username = username).exists():
-            if not User.objects.filter(email = email).exists():
+            if not email_in_use(email):
                 
                 if len(password) < 6:
                     messages.error(request, "Password is too short. Please try again.")
@@ -79,6 +103,7 @@ class RegistrationView(View):
                 user.set_password(password)
                 user.is_active = False
                 user.save()
+                forget(username, email)
                    
                 # Getting uidb64            
                 uidb64 = urlsafe_base64_encode(force_bytes(user.pk)) 
@@ -93,13 +118,7 @@ class RegistrationView(View):
                 # Constructing email
                 email_subject = 'Activate Your Account'                          
                 email_body = 'Hi, ' + user.username + '! Please use this link to verify your account:\n' + activate_url
-                email = EmailMessage(
-                    email_subject,
-                    email_body,
-                    'noreply@hiexpense.com',
-                    [email],
-                )
-                EmailThread(email).start() # multithreading
+                queue_email(email_subject, email_body, 'noreply@hiexpense.com', [email]) # sent by the outbox pool
                 
                 messages.success(request, "Your account has been created! Please check your email!")
                 return render(request, 'authentication/register.html')
@@ -145,10 +164,23 @@ class LoginView(View):
         password = request.POST['password'] 
         
         if username and password:
-            # returns user
-            user = auth.authenticate(username = username, password = password)
+            # turned away before the password hash, the expensive part of a login
+            ip = client_ip(request)
+            checks = [('login_ip', ip), ('login_username', (username, ip))]
+            wait = throttle_wait(checks)
+            if wait:
+                return throttled(request, 'authentication/login.html', wait)
+            
+            with hash_slot(ip) as slot:
+                # checked again: the address or username may have been locked while this one waited
+                wait = throttle_wait(checks) if slot.acquired else 1
+                if wait:
+                    return throttled(request, 'authentication/login.html', wait)
+                # returns user
+                user = auth.authenticate(username = username, password = password)
             
             if user:
+                clear_attempts('login_username', (username, ip))
                 if user.is_active:
                     auth.login(request, user)
                     messages.success(request, 'Welcome, ' + user.username + '! You are now logged in')
@@ -157,6 +189,7 @@ class LoginView(View):
                 messages.error(request, 'Account is not active, please check your email.')
                 return render(request, 'authentication/login.html')   
             
+            record_attempt(checks)
             messages.error(request, 'Invalid credentials, please try again.')
             return render(request, 'authentication/login.html')   
         
@@ -180,7 +213,13 @@ class RequestPasswordResetEmail(View):
             'values': request.POST,
         }
         
-        if not validate_email(email):
+        checks = [('reset_ip', client_ip(request)), ('reset_email', email)]
+        wait = throttle_wait(checks)
+        if wait:
+            return throttled(request, 'authentication/reset-password.html', wait)
+        record_attempt(checks)
+        
+        if not email_is_valid(email):
             messages.error(request, 'Please enter a valid email')
             return render(request, 'authentication/reset-password.html', context)
         
@@ -203,13 +242,7 @@ class RequestPasswordResetEmail(View):
             # Constructing email
             email_subject = 'Password Reset Details!'                          
             email_body = 'Hi, there! Please use this link to reset your password:\n' + reset_url
-            email = EmailMessage(
-                email_subject,
-                email_body,
-                'noreply@hiexpense.com',
-                [email],
-            )
-            EmailThread(email).start() # multithreading
+            queue_email(email_subject, email_body, 'noreply@hiexpense.com', [email]) # sent by the outbox pool
             messages.success(request, 'We have sent you an email to reset your password!')
         else:
             messages.error(request, 'This email address does not exist. Please try another email.')
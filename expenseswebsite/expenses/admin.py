@@ -1,6 +1,6 @@
 from re import search
 from django.contrib import admin
-from .models import Expense, Category
+from .models import Expense, Category, RecurringExpense, Budget
 
 
 class ExpenseAdmin(admin.ModelAdmin):
@@ -8,5 +8,22 @@ class ExpenseAdmin(admin.ModelAdmin):
     search_fields = ('amount', 'description', 'category', 'date')
     list_per_page = 5
 
+    def delete_queryset(self, request, queryset):
+        # one at a time, so each delete takes its amount out of the rollups (a queryset delete does not)
+        for expense in queryset:
+            expense.delete()
+
 admin.site.register(Expense, ExpenseAdmin)
-admin.site.register(Category)
\ No newline at end of file
+admin.site.register(Category)
+
+class RecurringExpenseAdmin(admin.ModelAdmin):
+    list_display = ('description', 'amount', 'owner', 'category', 'frequency', 'interval', 'next_date', 'active')
+    search_fields = ('description', 'category')
+
+admin.site.register(RecurringExpense, RecurringExpenseAdmin)
+
+
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ('category', 'owner', 'period', 'amount', 'spent', 'period_start')
+
+admin.site.register(Budget, BudgetAdmin)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ExpensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses'
+
+    def ready(self):
+        # registering the signal handlers
+        from . import signals
@@ -0,0 +1,90 @@
+import datetime
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from .money import to_money
+from .models import Budget, ExpenseMonthlyRollup
+from .versions import bump_data_version
+from .rollups import month_start, BULK_DELTA_THRESHOLD
+
+
+def period_start(date, period):
+    return date.replace(month = 1, day = 1) if period == 'yearly' else month_start(date)
+
+
+def period_end(start, period):
+    # first day after the period
+    if period == 'yearly':
+        return start.replace(year = start.year + 1)
+    return (start + datetime.timedelta(days = 32)).replace(day = 1)
+
+
+def spent_in_period(owner_id, category, period, start):
+    """Spend of a period summed from the monthly rollups (one month, or at most twelve)."""
+    total = ExpenseMonthlyRollup.objects.filter(owner_id = owner_id, category = category, month__gte = start,
+                                                month__lt = period_end(start, period)).aggregate(
+        total = Sum('total'))['total'] or 0
+    return to_money(total)
+
+
+def apply_budget_deltas(deltas):
+    """Add the amount of each (owner_id, month, category) rollup delta to the budgets whose current
+    period contains that month, with one F() update per delta."""
+    if len(deltas) > BULK_DELTA_THRESHOLD:
+        # batch writes: only the categories that have a budget at all are updated
+        budgeted = set(Budget.objects.filter(owner_id__in = {owner_id for owner_id, _, _ in deltas}).values_list(
+            'owner_id', 'category'))
+        deltas = {key: delta for key, delta in deltas.items() if (key[0], key[2]) in budgeted}
+
+    for (owner_id, month, category), (amount, _) in deltas.items():
+        if amount:
+            Budget.objects.filter(owner_id = owner_id, category = category).filter(
+                Q(period = 'monthly', period_start = month) | Q(period = 'yearly', period_start = month.replace(month = 1))
+            ).update(spent = F('spent') + amount)
+
+
+def start_period(budget, today):
+    # a budget entering a new period (or just created) starts from what the rollups hold for it;
+    # the row is locked so a concurrent delta is applied after this write rather than lost under it
+    with transaction.atomic():
+        if budget.pk is not None:
+            Budget.objects.select_for_update().filter(pk = budget.pk).first()
+        budget.period_start = period_start(today, budget.period)
+        budget.spent = spent_in_period(budget.owner_id, budget.category, budget.period, budget.period_start)
+        budget.save()
+
+
+def budget_status(owner, today = None):
+    """The owner's budgets with their current period's spend: one query, plus a recount for each budget
+    whose period has just rolled over."""
+    today = today or datetime.date.today()
+    budgets = list(Budget.objects.filter(owner = owner))
+
+    for budget in budgets:
+        if budget.period_start != period_start(today, budget.period):
+            start_period(budget, today)
+
+    return budgets
+
+
+def set_budget(owner, category, period, amount, today = None):
+    """Create or change the owner's budget for category and period; amount is in the base currency."""
+    budget = Budget.objects.filter(owner = owner, category = category, period = period).first() or Budget(
+        owner = owner, category = category, period = period)
+    budget.amount = to_money(amount)
+    start_period(budget, today or datetime.date.today())
+    # the expenses index shows budget status
+    bump_data_version(owner.pk)
+    return budget
+
+
+def recount_budgets(owner_ids = None, today = None):
+    """Recount every budget's spend from the rollups (after they are rebuilt); returns the number of budgets."""
+    budgets = Budget.objects.all()
+    if owner_ids is not None:
+        budgets = budgets.filter(owner_id__in = owner_ids)
+
+    count = 0
+    for budget in budgets.iterator():
+        start_period(budget, today or datetime.date.today())
+        count += 1
+    return count
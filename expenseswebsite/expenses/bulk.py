@@ -0,0 +1,160 @@
+import datetime
+from django.conf import settings
+from django.db import transaction
+from .money import to_money
+from .search import build_search_query
+from .importers import IMPORT_KINDS
+from .rollups import new_deltas, add_delta, apply_deltas
+from userpreferences.fx import rate_table
+
+
+# ids one bulk request may name
+BULK_MAX_IDS = 10000
+# columns a bulk edit may set, besides the grouping column (category/source)
+BULK_EDIT_FIELDS = ('amount', 'date', 'description')
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError('%r is not a date (YYYY-MM-DD).' % (value,))
+
+
+def bulk_queryset(kind, owner, ids = None, filters = None, currency = None):
+    """The owner's rows named by a list of ids or by a filter; ValueError when neither selects anything.
+
+    filters may hold the grouping column (exact match), date_from, date_to (inclusive) and search
+    (matched like the search box, amounts as shown in `currency`). Other users' ids are simply not matched.
+    """
+    model, _, group_field, _ = IMPORT_KINDS[kind]
+    queryset = model.objects.filter(owner = owner)
+
+    if ids is not None:
+        if not isinstance(ids, list) or not ids or len(ids) > BULK_MAX_IDS:
+            raise ValueError('ids must be a list of 1 to %d ids.' % BULK_MAX_IDS)
+        try:
+            return queryset.filter(pk__in = [int(pk) for pk in ids])
+        except (TypeError, ValueError):
+            raise ValueError('ids must be whole numbers.')
+
+    if not isinstance(filters, dict) or not filters:
+        raise ValueError('Give the ids to change, or a filter.')
+
+    unknown = set(filters) - {group_field, 'date_from', 'date_to', 'search'}
+    if unknown:
+        raise ValueError('Unknown filter: %s.' % ', '.join(sorted(unknown)))
+
+    for field in (group_field, 'search'):
+        if field in filters and not isinstance(filters[field], str):
+            raise ValueError('The %s filter must be text.' % field)
+
+    if group_field in filters:
+        queryset = queryset.filter(**{group_field: filters[group_field]})
+    if 'date_from' in filters:
+        queryset = queryset.filter(date__gte = parse_date(filters['date_from']))
+    if 'date_to' in filters:
+        queryset = queryset.filter(date__lte = parse_date(filters['date_to']))
+    if filters.get('search', '').strip():
+        queryset = queryset.filter(build_search_query(filters['search'].strip(), ['description', group_field],
+                                                     currency))
+
+    return queryset
+
+
+def clean_changes(kind, changes, currency = None):
+    """Validate a bulk edit's {column: value}; an amount is typed in `currency` (default: the base currency)."""
+    _, _, group_field, _ = IMPORT_KINDS[kind]
+    if not isinstance(changes, dict) or not changes:
+        raise ValueError('Give the columns to change.')
+
+    unknown = set(changes) - set(BULK_EDIT_FIELDS + (group_field,))
+    if unknown:
+        raise ValueError('These columns cannot be changed: %s.' % ', '.join(sorted(unknown)))
+
+    cleaned = dict(changes)
+    if 'amount' in cleaned:
+        # kept as typed alongside its base currency value, like an amount typed into the form
+        cleaned.update(rate_table().entered(cleaned['amount'], currency or settings.FX_BASE_CURRENCY))
+    if 'date' in cleaned:
+        cleaned['date'] = parse_date(cleaned['date'])
+    for field in ('description', group_field):
+        if field in cleaned and not str(cleaned[field] or '').strip():
+            raise ValueError('%s cannot be empty.' % field.capitalize())
+
+    return cleaned
+
+
+def rows_deltas(queryset, group_field, changes = None):
+    """Rollup deltas taking the selected rows out, and putting them back with changes applied if given."""
+    deltas = new_deltas()
+    # locked so a concurrent edit cannot slip in between reading the rows and writing them
+    for values in queryset.select_for_update().order_by().values('owner_id', 'date', 'amount', group_field).iterator():
+        add_delta(deltas, queryset.model, group_field, values, -1)
+        if changes is not None:
+            values.update(changes)
+            add_delta(deltas, queryset.model, group_field, values, 1)
+    return deltas
+
+
+def bulk_delete(kind, owner, ids = None, filters = None, currency = None):
+    """Delete the selected rows of owner, keeping the rollups and caches current.
+
+    Returns the number of rows deleted.
+    """
+    _, rollup_model, group_field, changed = IMPORT_KINDS[kind]
+    queryset = bulk_queryset(kind, owner, ids, filters, currency)
+
+    with transaction.atomic():
+        deltas = rows_deltas(queryset, group_field)
+        # the rows send no delete signals (see rollups.row_deleting), so Django removes them with one
+        # DELETE, still through the collector; their rollups are adjusted here, in the same transaction
+        deleted = queryset.delete()[1].get(queryset.model._meta.label, 0)
+        apply_deltas(rollup_model, group_field, deltas)
+
+    if deleted:
+        changed(owner.pk)
+    return deleted
+
+
+def bulk_update(kind, owner, changes, ids = None, filters = None, currency = None):
+    """Set the same columns on the selected rows of owner with one UPDATE; returns the number of rows.
+
+    Amounts, in changes and in a search filter, are in `currency` (default: the base currency).
+    """
+    _, rollup_model, group_field, changed = IMPORT_KINDS[kind]
+    queryset = bulk_queryset(kind, owner, ids, filters, currency)
+    changes = clean_changes(kind, changes, currency)
+
+    with transaction.atomic():
+        # only amount, date and the grouping column move money between rollup rows
+        if set(changes) & {'amount', 'date', group_field}:
+            deltas = rows_deltas(queryset, group_field, changes)
+        else:
+            deltas = new_deltas()
+
+        # update() sends no signals: the rollup deltas above stand in for them
+        updated = queryset.update(**changes)
+        apply_deltas(rollup_model, group_field, deltas)
+
+    if updated:
+        changed(owner.pk)
+    return updated
+
+
+def apply_bulk(kind, owner, data, currency):
+    """Carry out a bulk request body for owner; amounts in it are in `currency`.
+
+    {"action": "delete" | "update", "ids": [...] or "filter": {...}, "changes": {...} (updates only)}
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object.')
+
+    action = data.get('action')
+    if action == 'delete':
+        return {'deleted': bulk_delete(kind, owner, data.get('ids'), data.get('filter'), currency)}
+
+    if action == 'update':
+        return {'updated': bulk_update(kind, owner, data.get('changes'), data.get('ids'), data.get('filter'), currency)}
+
+    raise ValueError('action must be "delete" or "update".')
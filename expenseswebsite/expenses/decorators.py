@@ -0,0 +1,20 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.contrib.auth import get_user
+
+
+def async_login_required(view):
+    """login_required for async JSON views: answers 401 instead of redirecting anonymous users."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # the lazy request.user from AuthenticationMiddleware queries the session and user tables
+        # on first use, which is not allowed on the event loop, so it is resolved in a thread once
+        request.user = await sync_to_async(get_user)(request)
+        
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Please log in first.'}, status = 401)
+        
+        return await view(request, *args, **kwargs)
+    
+    return wrapper
@@ -0,0 +1,140 @@
+import csv
+import zlib
+from openpyxl import Workbook
+from openpyxl.styles import Font
+from openpyxl.cell import WriteOnlyCell
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from .versions import data_etag
+
+
+# rows fetched from the database per round trip, and rough size of each chunk sent to the client
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+# finished exports up to this size are kept until the user's data changes
+EXPORT_CACHE_MAX_BYTES = 5 * 1024 * 1024
+EXPORT_CACHE_TIMEOUT = 60 * 60
+
+
+class Echo:
+    # csv.writer only needs write(); returning the line lets us yield it instead of storing it
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header, rows):
+    writer = csv.writer(Echo())
+    buffer = [writer.writerow(header)]
+    size = 0
+    
+    for row in rows:
+        line = writer.writerow(row)
+        buffer.append(line)
+        size += len(line)
+        
+        if size >= EXPORT_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+            
+    yield ''.join(buffer)
+
+
+def gzip_chunks(chunks):
+    # wbits = 31 writes a gzip header/trailer around the deflate stream
+    compressor = zlib.compressobj(wbits = 31)
+    
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+            
+    yield compressor.flush()
+
+
+def export_cache_key(request, name):
+    """Cache key of an export, or None (not cached) unless settings.CACHE_EXPORTS."""
+    if not settings.CACHE_EXPORTS:
+        return None
+    # the data ETag covers the user, their data version, the rate table and the query string (?gzip=1)
+    return 'export_%s_%s' % (name, hashlib.md5(data_etag(request).encode('utf-8')).hexdigest())
+
+
+def cached_export(key, build):
+    """The bytes cached under key, or build() them and cache them if they are small enough."""
+    content = cache.get(key) if key else None
+    
+    if content is None:
+        content = build()
+        if key and len(content) <= EXPORT_CACHE_MAX_BYTES:
+            cache.set(key, content, EXPORT_CACHE_TIMEOUT)
+            
+    return content
+
+
+def tee_into_cache(chunks, key):
+    # passes the chunks through while keeping a copy; cached only if the whole export was sent and fits
+    parts, size = [], 0
+    
+    for chunk in chunks:
+        yield chunk
+        
+        if parts is not None:
+            data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            size += len(data)
+            if size > EXPORT_CACHE_MAX_BYTES:
+                parts = None
+            else:
+                parts.append(data)
+            
+    if parts is not None:
+        cache.set(key, b''.join(parts), EXPORT_CACHE_TIMEOUT)
+
+
+def stream_csv(filename, header, rows, compress = False, cache_key = None):
+    """Stream rows as a CSV attachment (optionally gzipped) without holding the file in memory.
+
+    With a cache_key, a cached copy is served instead (rows is then never iterated, so no query runs)
+    and a freshly streamed export is cached on the way out.
+    """
+    content_type = 'application/gzip' if compress else 'text/csv'
+    if compress:
+        filename += '.gz'
+    
+    cached = cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        response = HttpResponse(cached, content_type = content_type)
+    else:
+        chunks = csv_chunks(header, rows)
+        if compress:
+            chunks = gzip_chunks(chunks)
+        if cache_key:
+            chunks = tee_into_cache(chunks, cache_key)
+        response = StreamingHttpResponse(chunks, content_type = content_type)
+        
+    response['Content-Disposition'] = 'attachment; filename = ' + filename
+    return response
+
+
+def write_xlsx(target, sheets):
+    """Write (title, header, rows) sheets to target as .xlsx, streaming rows with typed cells."""
+    # write-only mode streams rows to disk instead of building every cell in memory
+    wb = Workbook(write_only = True)
+    
+    for title, header, rows in sheets:
+        ws = wb.create_sheet(title)
+        
+        header_cells = []
+        for name in header:
+            cell = WriteOnlyCell(ws, value = name)
+            cell.font = Font(bold = True)
+            header_cells.append(cell)
+        ws.append(header_cells)
+        
+        # numbers and dates are kept as-is so Excel can sum and sort them
+        for row in rows:
+            ws.append(row)
+            
+    wb.save(target)
@@ -0,0 +1,196 @@
+import io
+import csv
+import hashlib
+import datetime
+from zipfile import BadZipFile
+from itertools import islice
+from collections import Counter
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from .models import Expense, ExpenseMonthlyRollup
+from .money import to_money
+from .signals import expenses_changed
+from .rollups import new_deltas, add_delta, apply_deltas
+from userincome.signals import income_changed
+from userincome.models import UserIncome, IncomeMonthlyRollup
+from userpreferences.fx import rate_table
+
+
+IMPORT_BATCH_SIZE = 1000
+
+# model, rollup model, free-text grouping column and cache invalidation hook of each importable type
+IMPORT_KINDS = {
+    'expenses': (Expense, ExpenseMonthlyRollup, 'category', expenses_changed),
+    'income': (UserIncome, IncomeMonthlyRollup, 'source', income_changed),
+}
+
+
+class ImportFileError(ValueError):
+    # the upload as a whole cannot be read; nothing from it is imported
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.errors = []
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'errors': [{'row': row, 'error': error} for row, error in self.errors],
+        }
+
+
+def read_rows(file, filename, sheet = None):
+    """Yield (row number, {lower-cased header: value}) from an uploaded CSV or XLSX file.
+
+    Raises ImportFileError, possibly part way through, when the file is not a readable workbook or
+    UTF-8 CSV; import_records runs in one transaction, so the rows read before it are not kept.
+    """
+    is_xlsx = filename.lower().endswith('.xlsx')
+    try:
+        if is_xlsx:
+            # read-only mode streams the sheet instead of loading every cell
+            wb = load_workbook(file, read_only = True, data_only = True)
+            ws = wb[sheet] if sheet in wb.sheetnames else wb.worksheets[0]
+            rows = ws.iter_rows(values_only = True)
+        else:
+            rows = csv.reader(io.TextIOWrapper(file, encoding = 'utf-8-sig', newline = ''))
+
+        header = [str(name or '').strip().lower() for name in next(rows, [])]
+
+        for number, values in enumerate(rows, start = 2):
+            if any(value not in (None, '') for value in values):
+                yield number, dict(zip(header, values))
+    # a corrupt or renamed workbook fails in zipfile or openpyxl (KeyError for a missing archive member)
+    except (BadZipFile, InvalidFileException, KeyError):
+        raise ImportFileError('The file is not a valid Excel (.xlsx) workbook.')
+    except (UnicodeDecodeError, csv.Error):
+        if is_xlsx:
+            raise ImportFileError('The file is not a valid Excel (.xlsx) workbook.')
+        raise ImportFileError('The file could not be read as CSV; please save it as UTF-8 CSV.')
+
+
+def parse_row(row, group_field, max_length):
+    # returns (amount, date, description, group value) or raises ValueError with a readable message
+    try:
+        amount = to_money(row.get('amount'))
+    except ValueError:
+        raise ValueError('Amount is missing or not a number.')
+
+    date = row.get('date')
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    elif not isinstance(date, datetime.date):
+        try:
+            date = datetime.date.fromisoformat(str(date).strip()[:10])
+        except ValueError:
+            raise ValueError('Date is missing or not in YYYY-MM-DD format.')
+
+    description = str(row.get('description') or '').strip()
+    if not description:
+        raise ValueError('Description is missing.')
+
+    key = str(row.get(group_field) or '').strip()
+    if not key:
+        raise ValueError('%s is missing.' % group_field.capitalize())
+    # checked here: one value the database refuses would abort the whole file's transaction
+    if len(key) > max_length:
+        raise ValueError('%s is longer than %d characters.' % (group_field.capitalize(), max_length))
+    if '\x00' in description or '\x00' in key:
+        raise ValueError('The row contains a NUL character.')
+
+    return amount, date, description, key
+
+
+def content_hash(values, occurrence):
+    # identical rows within one file are told apart by their occurrence number, so re-importing the
+    # same file matches every row again. The amount is the parsed Decimal, already in cents; + 0
+    # turns -0.00 into 0.00
+    content = '%s|%s|%s|%s|%d' % (values[0] + 0, values[1].isoformat(), values[2], values[3], occurrence)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def float_content_hash(values, occurrence):
+    # the hash of rows imported while amounts were floats; still looked up, so files imported back
+    # then are recognised
+    content = '%r|%s|%s|%s|%d' % (float(values[0]), values[1].isoformat(), values[2], values[3], occurrence)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def import_records(kind, owner, rows, batch_size = IMPORT_BATCH_SIZE, currency = None):
+    """Validate and bulk insert (row number, row) pairs for owner in one transaction.
+
+    Amounts in the file are in `currency` (default: the base currency); each is kept as written,
+    alongside its value in the base currency at today's rate.
+    """
+    model, rollup_model, group_field, changed = IMPORT_KINDS[kind]
+    max_length = model._meta.get_field(group_field).max_length
+    table = rate_table()
+    currency = currency or settings.FX_BASE_CURRENCY
+    result = ImportResult()
+    occurrences = Counter()
+    deltas = new_deltas()
+    rows = iter(rows)
+
+    with transaction.atomic():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            records = {}
+            for number, row in batch:
+                try:
+                    values = parse_row(row, group_field, max_length)
+                except ValueError as ex:
+                    result.errors.append((number, str(ex)))
+                    continue
+
+                occurrences[values] += 1
+                records[content_hash(values, occurrences[values])] = (float_content_hash(values, occurrences[values]),
+                                                                     values)
+
+            while True:
+                # one query per batch finds everything imported by an earlier run, under either hash
+                lookup = list(records) + [old_hash for old_hash, _ in records.values()]
+                existing = set(model.objects.filter(owner = owner, import_hash__in = lookup).values_list(
+                    'import_hash', flat = True))
+
+                new = [(import_hash, values) for import_hash, (old_hash, values) in records.items()
+                       if import_hash not in existing and old_hash not in existing]
+                # the whole batch is converted in one step; hashes stay on the amounts as written in the file
+                amounts = table.convert([values[0] for _, values in new], settings.FX_BASE_CURRENCY, currency)
+
+                new_records = [
+                    model(owner = owner, amount = amount, entered_amount = entered, entered_currency = currency,
+                          date = date, description = description, import_hash = import_hash, **{group_field: key})
+                    for amount, (import_hash, (entered, date, description, key)) in zip(amounts, new)
+                ]
+                try:
+                    with transaction.atomic():
+                        model.objects.bulk_create(new_records, batch_size = batch_size)
+                    break
+                except IntegrityError:
+                    # a concurrent import of the same file committed some of these rows first: the
+                    # lookup finds them on the next pass, and they count as duplicates
+                    if not model.objects.filter(owner = owner, import_hash__in = [h for h, _ in new]).exists():
+                        raise
+
+            result.duplicates += len(records) - len(new_records)
+            result.created += len(new_records)
+
+            # bulk_create skips model signals, so the rollup deltas are collected here
+            for record in new_records:
+                add_delta(deltas, model, group_field, vars(record), 1)
+
+        # applied once for the whole file: at most one write per (month, category) touched
+        apply_deltas(rollup_model, group_field, deltas)
+
+    changed(owner.pk)
+    return result
@@ -0,0 +1,55 @@
+import os
+import time
+import datetime
+import resource
+import tempfile
+import multiprocessing
+from django.core.management.base import BaseCommand
+from expenses.exports import write_xlsx
+
+
+def synthetic_rows(count):
+    start = datetime.date(2015, 1, 1)
+    for i in range(count):
+        yield (round(5 + (i % 997) * 1.37, 2), 'Synthetic expense %d' % i, 'Category %d' % (i % 12),
+               start + datetime.timedelta(days = i % 3650))
+
+
+def run_once(count, results):
+    # each size runs in its own process so ru_maxrss is the peak for that size alone
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'benchmark.xlsx')
+        
+        started = time.perf_counter()
+        write_xlsx(path, [('Expenses', ['Amount', 'Description', 'Category', 'Date'], synthetic_rows(count))])
+        elapsed = time.perf_counter() - started
+        
+        results.put({
+            'rows': count,
+            'seconds': elapsed,
+            'rows_per_sec': count / elapsed,
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'file_mb': os.path.getsize(path) / (1024 * 1024),
+        })
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the streaming xlsx exporter (rows/sec and peak RSS) on synthetic rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default = '10000,100000,1000000',
+                            help = 'Comma separated row counts to benchmark.')
+
+    def handle(self, *args, **options):
+        results = multiprocessing.Queue()
+        
+        self.stdout.write('%10s %10s %14s %14s %10s' % ('rows', 'seconds', 'rows/sec', 'peak RSS (MB)', 'file (MB)'))
+        
+        for count in [int(x) for x in options['rows'].split(',')]:
+            process = multiprocessing.Process(target = run_once, args = (count, results))
+            process.start()
+            result = results.get()
+            process.join()
+            
+            self.stdout.write('%(rows)10d %(seconds)10.2f %(rows_per_sec)14.0f %(peak_rss_mb)14.1f %(file_mb)10.1f' % result)
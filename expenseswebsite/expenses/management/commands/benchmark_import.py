@@ -0,0 +1,45 @@
+import os
+import csv
+import time
+import datetime
+import tempfile
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from expenses.importers import import_records, read_rows, IMPORT_BATCH_SIZE
+
+
+BENCHMARK_USERNAME = 'import_benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the bulk import pipeline (rows/sec) on a synthetic CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type = int, default = 100000)
+        parser.add_argument('--batch-size', type = int, default = IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        owner = User.objects.create(username = BENCHMARK_USERNAME)
+        start = datetime.date(2015, 1, 1)
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, 'import.csv')
+                with open(path, 'w', newline = '') as file:
+                    writer = csv.writer(file)
+                    writer.writerow(['Amount', 'Description', 'Category', 'Date'])
+                    for i in range(options['rows']):
+                        writer.writerow([round(5 + (i % 997) * 1.37, 2), 'Imported expense %d' % i,
+                                         'Category %d' % (i % 12), start + datetime.timedelta(days = i % 3650)])
+                
+                # the second run measures the duplicate-detection path
+                for label in ('fresh import', 're-import (all duplicates)'):
+                    with open(path, 'rb') as file:
+                        started = time.perf_counter()
+                        result = import_records('expenses', owner, read_rows(file, path), options['batch_size'])
+                        elapsed = time.perf_counter() - started
+                        
+                    self.stdout.write('%-28s %8d created %8d duplicates %8.2fs %10.0f rows/sec' % (
+                        label, result.created, result.duplicates, elapsed, options['rows'] / elapsed))
+        finally:
+            owner.delete()
@@ -0,0 +1,58 @@
+import time
+import datetime
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from expenses.models import Expense, RecurringExpense
+from expenses.recurrence import materialize
+
+
+USERNAME_PREFIX = 'recurring_'
+FREQUENCIES = ('monthly', 'weekly', 'monthly', 'yearly', 'daily')
+
+
+class Command(BaseCommand):
+    help = ('Seed recurring expense rules spread over many users, materialize them in one run, then re-run '
+            'to check nothing is created twice. Seeded users are removed afterwards unless --keep is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type = int, default = 1000000)
+        parser.add_argument('--users', type = int, default = 10000)
+        parser.add_argument('--keep', action = 'store_true')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith = USERNAME_PREFIX).exists():
+            raise CommandError('Seeded users already exist; remove users named %s* first.' % USERNAME_PREFIX)
+
+        today = datetime.date.today()
+        User.objects.bulk_create([User(username = USERNAME_PREFIX + str(i)) for i in range(options['users'])])
+        owners = list(User.objects.filter(username__startswith = USERNAME_PREFIX).values_list('pk', flat = True))
+
+        started = time.perf_counter()
+        batch = []
+        for i in range(options['rules']):
+            # every rule is due today; a few are a couple of periods behind
+            start = today - datetime.timedelta(days = i % 3)
+            batch.append(RecurringExpense(
+                owner_id = owners[i % len(owners)], amount = '%d.%02d' % (5 + i % 900, i % 100),
+                description = 'Subscription %d' % i, category = 'Category %d' % (i % 10),
+                frequency = FREQUENCIES[i % len(FREQUENCIES)], start_date = start, next_date = start))
+            if len(batch) == 10000:
+                RecurringExpense.objects.bulk_create(batch)
+                batch = []
+        RecurringExpense.objects.bulk_create(batch)
+        self.stdout.write('Seeded %d rules over %d users in %.1fs' % (
+            options['rules'], len(owners), time.perf_counter() - started))
+
+        try:
+            for run in ('first run', 're-run'):
+                started = time.perf_counter()
+                result = materialize('expenses', today)
+                elapsed = time.perf_counter() - started
+                self.stdout.write('%-9s %8d rules %8d rows created in %6.1fs (%.0f rules/sec)' % (
+                    run, result.rules, result.created, elapsed, result.rules / elapsed if result.rules else 0))
+
+            created = Expense.objects.filter(owner_id__in = owners).count()
+            self.stdout.write('%d expense rows in total for the seeded users' % created)
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith = USERNAME_PREFIX).delete()
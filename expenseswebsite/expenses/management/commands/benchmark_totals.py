@@ -0,0 +1,50 @@
+import time
+import random
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from expenses import money
+
+
+class Command(BaseCommand):
+    help = 'Compare summing amounts as floats, as Decimals and as NumPy integer cents (speed and exactness).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type = int, default = 1000000)
+        parser.add_argument('--groups', type = int, default = 12)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        cents = [rng.randrange(1, 500000) for _ in range(options['rows'])]
+        keys = ['Category %d' % (i % options['groups']) for i in range(options['rows'])]
+        floats = [value / 100 for value in cents]
+        decimals = [Decimal(value).scaleb(-2) for value in cents]
+        exact = money.cents_to_money(sum(cents))
+
+        array = cents
+        if money.np is not None:
+            array = money.np.array(cents, dtype = money.np.int64)
+        else:
+            self.stdout.write('NumPy is not installed: the cents sums below are pure Python')
+
+        def float_loop():
+            total = 0
+            for value in floats:
+                total += value
+            return Decimal(repr(total))
+
+        runs = [
+            ('float loop', float_loop),
+            ('Decimal sum()', lambda: sum(decimals)),
+            ('money_total (cents)', lambda: money.money_total(array)),
+        ]
+
+        for label, run in runs:
+            started = time.perf_counter()
+            total = run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write('%-24s %10.1f ms  total %s  error %s' % (label, elapsed * 1000, total, total - exact))
+
+        started = time.perf_counter()
+        money.money_totals_by(keys, array)
+        self.stdout.write('%-24s %10.1f ms  (%d groups)' % (
+            'money_totals_by', (time.perf_counter() - started) * 1000, options['groups']))
@@ -0,0 +1,94 @@
+import datetime
+from django.db import connection
+from django.db.models import Sum
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from expenses.models import Expense
+from userincome.models import UserIncome
+
+
+USERNAME_PREFIX = 'queryplan_'
+BATCH_SIZE = 10000
+
+
+def plan_uses_index(plan):
+    # PostgreSQL: "Index Scan", "Index Only Scan", "Bitmap Index Scan"; SQLite: "USING [COVERING] INDEX"
+    if connection.vendor == 'postgresql':
+        return 'Index' in plan and 'Seq Scan' not in plan
+    return 'INDEX' in plan.upper()
+
+
+class Command(BaseCommand):
+    help = ('Seed a large synthetic dataset and fail if the list, paginator and summary queries '
+            'stop using index scans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type = int, default = 1000000, help = 'Rows of each type to seed.')
+        parser.add_argument('--users', type = int, default = 1000, help = 'Users to spread the rows over.')
+        parser.add_argument('--keep', action = 'store_true', help = 'Keep the seeded data afterwards.')
+
+    def seed(self, rows, users):
+        User.objects.bulk_create([User(username = USERNAME_PREFIX + str(i)) for i in range(users)])
+        owners = list(User.objects.filter(username__startswith = USERNAME_PREFIX))
+        start = datetime.date.today() - datetime.timedelta(days = 3650)
+        
+        for model, text_field in ((Expense, 'category'), (UserIncome, 'source')):
+            batch = []
+            for i in range(rows):
+                batch.append(model(**{
+                    'owner': owners[i % len(owners)],
+                    'amount': 1 + i % 500,
+                    'date': start + datetime.timedelta(days = i % 3650),
+                    'description': 'Seeded row %d' % i,
+                    text_field: 'Type %d' % (i % 12),
+                }))
+                if len(batch) == BATCH_SIZE:
+                    model.objects.bulk_create(batch)
+                    batch = []
+            model.objects.bulk_create(batch)
+            
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            
+        return owners[0]
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith = USERNAME_PREFIX).exists():
+            raise CommandError('Seeded users already exist; remove users named %s* first.' % USERNAME_PREFIX)
+        
+        self.stdout.write('Seeding %d rows per table over %d users...' % (options['rows'], options['users']))
+        owner = self.seed(options['rows'], options['users'])
+        
+        today = datetime.date.today()
+        six_months_ago = today - datetime.timedelta(days = 180)
+        expenses = Expense.objects.filter(owner = owner)
+        income = UserIncome.objects.filter(owner = owner)
+        
+        queries = {
+            'expenses index page': expenses.order_by('-date', '-id')[:10],
+            'expenses deep page': expenses.order_by('-date', '-id')[500:510],
+            'expenses count': expenses.values('id'),
+            'expenses summary': expenses.filter(date__gte = six_months_ago, date__lte = today).values(
+                'category').annotate(Sum('amount')).order_by(),
+            'income index page': income.order_by('-date', '-id')[:10],
+            'income deep page': income.order_by('-date', '-id')[500:510],
+            'income count': income.values('id'),
+        }
+        
+        failures = []
+        try:
+            for name, queryset in queries.items():
+                plan = queryset.explain()
+                ok = plan_uses_index(plan)
+                self.stdout.write('%s %s' % ('ok  ' if ok else 'FAIL', name))
+                self.stdout.write('\n'.join('      ' + line for line in plan.splitlines()))
+                if not ok:
+                    failures.append(name)
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith = USERNAME_PREFIX).delete()
+                
+        if failures:
+            raise CommandError('Queries not using an index: ' + ', '.join(failures))
+        
+        self.stdout.write(self.style.SUCCESS('All queries use index scans.'))
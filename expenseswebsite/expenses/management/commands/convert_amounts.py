@@ -0,0 +1,40 @@
+import time
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.core.management.base import BaseCommand, CommandError
+from expenses.money import convert_amounts, CONVERT_BATCH_SIZE
+
+
+# app, model, migration adding amount_decimal, migration dropping the float column
+CONVERSIONS = [
+    ('expenses', 'Expense', '0007_amount_decimal', '0009_amount_to_decimal'),
+    ('userincome', 'UserIncome', '0006_amount_decimal', '0008_amount_to_decimal'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Backfill the decimal amount columns in small batches while the site is running. '
+            'Run it after "migrate expenses 0007" and "migrate userincome 0006", then migrate the rest.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type = int, default = CONVERT_BATCH_SIZE)
+        parser.add_argument('--pause', type = float, default = 0,
+                            help = 'Seconds to sleep between batches to leave room for live traffic.')
+
+    def handle(self, *args, **options):
+        loader = MigrationLoader(connection)
+
+        for app, model_name, added, finished in CONVERSIONS:
+            if (app, finished) in loader.applied_migrations:
+                self.stdout.write('%s.%s: already converted' % (app, model_name))
+                continue
+            if (app, added) not in loader.applied_migrations:
+                raise CommandError('Run "manage.py migrate %s %s" first.' % (app, added))
+
+            # the current models no longer have the float column, so the model as of that migration is used
+            model = loader.project_state((app, added)).apps.get_model(app, model_name)
+
+            started = time.perf_counter()
+            converted = convert_amounts(model, options['batch_size'], options['pause'])
+            self.stdout.write('%s.%s: %d rows converted in %.1fs' % (
+                app, model_name, converted, time.perf_counter() - started))
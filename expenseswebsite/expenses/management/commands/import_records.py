@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from userpreferences.fx import rate_table
+from expenses.importers import import_records, read_rows, ImportFileError, IMPORT_KINDS, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Import expenses or income for a user from a CSV or XLSX file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices = sorted(IMPORT_KINDS))
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type = int, default = IMPORT_BATCH_SIZE)
+        parser.add_argument('--currency', help = 'Currency code of the amounts in the file (default: the base currency).')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username = options['username'])
+        except User.DoesNotExist:
+            raise CommandError('No user named %s.' % options['username'])
+        
+        if options['currency'] and not rate_table().has(options['currency']):
+            raise CommandError('No exchange rate for %s.' % options['currency'])
+        
+        # xlsx exports hold an 'Expenses' and an 'Income' sheet
+        sheet = options['kind'].capitalize()
+        
+        with open(options['path'], 'rb') as file:
+            rows = read_rows(file, options['path'], sheet)
+            try:
+                result = import_records(options['kind'], owner, rows, options['batch_size'], options['currency'])
+            except ImportFileError as ex:
+                raise CommandError(str(ex))
+            
+        for row, error in result.errors:
+            self.stderr.write('Row %d: %s' % (row, error))
+            
+        self.stdout.write(self.style.SUCCESS('Imported %d rows, skipped %d duplicates and %d invalid rows.' % (
+            result.created, result.duplicates, len(result.errors))))
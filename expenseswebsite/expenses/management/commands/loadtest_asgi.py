@@ -0,0 +1,175 @@
+import json
+import time
+import random
+import asyncio
+import datetime
+import resource
+from collections import Counter
+from importlib import import_module
+from urllib.parse import urlsplit
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from expenses.models import Expense, ExpenseMonthlyRollup
+from expenses.rollups import rebuild_rollups
+
+
+LOADTEST_USERNAME = 'loadtest'
+SEARCH_TERMS = ('coffee', 'rent', 'food', '12', '2021', 'travel', 'gro')
+
+# name -> (method, path, JSON body or None)
+ENDPOINTS = {
+    'search-expenses': ('POST', '/search-expenses', lambda: {'searchText': random.choice(SEARCH_TERMS)}),
+    'search-income': ('POST', '/income/search-income', lambda: {'searchText': random.choice(SEARCH_TERMS)}),
+    'summary': ('GET', '/expense_category_summary?months=6', None),
+    # every client shares one IP, so past the per-IP limit this measures the 429 path
+    'validate-username': ('POST', '/authentication/validate-username', lambda: {'username': LOADTEST_USERNAME}),
+}
+
+
+async def read_response(reader):
+    # just enough HTTP/1.1 to keep connections alive: status, headers, Content-Length or chunked body
+    status_line = await reader.readuntil(b'\r\n')
+    status = int(status_line.split()[1])
+    headers = {}
+
+    for line in (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n'):
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+class Client:
+    def __init__(self, host, port, cookie):
+        self.host, self.port, self.cookie = host, port, cookie
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        head = ('%s %s HTTP/1.1\r\nHost: %s\r\nCookie: sessionid=%s\r\nContent-Type: application/json\r\n'
+                'Content-Length: %d\r\n\r\n' % (method, path, self.host, self.cookie, len(payload)))
+        self.writer.write(head.encode('latin-1') + payload)
+
+        status, keep_alive = await read_response(self.reader)
+        if not keep_alive:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run_client(client, endpoints, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        method, path, body = ENDPOINTS[random.choice(endpoints)]
+        started = time.perf_counter()
+        try:
+            status = await client.request(method, path, body() if body else None)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as ex:
+            statuses[type(ex).__name__] += 1
+            client.close()
+            # back off a little so a refused connection does not turn into a busy loop
+            await asyncio.sleep(0.05)
+            continue
+        latencies.append(time.perf_counter() - started)
+        statuses[status] += 1
+    client.close()
+
+
+async def run_level(url, cookie, clients, duration, endpoints):
+    parts = urlsplit(url)
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+
+    await asyncio.gather(*(run_client(Client(parts.hostname, parts.port or 80, cookie), endpoints, deadline,
+                                      latencies, statuses) for _ in range(clients)))
+
+    return latencies, statuses, time.perf_counter() - started
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Compare requests/sec and latency of the JSON endpoints between a WSGI and an ASGI deployment, '
+            'e.g. "gunicorn expenseswebsite.wsgi -w 4 -b :8000" and '
+            '"uvicorn expenseswebsite.asgi:application --workers 4 --port 8001". '
+            'Both servers must use the same database as this command.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', default = 'http://127.0.0.1:8000')
+        parser.add_argument('--asgi', default = 'http://127.0.0.1:8001')
+        parser.add_argument('--clients', type = int, nargs = '+', default = [100, 500, 1000])
+        parser.add_argument('--duration', type = float, default = 20, help = 'Seconds per deployment and level.')
+        parser.add_argument('--endpoints', nargs = '+', choices = sorted(ENDPOINTS),
+                            default = ['search-expenses', 'search-income', 'summary'])
+        parser.add_argument('--rows', type = int, default = 5000, help = 'Expenses created for a new test user.')
+
+    def handle(self, *args, **options):
+        # one connection per client: make sure 1000 clients do not run out of file descriptors
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < max(options['clients']) + 100:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        cookie = self.login(options['rows'])
+        deployments = [('WSGI', options['wsgi']), ('ASGI', options['asgi'])]
+
+        self.stdout.write('%-5s %8s %9s %10s %9s %9s  %s' % (
+            'mode', 'clients', 'requests', 'req/sec', 'p50 ms', 'p99 ms', 'responses'))
+
+        for clients in options['clients']:
+            for mode, url in deployments:
+                latencies, statuses, elapsed = asyncio.run(
+                    run_level(url, cookie, clients, options['duration'], options['endpoints']))
+
+                if not latencies:
+                    raise CommandError('No responses from %s (%s): %s' % (mode, url, dict(statuses)))
+
+                latencies.sort()
+                self.stdout.write('%-5s %8d %9d %10.0f %9.1f %9.1f  %s' % (
+                    mode, clients, len(latencies), len(latencies) / elapsed, percentile(latencies, 0.5) * 1000,
+                    percentile(latencies, 0.99) * 1000,
+                    ' '.join('%s=%d' % item for item in sorted(statuses.items(), key = str))))
+
+    def login(self, rows):
+        # a database session shared with both servers, so no login round trip is needed
+        user, created = User.objects.get_or_create(username = LOADTEST_USERNAME)
+
+        if created:
+            today = datetime.date.today()
+            Expense.objects.bulk_create([
+                Expense(owner = user, amount = round(1 + (i % 500) * 1.3, 2), date = today - datetime.timedelta(days = i % 730),
+                        description = '%s %d' % (SEARCH_TERMS[i % len(SEARCH_TERMS)], i), category = 'Category %d' % (i % 8))
+                for i in range(rows)
+            ], batch_size = 1000)
+            # bulk_create skips the signals that keep the monthly rollups (and so the summary) current
+            rebuild_rollups(Expense, ExpenseMonthlyRollup, 'category', [user.pk])
+
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+
+        return session.session_key
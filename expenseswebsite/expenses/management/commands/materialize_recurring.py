@@ -0,0 +1,26 @@
+import time
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from expenses.recurrence import materialize, RECURRENCE_KINDS, RECURRENCE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Create the expense and income rows of every recurring rule that has come due, for all users. '
+            'Safe to re-run and to run from a daily cron job.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kinds', nargs = '+', choices = sorted(RECURRENCE_KINDS), default = list(RECURRENCE_KINDS))
+        parser.add_argument('--date', help = 'Materialize occurrences due by this date (YYYY-MM-DD, default today).')
+        parser.add_argument('--batch-size', type = int, default = RECURRENCE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            today = datetime.date.fromisoformat(options['date']) if options['date'] else datetime.date.today()
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD.')
+
+        for kind in options['kinds']:
+            started = time.perf_counter()
+            result = materialize(kind, today, options['batch_size'])
+            self.stdout.write('%s: %d rules, %d rows created, %d already there, %d rules finished in %.1fs' % (
+                kind, result.rules, result.created, result.duplicates, result.finished, time.perf_counter() - started))
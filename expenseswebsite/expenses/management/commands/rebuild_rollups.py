@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from expenses.rollups import rebuild_rollups
+from expenses.budgets import recount_budgets
+from expenses.models import Expense, ExpenseMonthlyRollup
+from userincome.models import UserIncome, IncomeMonthlyRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly expense and income rollup tables from the raw rows, and recount budget spend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type = int, action = 'append', dest = 'users',
+                            help = 'Only rebuild this user id (may be repeated).')
+
+    def handle(self, *args, **options):
+        expenses = rebuild_rollups(Expense, ExpenseMonthlyRollup, 'category', options['users'])
+        income = rebuild_rollups(UserIncome, IncomeMonthlyRollup, 'source', options['users'])
+        # budget spend is kept in step with the rollups, so it is recounted from the rebuilt rows
+        budgets = recount_budgets(options['users'])
+        
+        self.stdout.write(self.style.SUCCESS('Rebuilt %d expense and %d income rollup rows, recounted %d budgets.' % (
+            expenses, income, budgets)))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_search_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'category', 'date'], name='expense_owner_cat_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', '-date', '-id'], include=('amount', 'category'), name='expense_list_covering_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # step 1 of 3: a nullable column is added without rewriting the table
+
+    dependencies = [
+        ('expenses', '0006_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='amount_decimal',
+            field=models.DecimalField(decimal_places=2, max_digits=14, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0010_recurring_rules'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=255)),
+                ('period', models.CharField(choices=[('monthly', 'Monthly'), ('yearly', 'Yearly')], default='monthly', max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('period_start', models.DateField()),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['category'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'category', 'period'), name='budget_unique')],
+            },
+        ),
+    ]
@@ -1,20 +1,54 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.validators import MinValueValidator
 from django.utils.timezone import now
 from django.contrib.auth.models import User
+from .money import MONEY_MAX_DIGITS, MONEY_DECIMAL_PLACES
+from .rollups import row_deleting
+from .schedules import FREQUENCIES, occurrence_date, schedule_of
 
 
 class Expense(models.Model):
-    amount = models.FloatField()
+    amount = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES)
     date = models.DateField(default = now)
     description = models.TextField()
     owner = models.ForeignKey(to = User, on_delete=models.CASCADE)
     category = models.CharField(max_length = 255)
+    # the amount as typed and the currency it was typed in; amount holds it in FX_BASE_CURRENCY at the
+    # rate of the day it was entered, and every total is summed from that
+    entered_amount = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES,
+                                         blank = True, null = True)
+    entered_currency = models.CharField(max_length = 3, blank = True, default = '')
+    # content hash of rows created by a file import, used to skip rows imported before
+    import_hash = models.CharField(max_length = 64, blank = True, null = True)
+    # "<rule id>:<occurrence>" of rows created by a recurring rule, so a re-run cannot create them twice
+    recurrence_key = models.CharField(max_length = 64, blank = True, null = True)
     
     def __str__(self):
         return self.category
     
+    def save(self, *args, **kwargs):
+        # the rollup (and budget) update runs from post_save: it commits or rolls back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            row_deleting.send(sender = Expense, instance = self)
+            return super().delete(*args, **kwargs)
+    
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields = ['owner', 'category', 'date'], name = 'expense_owner_cat_date_idx'),
+            # walks the list page in order and carries its short columns (PostgreSQL only). description is
+            # left out: it is unbounded, and a btree entry over ~2.7 KB cannot be stored at all
+            models.Index(fields = ['owner', '-date', '-id'], include = ['amount', 'category'],
+                         name = 'expense_list_covering_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields = ['owner', 'import_hash'], name = 'expense_import_hash_unique'),
+            models.UniqueConstraint(fields = ['recurrence_key'], name = 'expense_recurrence_key_unique'),
+        ]
         
         
 class Category(models.Model):
@@ -24,4 +58,108 @@ class Category(models.Model):
         verbose_name_plural = 'Categories'
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class ExpenseMonthlyRollup(models.Model):
+    # running per-user, per-month, per-category totals, kept in step with Expense by signals
+    owner = models.ForeignKey(to = User, on_delete=models.CASCADE)
+    month = models.DateField()
+    category = models.CharField(max_length = 255)
+    total = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES, default = 0)
+    count = models.IntegerField(default = 0)
+    
+    def __str__(self):
+        return '%s %s' % (self.month, self.category)
+    
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(fields = ['owner', 'month', 'category'], name = 'expense_rollup_unique'),
+        ]
+
+
+class RecurringExpense(models.Model):
+    # rent, subscriptions...: materialized into Expense rows by "manage.py materialize_recurring"
+    owner = models.ForeignKey(to = User, on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES)
+    description = models.TextField()
+    category = models.CharField(max_length = 255)
+    frequency = models.CharField(max_length = 10, choices = FREQUENCIES, default = 'monthly')
+    interval = models.PositiveSmallIntegerField(default = 1, validators = [MinValueValidator(1)])
+    start_date = models.DateField(default = now)
+    end_date = models.DateField(blank = True, null = True)
+    # occurrences materialized so far, and the date of the next one
+    occurrences = models.IntegerField(default = 0)
+    next_date = models.DateField(blank = True)
+    active = models.BooleanField(default = True)
+    
+    # start_date, frequency and interval as last loaded or saved
+    loaded_schedule = None
+    
+    def __str__(self):
+        return '%s (%s)' % (self.description, self.frequency)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        rule = super().from_db(db, field_names, values)
+        rule.loaded_schedule = schedule_of(rule)
+        return rule
+    
+    def save(self, *args, **kwargs):
+        # next_date is derived: set from the schedule when the rule is created, and recomputed when its
+        # start, frequency or interval are edited (past the occurrences already materialized)
+        if self.next_date is None or schedule_of(self) != self.loaded_schedule:
+            self.next_date = occurrence_date(self.start_date, self.frequency, self.interval, self.occurrences)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'next_date'}
+        super().save(*args, **kwargs)
+        self.loaded_schedule = schedule_of(self)
+    
+    class Meta:
+        indexes = [
+            # the materializer's scan: due rules, oldest first and each user's together
+            models.Index(fields = ['next_date', 'owner', 'id'], condition = models.Q(active = True),
+                         name = 'recurring_expense_due_idx'),
+        ]
+        constraints = [
+            # an interval of 0 would repeat the same date forever
+            models.CheckConstraint(condition = models.Q(interval__gte = 1), name = 'recurring_expense_interval_positive'),
+        ]
+
+
+class Budget(models.Model):
+    # a spending limit for one category; spent is the current period's total, kept up to date from
+    # the rollup deltas of every write (see expenses.budgets)
+    PERIODS = [
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    ]
+    
+    owner = models.ForeignKey(to = User, on_delete=models.CASCADE)
+    category = models.CharField(max_length = 255)
+    period = models.CharField(max_length = 10, choices = PERIODS, default = 'monthly')
+    amount = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES)
+    period_start = models.DateField()
+    spent = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES, default = 0)
+    
+    def __str__(self):
+        return '%s (%s)' % (self.category, self.period)
+    
+    @property
+    def remaining(self):
+        return self.amount - self.spent
+    
+    @property
+    def over_budget(self):
+        return self.spent > self.amount
+    
+    @property
+    def percent_used(self):
+        return min(100, int(self.spent * 100 / self.amount)) if self.amount > 0 else 100
+    
+    class Meta:
+        ordering = ['category']
+        constraints = [
+            models.UniqueConstraint(fields = ['owner', 'category', 'period'], name = 'budget_unique'),
+        ]
@@ -0,0 +1,108 @@
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from django.db import transaction
+from django.db.models import F, Min, Max, BigIntegerField, DecimalField
+from django.db.models.functions import Cast, Round
+
+try:
+    import numpy as np
+except ImportError:
+    # without NumPy the totals below are plain Python integer sums (still exact, just slower) and
+    # batch currency conversion (userpreferences.fx) runs as a plain Python loop
+    np = None
+
+
+# amounts are stored as DecimalField(14, 2): exact cents, up to 999,999,999,999.99
+MONEY_MAX_DIGITS = 14
+MONEY_DECIMAL_PLACES = 2
+CENT = Decimal('0.01')
+MONEY_LIMIT = Decimal(10) ** (MONEY_MAX_DIGITS - MONEY_DECIMAL_PLACES)
+INT64_MAX = 2 ** 63 - 1
+
+# rows converted per transaction by convert_amounts, so no lock is held for long
+CONVERT_BATCH_SIZE = 5000
+
+
+def to_money(value):
+    """Parse a number, string or Decimal into a Decimal rounded to cents; ValueError if it is not an amount."""
+    try:
+        # going through str() keeps 0.1 as 0.1 rather than the binary float's expansion; half-even
+        # is the rounding Django applies when saving a DecimalField, so deltas match what is stored
+        amount = Decimal(str(value).strip()).quantize(CENT, ROUND_HALF_EVEN)
+    except InvalidOperation:
+        raise ValueError('%r is not an amount.' % (value,))
+
+    if not amount.is_finite() or abs(amount) >= MONEY_LIMIT:
+        raise ValueError('%r is not an amount.' % (value,))
+
+    return amount
+
+
+def amount_cents(queryset, field = 'amount'):
+    """Amounts of queryset as integer cents (a NumPy int64 array when available), computed by the database."""
+    cents = queryset.order_by().annotate(cents = Cast(Round(F(field) * 100), BigIntegerField())).values_list(
+        'cents', flat = True).iterator(chunk_size = 10000)
+
+    if np is None:
+        return list(cents)
+    return np.fromiter(cents, dtype = np.int64)
+
+
+def cents_to_money(cents):
+    return Decimal(int(cents)).scaleb(-MONEY_DECIMAL_PLACES)
+
+
+def fits_int64(cents):
+    # int64 sums wrap silently; when the largest amount times the row count might not fit (about
+    # 92,000 rows at the largest storable amount) the totals fall back to Python's exact integers
+    return not len(cents) or int(np.abs(cents).max()) * len(cents) <= INT64_MAX
+
+
+def money_total(cents):
+    """Exact sum of an array (or list) of integer cents, as a Decimal."""
+    if np is not None and isinstance(cents, np.ndarray):
+        if fits_int64(cents):
+            return cents_to_money(cents.sum(dtype = np.int64))
+        cents = cents.tolist()
+    return cents_to_money(sum(cents))
+
+
+def money_totals_by(keys, cents):
+    """{key: exact Decimal total} for parallel sequences of group keys and integer cents."""
+    if np is None or not isinstance(cents, np.ndarray) or not fits_int64(cents):
+        totals = {}
+        for key, value in zip(keys, cents):
+            totals[key] = totals.get(key, 0) + int(value)
+        return {key: cents_to_money(value) for key, value in totals.items()}
+
+    # group keys become small integer codes, then each group is added up in int64:
+    # exact, unlike bincount's float64 weights
+    codes = {}
+    positions = np.fromiter((codes.setdefault(key, len(codes)) for key in keys), dtype = np.int64, count = len(cents))
+    sums = np.zeros(len(codes), dtype = np.int64)
+    np.add.at(sums, positions, cents)
+
+    return {key: cents_to_money(sums[code]) for key, code in codes.items()}
+
+
+def convert_amounts(model, batch_size = CONVERT_BATCH_SIZE, pause = 0):
+    """Copy the float amount into amount_decimal for rows not converted yet; returns the number of rows.
+
+    Walks the primary key in ranges of batch_size, each in its own short transaction, so only the
+    rows of one batch are locked at a time and the site keeps writing while it runs. Safe to re-run.
+    """
+    bounds = model.objects.aggregate(low = Min('pk'), high = Max('pk'))
+    if bounds['low'] is None:
+        return 0
+
+    converted = 0
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        with transaction.atomic():
+            converted += model.objects.filter(pk__gte = start, pk__lt = start + batch_size,
+                                              amount_decimal__isnull = True).update(
+                amount_decimal = Cast('amount', DecimalField(max_digits = MONEY_MAX_DIGITS,
+                                                             decimal_places = MONEY_DECIMAL_PLACES)))
+        if pause:
+            time.sleep(pause)
+
+    return converted
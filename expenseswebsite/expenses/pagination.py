@@ -0,0 +1,119 @@
+import base64
+import datetime
+from django.conf import settings
+from django.db.models import Q
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+
+PAGE_SIZES = (10, 25, 50, 100)
+COUNT_CACHE_TIMEOUT = 5 * 60
+
+
+class KeysetPage:
+    """A page of rows ordered by (-date, -id), linked to its neighbours by opaque cursors."""
+    is_keyset = True
+
+    def __init__(self, object_list, per_page, next_cursor = None, previous_cursor = None, total = None):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def encode_cursor(row, direction):
+    value = '%s|%s|%s' % (direction, row.date.isoformat(), row.pk)
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # anything malformed just means "start from the first page"
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, date, pk = value.split('|')
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, datetime.date.fromisoformat(date), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor, per_page, total = None):
+    """Fetch one page after/before the cursor; every page costs the same index seek as the first."""
+    position = decode_cursor(cursor) if cursor else None
+    
+    if position is None:
+        rows = list(queryset.order_by('-date', '-id')[:per_page + 1])
+        has_more, has_previous = len(rows) > per_page, False
+    elif position[0] == 'next':
+        _, date, pk = position
+        # the OR alone is not an index bound; the redundant date__lte makes the seek start at the cursor
+        rows = list(queryset.filter(Q(date__lt = date) | Q(date = date, id__lt = pk), date__lte = date).order_by(
+            '-date', '-id')[:per_page + 1])
+        has_more, has_previous = len(rows) > per_page, True
+    else:
+        # walking backwards: read the rows just above the cursor in ascending order, then flip them
+        _, date, pk = position
+        rows = list(queryset.filter(Q(date__gt = date) | Q(date = date, id__gt = pk), date__gte = date).order_by(
+            'date', 'id')[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, per_page, encode_cursor(rows[-1], 'next') if rows else None,
+                          encode_cursor(rows[0], 'prev') if rows and has_previous else None, total)
+        
+    rows = rows[:per_page]
+    return KeysetPage(rows, per_page, encode_cursor(rows[-1], 'next') if rows and has_more else None,
+                      encode_cursor(rows[0], 'prev') if rows and has_previous else None, total)
+
+
+def count_cache_key(name, user_id):
+    return '%s_count_%s' % (name, user_id)
+
+
+def cached_count(name, user_id, queryset):
+    key = count_cache_key(name, user_id)
+    total = cache.get(key)
+    
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, COUNT_CACHE_TIMEOUT)
+        
+    return total
+
+
+def invalidate_count(name, user_id):
+    cache.delete(count_cache_key(name, user_id))
+
+
+def page_size(request):
+    try:
+        per_page = int(request.GET.get('per_page', PAGE_SIZES[0]))
+    except ValueError:
+        return PAGE_SIZES[0]
+    
+    return per_page if per_page in PAGE_SIZES else PAGE_SIZES[0]
+
+
+def paginate(request, queryset, name):
+    """Paginate an owner's rows in the mode set by settings.LIST_PAGINATION ('keyset' or 'offset')."""
+    per_page = page_size(request)
+    
+    if settings.LIST_PAGINATION == 'keyset':
+        total = cached_count(name, request.user.pk, queryset) if settings.LIST_PAGINATION_COUNT else None
+        return keyset_page(queryset, request.GET.get('cursor'), per_page, total)
+    
+    paginator = Paginator(queryset.order_by('-date', '-id'), per_page)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,119 @@
+import os
+import time
+import uuid
+from django.conf import settings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+# PDF exports are rendered in a small process pool so WeasyPrint never blocks a web worker.
+# Job state lives on disk next to the output, so any web worker can answer a status poll:
+#   <job>.job   queued/rendering; holds the time it was queued
+#   <job>.pdf   finished (the download)
+#   <job>.error failed
+_executor = None
+
+
+def get_executor():
+    global _executor
+    
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers = settings.PDF_EXPORT_WORKERS)
+        
+    return _executor
+
+
+def job_path(user_id, job_id, extension):
+    return os.path.join(settings.PDF_EXPORT_ROOT, str(user_id), job_id + extension)
+
+
+def remove_quietly(path):
+    # another worker's purge (or the render finishing) may have removed it first
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def render_pdf(html_string, base_path):
+    # runs inside a pool process; the PDF is written straight to its final location
+    from weasyprint import HTML
+    
+    try:
+        HTML(string = html_string).write_pdf(base_path + '.part')
+        os.replace(base_path + '.part', base_path + '.pdf')
+    except Exception as ex:
+        with open(base_path + '.error', 'w') as error_file:
+            error_file.write(str(ex))
+    finally:
+        for extension in ('.part', '.job'):
+            remove_quietly(base_path + extension)
+
+
+def purge_expired(user_id):
+    user_dir = os.path.join(settings.PDF_EXPORT_ROOT, str(user_id))
+    if not os.path.isdir(user_dir):
+        return
+    
+    expiry = time.time() - settings.PDF_EXPORT_TTL
+    
+    for entry in os.scandir(user_dir):
+        try:
+            expired = entry.is_file() and entry.stat().st_mtime < expiry
+        except FileNotFoundError:
+            continue
+        if expired:
+            remove_quietly(entry.path)
+
+
+def enqueue_pdf(user_id, html_string):
+    """Queue an HTML document for rendering and return the job id."""
+    purge_expired(user_id)
+    os.makedirs(os.path.join(settings.PDF_EXPORT_ROOT, str(user_id)), exist_ok = True)
+    
+    global _executor
+    
+    job_id = str(uuid.uuid4())
+    with open(job_path(user_id, job_id, '.job'), 'w') as job_file:
+        job_file.write(repr(time.time()))
+    try:
+        get_executor().submit(render_pdf, html_string, job_path(user_id, job_id, ''))
+    except BrokenProcessPool:
+        # a pool process died (killed, out of memory); the pool is unusable from then on, so a new one
+        # takes this job and the ones after it
+        _executor = None
+        get_executor().submit(render_pdf, html_string, job_path(user_id, job_id, ''))
+    
+    return job_id
+
+
+def queued_at(user_id, job_id):
+    try:
+        with open(job_path(user_id, job_id, '.job'), 'r') as job_file:
+            return float(job_file.read() or 0)
+    except FileNotFoundError:
+        return None
+
+
+def job_status(user_id, job_id):
+    """One of 'done', 'failed', 'pending', or None for an unknown/expired job.
+
+    A job still pending PDF_EXPORT_DEADLINE seconds after it was queued is reported as failed: its
+    pool process died with it, or the pool went down with the web worker that queued it.
+    """
+    purge_expired(user_id)
+    
+    # the .job file goes once the render finishes, so it is read first: a job seen pending here and
+    # finished by the time of the checks below is still answered correctly
+    queued = queued_at(user_id, job_id)
+    
+    if os.path.exists(job_path(user_id, job_id, '.pdf')):
+        return 'done'
+    if os.path.exists(job_path(user_id, job_id, '.error')):
+        return 'failed'
+    if queued is None:
+        return None
+    if time.time() - queued > settings.PDF_EXPORT_DEADLINE:
+        return 'failed'
+    
+    return 'pending'
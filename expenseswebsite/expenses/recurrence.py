@@ -0,0 +1,115 @@
+import datetime
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
+from .models import Expense, ExpenseMonthlyRollup, RecurringExpense
+from .signals import expenses_changed
+from .schedules import occurrence_date
+from .rollups import new_deltas, add_delta, apply_deltas
+from userincome.signals import income_changed
+from userincome.models import UserIncome, IncomeMonthlyRollup, RecurringIncome
+
+
+# rules handled per transaction
+RECURRENCE_BATCH_SIZE = 2000
+
+# rule model, record model, rollup model, grouping column and cache invalidation hook of each type
+RECURRENCE_KINDS = {
+    'expenses': (RecurringExpense, Expense, ExpenseMonthlyRollup, 'category', expenses_changed),
+    'income': (RecurringIncome, UserIncome, IncomeMonthlyRollup, 'source', income_changed),
+}
+
+
+class MaterializeResult:
+    def __init__(self):
+        self.rules = 0
+        self.created = 0
+        self.duplicates = 0
+        self.finished = 0
+
+
+def recurrence_key(rule, n):
+    return '%d:%d' % (rule.pk, n)
+
+
+def due_occurrences(rule, today):
+    """(occurrence number, date) of every occurrence of rule due by today and not materialized yet."""
+    n = rule.occurrences
+    date = rule.next_date
+    while date <= today and (rule.end_date is None or date <= rule.end_date):
+        yield n, date
+        n += 1
+        date = occurrence_date(rule.start_date, rule.frequency, rule.interval, n)
+
+
+def advance(rule):
+    # after its due occurrences: the rule moves to its next date, and is switched off past its end date
+    rule.next_date = occurrence_date(rule.start_date, rule.frequency, rule.interval, rule.occurrences)
+    if rule.end_date is not None and rule.next_date > rule.end_date:
+        rule.active = False
+
+
+def materialize_batch(kind, rules, today, result):
+    rule_model, model, rollup_model, group_field, _ = RECURRENCE_KINDS[kind]
+
+    records = {}
+    # rule ids by what their update sets: rules due on the same day mostly move the same way, so a
+    # handful of UPDATEs replace bulk_update()'s per-row CASE expressions
+    moves = defaultdict(list)
+    for rule in rules:
+        materialized = rule.occurrences
+        for n, date in due_occurrences(rule, today):
+            records[recurrence_key(rule, n)] = model(
+                owner_id = rule.owner_id, amount = rule.amount, date = date, description = rule.description,
+                recurrence_key = recurrence_key(rule, n), **{group_field: getattr(rule, group_field)})
+            rule.occurrences = n + 1
+        advance(rule)
+        moves[(rule.occurrences - materialized, rule.next_date, rule.active)].append(rule.pk)
+
+    # rows a crashed or concurrent run already wrote are skipped: one query per batch
+    existing = set(model.objects.filter(recurrence_key__in = records.keys()).values_list('recurrence_key', flat = True))
+    new_records = [record for key, record in records.items() if key not in existing]
+    model.objects.bulk_create(new_records, batch_size = 1000)
+    for (added, next_date, active), pks in moves.items():
+        rule_model.objects.filter(pk__in = pks).update(
+            occurrences = F('occurrences') + added, next_date = next_date, active = active)
+
+    # bulk_create skips model signals, so the rollup deltas are collected here
+    deltas = new_deltas()
+    for record in new_records:
+        add_delta(deltas, model, group_field, vars(record), 1)
+    apply_deltas(rollup_model, group_field, deltas)
+
+    result.rules += len(rules)
+    result.created += len(new_records)
+    result.duplicates += len(existing)
+    result.finished += sum(1 for rule in rules if not rule.active)
+    return {record.owner_id for record in new_records}
+
+
+def materialize(kind, today = None, batch_size = RECURRENCE_BATCH_SIZE):
+    """Create every occurrence due by today of every active rule of kind, for all users.
+
+    Due rules are read through the partial (next_date, owner, id) index a batch at a time; a
+    materialized rule moves past today and so drops out of the next batch's scan, which makes the
+    whole run a single pass. Keeping each user's rules together means most rollup rows are written
+    by one batch only. Each batch is one transaction: its rows, rollup deltas and rule updates
+    commit together.
+    """
+    rule_model, _, _, _, changed = RECURRENCE_KINDS[kind]
+    today = today or datetime.date.today()
+    result = MaterializeResult()
+    owners = set()
+
+    while True:
+        with transaction.atomic():
+            # skip_locked lets two runs share the work instead of waiting on each other (PostgreSQL)
+            rules = list(rule_model.objects.select_for_update(skip_locked = True).filter(
+                active = True, next_date__lte = today).order_by('next_date', 'owner_id', 'id')[:batch_size])
+            if not rules:
+                break
+            owners |= materialize_batch(kind, rules, today, result)
+
+    for owner_id in owners:
+        changed(owner_id)
+    return result
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from django.dispatch import Signal
+from django.db.models import F, Sum, Count
+from django.db import transaction, IntegrityError
+from django.db.models.functions import TruncMonth
+from .money import to_money
+
+
+# above this many rollup rows per write, reading them once and writing in bulk is cheaper
+BULK_DELTA_THRESHOLD = 10
+
+# sent with sender = the rollup model and the {(owner_id, month, key): (amount, count)} deltas just
+# applied, so totals derived from the rollups (budget spend) follow every write path
+rollups_changed = Signal()
+
+# sent by Expense.delete() and UserIncome.delete() with the instance, inside the delete's transaction
+# and before the row goes. Not pre_delete/post_delete: any receiver of those makes Django load and
+# signal every row a queryset delete or a cascade removes (deleting a user would read all their
+# rows). Rows deleted in bulk adjust the rollups themselves (expenses.bulk), and a deleted user's
+# rollup rows go with the user
+row_deleting = Signal()
+
+
+def month_start(date):
+    return date.replace(day = 1)
+
+
+def row_values(model, group_field, values):
+    # normalise raw attribute values (views assign POSTed strings) into (owner_id, month, key, amount)
+    date = model._meta.get_field('date').to_python(values['date'])
+    amount = to_money(values['amount'])
+    return values['owner_id'], month_start(date), values[group_field], amount
+
+
+def snapshot(instance, group_field):
+    """The rollup-relevant values of an instance as loaded, or None if any were deferred."""
+    fields = ('owner_id', 'date', 'amount', group_field)
+    if instance.pk is None or any(f not in instance.__dict__ for f in fields):
+        return None
+    return {f: instance.__dict__[f] for f in fields}
+
+
+def add_delta(deltas, model, group_field, values, sign):
+    owner_id, month, key, amount = row_values(model, group_field, values)
+    total, count = deltas[(owner_id, month, key)]
+    deltas[(owner_id, month, key)] = (total + sign * amount, count + sign)
+
+
+def new_deltas():
+    """{(owner_id, month, key): (amount, count)}"""
+    return defaultdict(lambda: (0, 0))
+
+
+def apply_deltas(rollup_model, group_field, deltas):
+    """Add each (amount, count) delta to its rollup row, creating the row when needed.
+    
+    rollups_changed is sent with the applied deltas, inside the caller's transaction.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    
+    if len(deltas) > BULK_DELTA_THRESHOLD:
+        apply_deltas_in_bulk(rollup_model, group_field, deltas)
+    else:
+        apply_deltas_one_by_one(rollup_model, group_field, deltas)
+        
+    if deltas:
+        rollups_changed.send(sender = rollup_model, group_field = group_field, deltas = deltas)
+
+
+def apply_deltas_one_by_one(rollup_model, group_field, deltas):
+    for (owner_id, month, key), (amount, count) in deltas.items():
+        lookup = {'owner_id': owner_id, 'month': month, group_field: key}
+        updated = rollup_model.objects.filter(**lookup).update(total = F('total') + amount, count = F('count') + count)
+        
+        if not updated:
+            try:
+                with transaction.atomic():
+                    rollup_model.objects.create(total = amount, count = count, **lookup)
+            except IntegrityError:
+                # another request created the row first
+                rollup_model.objects.filter(**lookup).update(total = F('total') + amount, count = F('count') + count)
+
+
+def apply_deltas_in_bulk(rollup_model, group_field, deltas):
+    # batch writes (imports, bulk edits) touch many rollup rows: one read, a primary key update per
+    # existing row and one bulk insert for the rest
+    owner_ids = {owner_id for owner_id, _, _ in deltas}
+    months = {month for _, month, _ in deltas}
+    
+    existing = {}
+    for pk, owner_id, month, key in rollup_model.objects.filter(owner_id__in = owner_ids, month__in = months).values_list(
+            'pk', 'owner_id', 'month', group_field):
+        if (owner_id, month, key) in deltas:
+            existing[(owner_id, month, key)] = pk
+            
+    # primary key updates keep the increment atomic (F()) and avoid a huge CASE statement
+    for key, pk in existing.items():
+        amount, count = deltas[key]
+        rollup_model.objects.filter(pk = pk).update(total = F('total') + amount, count = F('count') + count)
+    
+    missing = {key: delta for key, delta in deltas.items() if key not in existing}
+    try:
+        with transaction.atomic():
+            rollup_model.objects.bulk_create([
+                rollup_model(owner_id = owner_id, month = month, total = amount, count = count, **{group_field: key})
+                for (owner_id, month, key), (amount, count) in missing.items()
+            ], batch_size = 500)
+    except IntegrityError:
+        # rows created concurrently; fall back to the row-at-a-time path for what is left
+        apply_deltas_one_by_one(rollup_model, group_field, missing)
+
+
+def rebuild_rollups(model, rollup_model, group_field, owner_ids = None):
+    """Recompute rollup rows from scratch with one GROUP BY query; returns the number of rows."""
+    rows = model.objects.all()
+    rollups = rollup_model.objects.all()
+    
+    if owner_ids is not None:
+        rows = rows.filter(owner_id__in = owner_ids)
+        rollups = rollups.filter(owner_id__in = owner_ids)
+        
+    grouped = rows.annotate(month = TruncMonth('date')).values('owner_id', 'month', group_field).annotate(
+        total = Sum('amount'), count = Count('id')).order_by()
+    
+    with transaction.atomic():
+        rollups.delete()
+        created = rollup_model.objects.bulk_create([
+            rollup_model(owner_id = row['owner_id'], month = row['month'], total = row['total'],
+                         count = row['count'], **{group_field: row[group_field]})
+            for row in grouped.iterator()
+        ], batch_size = 1000)
+        
+    return len(created)
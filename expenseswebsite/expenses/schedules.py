@@ -0,0 +1,43 @@
+import calendar
+import datetime
+
+
+# an RRULE-like subset: FREQ with an INTERVAL, from a start date until an optional end date
+FREQUENCIES = [
+    ('daily', 'Daily'),
+    ('weekly', 'Weekly'),
+    ('monthly', 'Monthly'),
+    ('yearly', 'Yearly'),
+]
+
+# the columns a rule's next_date is derived from
+SCHEDULE_FIELDS = ('start_date', 'frequency', 'interval')
+
+
+def schedule_of(rule):
+    # read from __dict__ so a rule loaded with only() does not fetch its deferred columns here
+    return tuple(rule.__dict__.get(field) for field in SCHEDULE_FIELDS)
+
+
+def add_months(date, months, day):
+    # day is kept when the month has it, else the month's last day (the 31st becomes Feb 28/29)
+    year, month = divmod(date.month - 1 + months, 12)
+    year += date.year
+    return datetime.date(year, month + 1, min(day, calendar.monthrange(year, month + 1)[1]))
+
+
+def occurrence_date(start, frequency, interval, n):
+    """Date of occurrence n (0 is start) of a schedule.
+
+    Computed from the start rather than from the previous occurrence, so months that clamp the day
+    (Jan 31 -> Feb 28) do not shift every later one.
+    """
+    if frequency == 'daily':
+        return start + datetime.timedelta(days = n * interval)
+    if frequency == 'weekly':
+        return start + datetime.timedelta(weeks = n * interval)
+    if frequency == 'monthly':
+        return add_months(start, n * interval, start.day)
+    if frequency == 'yearly':
+        return add_months(start, 12 * n * interval, start.day)
+    raise ValueError('Unknown frequency %r.' % (frequency,))
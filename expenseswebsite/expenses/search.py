@@ -0,0 +1,113 @@
+import re
+import datetime
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db.models import Q
+from userpreferences.fx import rate_table
+
+
+# number of rows returned per search call (and the most a client may ask for)
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 200
+
+NUMBER_RE = re.compile(r'^\d+(\.\d*)?$')
+DATE_RE = re.compile(r'^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$')
+HALF_CENT = Decimal('0.005')
+
+
+def amount_range(search_str):
+    # "12" -> [12, 13), "12.5" -> [12.5, 12.6), so the amount column can use a range scan
+    if not NUMBER_RE.match(search_str):
+        return None
+
+    try:
+        low = Decimal(search_str.rstrip('.'))
+    except InvalidOperation:
+        return None
+
+    decimals = len(search_str.split('.')[1]) if '.' in search_str else 0
+    return low, low + Decimal(1).scaleb(-decimals)
+
+
+def date_range(search_str):
+    # "2022" -> the whole year, "2022-03" -> the month, "2022-03-05" -> that day
+    match = DATE_RE.match(search_str)
+    if not match:
+        return None
+
+    year, month, day = (int(x) if x else None for x in match.groups())
+
+    try:
+        if day:
+            start = datetime.date(year, month, day)
+            return start, start + datetime.timedelta(days = 1)
+        if month:
+            start = datetime.date(year, month, 1)
+            end = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+            return start, end
+        return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+    except ValueError:
+        return None
+
+
+def amount_query(low, high, code):
+    """Rows whose amount, as shown in currency code, lies in [low, high).
+
+    Rows typed in code show (and match) their typed amount; the others show the stored base amount
+    converted at today's rate, so the bounds are converted back to the base currency instead.
+    """
+    code = code or settings.FX_BASE_CURRENCY
+    factor = rate_table().factor(code)
+    if factor == 1:
+        converted = Q(amount__gte = low, amount__lt = high)
+    else:
+        # an amount is shown rounded to cents: it shows as low once it converts to low - half a cent
+        factor = Decimal(repr(factor))
+        converted = Q(amount__gte = (low - HALF_CENT) / factor, amount__lt = (high - HALF_CENT) / factor)
+
+    typed = Q(entered_currency = code, entered_amount__isnull = False)
+    return (typed & Q(entered_amount__gte = low, entered_amount__lt = high)) | (~typed & converted)
+
+
+def build_search_query(search_str, text_fields, currency = None):
+    """Build a single Q object for a search term, typed by what the term looks like.
+
+    Amounts are matched as the user sees them, in `currency` (default: the base currency).
+    """
+    query = Q()
+
+    # free text always matches against the (trigram indexed) text columns
+    for field in text_fields:
+        query |= Q(**{field + '__icontains': search_str})
+
+    amounts = amount_range(search_str)
+    if amounts:
+        query |= amount_query(amounts[0], amounts[1], currency)
+
+    dates = date_range(search_str)
+    if dates:
+        query |= Q(date__gte = dates[0], date__lt = dates[1])
+
+    return query
+
+
+def search_queryset(queryset, search_str, text_fields, limit = None, offset = 0, currency = None):
+    """Return one capped page of rows from queryset matching search_str, newest first.
+
+    Rows carry entered_amount and entered_currency for convert_rows.
+    """
+    search_str = (search_str or '').strip()
+    if not search_str:
+        return queryset.none()
+
+    try:
+        limit = max(1, min(int(limit or SEARCH_PAGE_SIZE), SEARCH_MAX_PAGE_SIZE))
+        offset = max(int(offset or 0), 0)
+    except (TypeError, ValueError):
+        limit, offset = SEARCH_PAGE_SIZE, 0
+
+    fields = ['id', 'amount', 'description', 'date'] + [f for f in text_fields if f != 'description'] + [
+        'entered_amount', 'entered_currency']
+
+    return queryset.filter(build_search_query(search_str, text_fields, currency)).order_by(
+        '-date', '-id').values(*fields)[offset:offset + limit]
@@ -0,0 +1,59 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_init, pre_save, post_save
+from .models import Expense, ExpenseMonthlyRollup
+from .pagination import invalidate_count
+from .versions import bump_data_version
+from .budgets import apply_budget_deltas
+from .rollups import snapshot, new_deltas, add_delta, apply_deltas, row_deleting, rollups_changed
+
+
+def expenses_changed(owner_id):
+    invalidate_count('expense', owner_id)
+    bump_data_version(owner_id)
+
+
+@receiver(post_init, sender = Expense)
+def remember_loaded_values(sender, instance, **kwargs):
+    # what the row looked like when loaded, so an edit can move its amount between rollup rows
+    instance._rollup_snapshot = snapshot(instance, 'category')
+
+
+@receiver(pre_save, sender = Expense)
+@receiver(row_deleting, sender = Expense)
+def load_previous_values(sender, instance, **kwargs):
+    # instances loaded with deferred fields have no snapshot; read the stored row before it changes
+    if instance.pk is not None and instance._rollup_snapshot is None:
+        instance._rollup_snapshot = Expense.objects.filter(pk = instance.pk).values(
+            'owner_id', 'date', 'amount', 'category').first()
+
+
+@receiver(post_save, sender = Expense)
+def expense_saved(sender, instance, created, **kwargs):
+    deltas = new_deltas()
+    previous = None if created else instance._rollup_snapshot
+    
+    if previous:
+        add_delta(deltas, Expense, 'category', previous, -1)
+    # deferred fields are not written by save(), so read them back from the row
+    current = snapshot(instance, 'category') or Expense.objects.filter(pk = instance.pk).values(
+        'owner_id', 'date', 'amount', 'category').first()
+    add_delta(deltas, Expense, 'category', current, 1)
+    apply_deltas(ExpenseMonthlyRollup, 'category', deltas)
+    
+    instance._rollup_snapshot = current
+    expenses_changed(current['owner_id'])
+
+
+@receiver(row_deleting, sender = Expense)
+def expense_deleted(sender, instance, **kwargs):
+    # registered after load_previous_values, so the snapshot is there
+    deltas = new_deltas()
+    add_delta(deltas, Expense, 'category', instance._rollup_snapshot, -1)
+    apply_deltas(ExpenseMonthlyRollup, 'category', deltas)
+    
+    expenses_changed(instance._rollup_snapshot['owner_id'])
+
+
+@receiver(rollups_changed, sender = ExpenseMonthlyRollup)
+def update_budgets(sender, deltas, **kwargs):
+    apply_budget_deltas(deltas)
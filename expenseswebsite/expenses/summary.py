@@ -0,0 +1,60 @@
+import datetime
+from django.db.models import Sum
+from django.core.cache import cache
+from .money import to_money
+from .models import Expense, ExpenseMonthlyRollup
+from .versions import adata_version
+
+
+# default window of the stats chart (about six months) and the largest allowed
+SUMMARY_DEFAULT_DAYS = 180
+SUMMARY_MAX_DAYS = 3650
+SUMMARY_MAX_MONTHS = 120
+SUMMARY_CACHE_TIMEOUT = 60 * 60
+
+
+def summary_cache_key(user_id, version):
+    # versioned rather than deleted on save: the version moves once the write is committed, so a
+    # summary computed from the old rows while it was in flight can never be cached under the new one
+    return 'expense_category_summary_%s_%s' % (user_id, version)
+
+
+def months_ago(date, months):
+    # first day of the month `months` calendar months before date's month
+    month_index = date.year * 12 + date.month - 1 - months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def summary_rows(user, days, months):
+    todays_date = datetime.date.today()
+
+    if months:
+        # whole months come from the monthly rollups: O(months x categories) rows, not O(expenses)
+        return ExpenseMonthlyRollup.objects.filter(owner = user, month__gte = months_ago(todays_date, months - 1),
+                                                   month__lte = todays_date).values(
+            'category').annotate(total = Sum('total')).order_by()
+
+    start_date = todays_date - datetime.timedelta(days = days)
+    return Expense.objects.filter(owner = user, date__gte = start_date, date__lte = todays_date).values(
+        'category').annotate(total = Sum('amount')).order_by()
+
+
+def window_key(days, months):
+    return '%s:%s:%s' % (datetime.date.today().isoformat(), days, months)
+
+
+async def acategory_summary(user, days = SUMMARY_DEFAULT_DAYS, months = None):
+    """Total spent per category over the last `days` days (or calendar `months`), cached per user."""
+    window = window_key(days, months)
+    key = summary_cache_key(user.pk, await adata_version(user.pk))
+
+    # one cache entry per user and data version holding every window asked for
+    summaries = await cache.aget(key) or {}
+    if window in summaries:
+        return summaries[window]
+
+    summary = {row['category']: to_money(row['total']) async for row in summary_rows(user, days, months) if row['total']}
+    summaries[window] = summary
+    await cache.aset(key, summaries, SUMMARY_CACHE_TIMEOUT)
+
+    return summary
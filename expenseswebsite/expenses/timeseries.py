@@ -0,0 +1,125 @@
+import datetime
+from django.db.models import Sum
+from django.core.cache import cache
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from .summary import months_ago
+from .money import to_money
+from .rollups import month_start
+from .versions import data_version
+from .models import Expense, ExpenseMonthlyRollup
+from userincome.models import UserIncome, IncomeMonthlyRollup
+
+
+SERIES_PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+# buckets shown when no start date is given, and the most one request may ask for
+SERIES_DEFAULT_BUCKETS = {'day': 90, 'week': 26, 'month': 12}
+SERIES_MAX_BUCKETS = 3660
+SERIES_CACHE_TIMEOUT = 60 * 60
+
+# (records, monthly rollups) of each side of the cash flow
+SERIES_SOURCES = {
+    'expenses': (Expense, ExpenseMonthlyRollup),
+    'income': (UserIncome, IncomeMonthlyRollup),
+}
+
+
+def bucket_start(date, period):
+    if period == 'month':
+        return month_start(date)
+    if period == 'week':
+        # weeks start on Monday, as with TruncWeek
+        return date - datetime.timedelta(days = date.weekday())
+    return date
+
+
+def next_bucket(date, period):
+    if period == 'month':
+        return months_ago(date, -1)
+    return date + datetime.timedelta(days = 7 if period == 'week' else 1)
+
+
+def default_start(end, period):
+    if period == 'month':
+        return months_ago(end, SERIES_DEFAULT_BUCKETS['month'] - 1)
+    days = SERIES_DEFAULT_BUCKETS[period] * (7 if period == 'week' else 1)
+    return end - datetime.timedelta(days = days - 1)
+
+
+def buckets(start, end, period):
+    # every bucket in the range, including empty ones, so both series line up on the chart
+    bucket = bucket_start(start, period)
+    result = []
+    while bucket <= end:
+        if len(result) == SERIES_MAX_BUCKETS:
+            raise ValueError('At most %d buckets can be returned at once.' % SERIES_MAX_BUCKETS)
+        result.append(bucket)
+        bucket = next_bucket(bucket, period)
+    return result
+
+
+def bucket_totals(model, rollup_model, owner, period, start, end):
+    """{bucket: total} for one side, grouped by the database."""
+    if period == 'month':
+        # whole months are already summed up in the monthly rollups
+        rows = rollup_model.objects.filter(owner = owner, month__gte = start, month__lte = end).values(
+            'month').annotate(bucket_total = Sum('total')).values_list('month', 'bucket_total').order_by()
+    elif period == 'day':
+        # dates already are day buckets; no per-row date function is needed
+        rows = model.objects.filter(owner = owner, date__gte = start, date__lte = end).values(
+            'date').annotate(bucket_total = Sum('amount')).values_list('date', 'bucket_total').order_by()
+    else:
+        rows = model.objects.filter(owner = owner, date__gte = start, date__lte = end).annotate(
+            bucket = SERIES_PERIODS[period]('date')).values('bucket').annotate(
+            bucket_total = Sum('amount')).values_list('bucket', 'bucket_total').order_by()
+
+    return dict(rows)
+
+
+def total_before(model, rollup_model, owner, date):
+    """Everything recorded before date: whole months from the rollups, the rest of date's month from the records."""
+    first_of_month = month_start(date)
+    total = rollup_model.objects.filter(owner = owner, month__lt = first_of_month).aggregate(
+        total = Sum('total'))['total'] or 0
+
+    if date > first_of_month:
+        total += model.objects.filter(owner = owner, date__gte = first_of_month, date__lt = date).aggregate(
+            total = Sum('amount'))['total'] or 0
+
+    return to_money(total)
+
+
+def cash_flow_series(owner, period, start, end):
+    """Expenses, income, net cash flow and running balance per bucket (amounts in the base currency).
+
+    The running balance starts from everything recorded before the first bucket. Results are cached
+    under the owner's data version, so any write makes them stale.
+    """
+    dates = buckets(start, end, period)
+    key = 'cash_flow_%s_%s_%s_%s_%s' % (owner.pk, data_version(owner.pk), period, start, end)
+    series = cache.get(key)
+    if series is None:
+        series = compute_cash_flow(owner, period, dates, start, end)
+        cache.set(key, series, SERIES_CACHE_TIMEOUT)
+    return series
+
+
+def compute_cash_flow(owner, period, dates, start, end):
+    start = dates[0] if dates else start
+    series = {'buckets': dates}
+
+    for side, (model, rollup_model) in SERIES_SOURCES.items():
+        totals = bucket_totals(model, rollup_model, owner, period, start, end)
+        series[side] = [to_money(totals.get(bucket) or 0) for bucket in dates]
+
+    opening = (total_before(UserIncome, IncomeMonthlyRollup, owner, start)
+               - total_before(Expense, ExpenseMonthlyRollup, owner, start))
+
+    balance = opening
+    series['net'], series['balance'] = [], []
+    for expenses, income in zip(series['expenses'], series['income']):
+        balance += income - expenses
+        series['net'].append(income - expenses)
+        series['balance'].append(balance)
+
+    series['opening_balance'] = opening
+    return series
@@ -6,12 +6,20 @@ from django.views.decorators.csrf import csrf_exempt
 urlpatterns = [
     path('', views.index, name = "expenses"),
     path('add-expense', views.add_expense, name = "add-expenses"),
+    path('import-expenses', views.import_expenses, name = "import-expenses"),
     path('edit-expense/<int:id>', views.expense_edit, name = "expense-edit"),    
     path('expense-delete/<int:id>', views.delete_expense, name = "delete_expense"), 
+    path('bulk-expenses', views.bulk_expenses, name = "bulk-expenses"),
     path('search-expenses', csrf_exempt(views.search_expenses), name = "search_expenses"), 
     path('expense_category_summary', views.expense_category_summary, name = "expense_category_summary"),
     path('stats', views.stats_view, name = "stats"), 
+    path('budgets', views.budgets, name = "budgets"),
+    path('budgets/<int:id>/delete', views.delete_budget, name = "delete-budget"),
+    path('stats/timeseries', views.stats_timeseries, name = "stats-timeseries"),
     path('export_csv', views.export_csv, name = "export-csv"),
     path('export_excel', views.export_excel, name = "export-excel"),
     path('export_pdf', views.export_pdf, name = "export-pdf"),
+    path('export_pdf_job', views.export_pdf_job, name = "export-pdf-job"),
+    path('export_pdf_job/<uuid:job_id>', views.export_pdf_status, name = "export-pdf-status"),
+    path('export_pdf_job/<uuid:job_id>/download', views.export_pdf_download, name = "export-pdf-download"),
 ]
\ No newline at end of file
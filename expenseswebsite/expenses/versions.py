@@ -0,0 +1,93 @@
+import time
+import hashlib
+import datetime
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.db import transaction
+from django.core.cache import cache
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from userpreferences.fx import rate_table
+
+
+def version_cache_key(user_id):
+    return 'data_version_%s' % user_id
+
+
+def data_version(user_id):
+    """When the user's data last changed, as a UNIX timestamp; part of the ETag of their responses."""
+    key = version_cache_key(user_id)
+    version = cache.get(key)
+    
+    if version is None:
+        # unknown (first use or evicted): start a new version, so nothing stale can be matched
+        cache.add(key, time.time(), None)
+        version = cache.get(key, time.time())
+        
+    return version
+
+
+async def adata_version(user_id):
+    key = version_cache_key(user_id)
+    version = await cache.aget(key)
+    
+    if version is None:
+        await cache.aadd(key, time.time(), None)
+        version = await cache.aget(key, time.time())
+        
+    return version
+
+
+def bump_data_version(user_id):
+    # set once the write is committed, so a reader can never tag old data with the new version
+    transaction.on_commit(lambda: cache.set(version_cache_key(user_id), time.time(), None))
+
+
+def data_etag(request, *args, **kwargs):
+    """ETag of a per-user response: everything its content depends on besides the URL path."""
+    # the CSRF cookie is included because pages embed a token derived from it (it changes on login),
+    # and the date because "last 30 days", the default chart range and budget periods move with it
+    parts = '%s|%s|%s|%s|%s' % (data_version(request.user.pk), rate_table().version, request.GET.urlencode(),
+                                request.META.get('CSRF_COOKIE', ''), datetime.date.today())
+    return '%s-%s' % (request.user.pk, hashlib.md5(parts.encode('utf-8')).hexdigest())
+
+
+def messages_pending(request):
+    # len() loads the stored messages without marking them as shown
+    return len(get_messages(request)) > 0
+
+
+def page_etag(request, *args, **kwargs):
+    # a page with flash messages must be rendered (which shows and clears them), never answered with 304
+    return None if messages_pending(request) else data_etag(request)
+
+
+def revalidate(view = None, pages = False):
+    """Answer conditional GETs for a per-user view with 304 until the user's data version changes.
+
+    Responses are marked private and must be revalidated, so the browser asks every time and the
+    answer costs one version lookup. Use pages = True for HTML pages that show flash messages.
+    Works on sync and async views (decorate after the login check, which resolves request.user).
+    """
+    def decorator(view):
+        # ETag only: Last-Modified has one-second resolution, so a change within the second of the
+        # previous one would still be answered with 304; the ETag holds the exact version
+        conditional = condition(etag_func = page_etag if pages else data_etag)(view)
+        
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                response = await conditional(request, *args, **kwargs)
+                patch_cache_control(response, private = True, no_cache = True)
+                return response
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                response = conditional(request, *args, **kwargs)
+                patch_cache_control(response, private = True, no_cache = True)
+                return response
+            
+        return wrapper
+    
+    return decorator(view) if view else decorator
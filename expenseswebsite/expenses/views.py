@@ -1,55 +1,103 @@
+import io
 import json
-import tempfile
 import datetime
-import csv, xlwt
-from weasyprint import HTML
+from asgiref.sync import sync_to_async
 from django.db.models import Sum
 from django.contrib import messages
-from .models import Category, Expense
-from django.core.paginator import Paginator
-from django.shortcuts import render, redirect
-from userpreferences.models import UserPreference
-from django.http import JsonResponse, HttpResponse
+from .models import Category, Expense, ExpenseMonthlyRollup, Budget
+from .money import to_money
+from .budgets import budget_status, set_budget
+from .search import search_queryset
+from .bulk import apply_bulk
+from .decorators import async_login_required
+from .importers import import_records, read_rows, ImportFileError
+from .pagination import paginate, PAGE_SIZES
+from .exports import stream_csv, write_xlsx, cached_export, export_cache_key, EXPORT_CHUNK_SIZE
+from .pdf_jobs import enqueue_pdf, job_status, job_path
+from .versions import revalidate, bump_data_version
+from .timeseries import cash_flow_series, default_start, SERIES_PERIODS
+from .summary import acategory_summary, SUMMARY_DEFAULT_DAYS, SUMMARY_MAX_DAYS, SUMMARY_MAX_MONTHS
+from django.shortcuts import render, redirect, get_object_or_404
+from userincome.models import UserIncome
+from userpreferences.middleware import load_preferences
+from userpreferences.fx import rate_table, display_currency, currency_label, convert_objects, convert_rows, convert_mapping, convert_stream
+from django.urls import reverse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
 from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
+from instrumentation.budgets import query_budget
 
 
-def search_expenses(request):
+@async_login_required
+@query_budget(4)
+async def search_expenses(request):
     if request.method == 'POST':
-        search_str = json.loads(request.body).get('searchText')
+        data = json.loads(request.body)
         
-        expenses = Expense.objects.filter(
-                   amount__istartswith = search_str, owner = request.user) | Expense.objects.filter(
-                   date__istartswith = search_str, owner = request.user) | Expense.objects.filter(
-                   description__icontains = search_str, owner = request.user) | Expense.objects.filter(
-                   category__icontains = search_str, owner = request.user) 
+        code = await sync_to_async(display_currency)(request.user_preferences)
         
-        data = expenses.values()
+        expenses = search_queryset(Expense.objects.filter(owner = request.user), data.get('searchText'),
+                                   ['description', 'category'], data.get('limit'), data.get('offset'), code)
         
-        return JsonResponse(list(data), safe = False)
+        return JsonResponse(convert_rows([row async for row in expenses], 'amount', code), safe = False)
 
 
 @login_required(login_url = '/authentication/login')
+@revalidate(pages = True)
+@query_budget(6)
 def index(request):
     expenses = Expense.objects.filter(owner = request.user)
-    paginator = Paginator(expenses, 10)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
+    page_obj = paginate(request, expenses, 'expense')
     
-    if UserPreference.objects.filter(user = request.user).exists():
-        currency = UserPreference.objects.get(user = request.user).currency
-    else:
-        currency = 'United States Dollar'
+    code = display_currency(request.user_preferences)
+    # every amount on the page is converted in one step
+    page_obj.object_list = convert_objects(page_obj.object_list, 'amount', code)
+        
+    # budget status is read from the running spend counters, not summed from the expenses
+    budgets = convert_objects(convert_objects(budget_status(request.user), 'amount', code), 'spent', code, 'display_spent')
         
     context = {
-        'expenses': expenses,
         'page_obj': page_obj,
-        'currency': currency,
+        'page_sizes': PAGE_SIZES,
+        'has_records': bool(page_obj.object_list) or page_obj.has_previous(),
+        'currency': currency_label(code),
+        'budgets': budgets,
+        'over_budget': [budget for budget in budgets if budget.over_budget],
     }
     
     return render(request, 'expenses/index.html', context)
 
 
+@login_required(login_url = '/authentication/login')
+def import_expenses(request):
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        
+        if not upload:
+            messages.error(request, 'Please choose a CSV or Excel file to import.')
+            return redirect('expenses')
+        
+        try:
+            result = import_records('expenses', request.user, read_rows(upload, upload.name, 'Expenses'),
+                                    currency = display_currency(request.user_preferences))
+        except ImportFileError as ex:
+            if request.GET.get('format') == 'json':
+                return JsonResponse({'error': str(ex)}, status = 400)
+            messages.error(request, str(ex))
+            return redirect('expenses')
+        
+        if request.GET.get('format') == 'json':
+            return JsonResponse(result.as_dict())
+        
+        messages.success(request, 'Imported %d records (%d duplicates skipped).' % (result.created, result.duplicates))
+        
+        # only the first few problems are shown; the JSON format lists them all
+        for row, error in result.errors[:5]:
+            messages.error(request, 'Row %d: %s' % (row, error))
+            
+    return redirect('expenses')
+
+
 @login_required(login_url = '/authentication/login')
 def add_expense(request):
     categories = Category.objects.all()
@@ -69,6 +117,13 @@ def add_expense(request):
             messages.error(request, 'Please enter an amount.')
             return render(request, 'expenses/add_expense.html', context)
         
+        # amounts are typed in the user's currency, and kept as typed alongside their base currency value
+        try:
+            amounts = rate_table().entered(amount, display_currency(request.user_preferences))
+        except ValueError:
+            messages.error(request, 'Please enter a valid amount.')
+            return render(request, 'expenses/add_expense.html', context)
+        
         # obtain the description
         description = request.POST['description']        
         
@@ -82,7 +137,7 @@ def add_expense(request):
         # obtain the category
         category = request.POST['category']
         
-        Expense.objects.create(owner = request.user, amount = amount, date = date, category = category, description = description)
+        Expense.objects.create(owner = request.user, date = date, category = category, description = description, **amounts)
         messages.success(request, 'Expense has been created successfully!')
         
         return redirect('expenses')
@@ -90,8 +145,11 @@ def add_expense(request):
     
 @login_required(login_url = '/authentication/login')
 def expense_edit(request, id):
-    expense = Expense.objects.get(pk = id)
+    expense = get_object_or_404(Expense, pk = id, owner = request.user)
     categories = Category.objects.all()
+    # the form shows (and takes) the amount in the user's currency
+    code = display_currency(request.user_preferences)
+    convert_objects([expense], 'amount', code)
     context = {
         'expense': expense,
         'values': expense,
@@ -107,14 +165,23 @@ def expense_edit(request, id):
         
         if not amount:
             messages.error(request, 'Please enter an amount.')
-            return render(request, 'expenses/edit_expense.html', context)
+            return render(request, 'expenses/edit-expense.html', context)
+        
+        try:
+            # the form shows the amount as typed (or converted, if it was typed in another currency);
+            # it is only stored again, at today's rate, when the user changed it
+            entered = to_money(amount)
+            amounts = {} if entered == expense.display_amount else rate_table().entered(entered, code)
+        except ValueError:
+            messages.error(request, 'Please enter a valid amount.')
+            return render(request, 'expenses/edit-expense.html', context)
         
         # obtain the description
         description = request.POST['description']        
         
         if not description:
             messages.error(request, 'Please enter a description.')
-            return render(request, 'expenses/edit_expense.html', context)
+            return render(request, 'expenses/edit-expense.html', context)
         
         # # obtain the date
         date = request.POST['expense_date']        
@@ -122,122 +189,259 @@ def expense_edit(request, id):
         # # obtain the category
         category = request.POST['category']
         
-        # Updating expense
-        expense.owner = request.user
-        expense.amount = amount
-        expense.date = date
-        expense.category = category
-        expense.description = description
-        expense.save()
+        # only the columns that changed are written (and a save is skipped when nothing did)
+        values = dict(amounts, **{
+            'date': Expense._meta.get_field('date').to_python(date),
+            'category': category,
+            'description': description,
+        })
+        changed = [field for field, value in values.items() if getattr(expense, field) != value]
+        for field in changed:
+            setattr(expense, field, values[field])
+        if changed:
+            expense.save(update_fields = changed)
         messages.success(request, 'Expense has been updated successfully!')
         
         return redirect('expenses')
     
     
+@login_required(login_url = '/authentication/login')
 def delete_expense(request, id):
-    expense = Expense.objects.get(pk = id)
+    expense = get_object_or_404(Expense, pk = id, owner = request.user)
     expense.delete()
     messages.success(request, 'Expense deleted!')
     
     return redirect('expenses')
 
-def expense_category_summary(request):
-    todays_date = datetime.date.today()
-    six_months_ago = todays_date - datetime.timedelta(days = 30 * 6)
-    expenses = Expense.objects.filter(owner = request.user, date__gte = six_months_ago, date__lte = todays_date)
-    finalrep = {}
+
+@async_login_required
+async def bulk_expenses(request):
+    # {"action": "delete" | "update", "ids": [...] or "filter": {...}, "changes": {...}}, applied in one statement
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Use POST.'}, status = 405)
     
-    def get_category(expense):
-        return expense.category
+    try:
+        data = json.loads(request.body)
+        code = await sync_to_async(display_currency)(request.user_preferences)
+        result = await sync_to_async(apply_bulk)('expenses', request.user, data, code)
+    except ValueError as ex:
+        return JsonResponse({'error': str(ex)}, status = 400)
     
-    # obtaining all categories without duplicates using "set"
-    category_list = list(set(map(get_category, expenses)))
+    return JsonResponse(result)
+
+
+@login_required(login_url = '/authentication/login')
+def budgets(request):
+    code = display_currency(request.user_preferences)
+    context = {
+        'categories': Category.objects.all(),
+        'periods': Budget.PERIODS,
+        'currency': currency_label(code),
+        'values': request.POST,
+    }
     
-    def get_expense_category_amount(category):
-        amount = 0
-        filtered_by_category = expenses.filter(category = category)
+    if request.method == 'POST':
+        category = request.POST.get('category')
+        period = request.POST.get('period')
         
-        # total amount of the specific category
-        for item in filtered_by_category:
-            amount += item.amount
-            
-        return amount
+        if not category or period not in dict(Budget.PERIODS):
+            messages.error(request, 'Please choose a category and a period.')
+        else:
+            # like expenses, the limit is typed in the user's currency and stored in the base currency
+            try:
+                amount = rate_table().to_base(request.POST.get('amount', ''), code)
+            except ValueError:
+                amount = None
+                
+            if amount is None or amount <= 0:
+                messages.error(request, 'Please enter a valid amount.')
+            else:
+                set_budget(request.user, category, period, amount)
+                messages.success(request, 'Budget saved.')
+                return redirect('budgets')
     
-    for x in expenses:
-        for y in category_list:
-            finalrep[y] = get_expense_category_amount(y)
+    context['budgets'] = convert_objects(convert_objects(budget_status(request.user), 'amount', code), 'spent', code, 'display_spent')
+    return render(request, 'expenses/budgets.html', context)
+
+
+@login_required(login_url = '/authentication/login')
+def delete_budget(request, id):
+    if request.method == 'POST':
+        get_object_or_404(Budget, pk = id, owner = request.user).delete()
+        bump_data_version(request.user.pk)
+        messages.success(request, 'Budget removed.')
+        
+    return redirect('budgets')
+
+
+@async_login_required
+@revalidate
+@query_budget(4)
+async def expense_category_summary(request):
+    try:
+        days = int(request.GET.get('days', SUMMARY_DEFAULT_DAYS))
+    except ValueError:
+        days = SUMMARY_DEFAULT_DAYS
+    days = min(max(days, 1), SUMMARY_MAX_DAYS)
+    
+    # ?months=N summarises whole calendar months straight from the monthly rollups
+    try:
+        months = min(max(int(request.GET['months']), 1), SUMMARY_MAX_MONTHS)
+    except (KeyError, ValueError):
+        months = None
     
-    return JsonResponse({'expense_category_data': finalrep}, safe = False)
+    finalrep = await acategory_summary(request.user, days, months)
+    code = await sync_to_async(display_currency)(request.user_preferences)
+    
+    return JsonResponse({'expense_category_data': convert_mapping(finalrep, code), 'currency': code}, safe = False)
 
 
 def stats_view(request):
     return render(request, 'expenses/stats.html')
 
 
-def export_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename = Expenses' + str(datetime.datetime.now()) + '.csv'
+@login_required(login_url = '/authentication/login')
+@revalidate
+@query_budget(9)
+def stats_timeseries(request):
+    period = request.GET.get('period', 'month')
+    if period not in SERIES_PERIODS:
+        return JsonResponse({'error': 'period must be one of %s.' % ', '.join(SERIES_PERIODS)}, status = 400)
     
-    writer = csv.writer(response)
-    writer.writerow(['Amount', 'Description', 'Category', 'Date'])
+    try:
+        end = datetime.date.fromisoformat(request.GET['end']) if request.GET.get('end') else datetime.date.today()
+        start = datetime.date.fromisoformat(request.GET['start']) if request.GET.get('start') else default_start(end, period)
+        series = cash_flow_series(request.user, period, start, end)
+    except ValueError as ex:
+        return JsonResponse({'error': str(ex)}, status = 400)
     
-    expenses = Expense.objects.filter(owner = request.user)
+    # each column is converted into the user's currency in one step
+    code = display_currency(request.user_preferences)
+    table = rate_table()
+    columns = {name: table.convert(series[name], code) for name in ('expenses', 'income', 'net', 'balance')}
     
-    for expense in expenses:
-        writer.writerow([expense.amount, expense.description, expense.category, expense.date])
-        
-    return response
+    return JsonResponse({
+        'period': period,
+        'currency': code,
+        'opening_balance': table.convert([series['opening_balance']], code)[0],
+        'buckets': [
+            {'period': bucket, 'expenses': expenses, 'income': income, 'net': net, 'balance': balance}
+            for bucket, expenses, income, net, balance in zip(series['buckets'], columns['expenses'], columns['income'],
+                                                              columns['net'], columns['balance'])
+        ],
+    })
 
 
-def export_excel(request):
-    response = HttpResponse(content_type='application/ms-excel')
-    response['Content-Disposition'] = 'attachment; filename = Expenses' + str(datetime.datetime.now()) + '.xls'
+@login_required(login_url = '/authentication/login')
+@revalidate
+@query_budget(3)
+def export_csv(request):
+    filename = 'Expenses' + str(datetime.datetime.now()) + '.csv'
     
-    # wb is workbook. That is nothing but the excel file itself.
-    wb = xlwt.Workbook(encoding='utf-8')
-    # ws is worksheet.
-    ws = wb.add_sheet('Expenses')
-    row_num = 0
-    font_style = xlwt.XFStyle()
-    font_style.font.bold = True
+    code = display_currency(request.user_preferences)
+    rows = Expense.objects.filter(owner = request.user).values_list(
+        'amount', 'description', 'category', 'date', 'entered_amount', 'entered_currency'
+    ).iterator(chunk_size = EXPORT_CHUNK_SIZE)
     
-    columns= ['Amount', 'Description', 'Category', 'Date']
+    return stream_csv(filename, ['Amount (%s)' % code, 'Description', 'Category', 'Date'], convert_stream(rows, 0, code),
+                      compress = request.GET.get('gzip') == '1', cache_key = export_cache_key(request, 'expenses_csv'))
+
+
+def build_excel(user):
+    code = display_currency(load_preferences(user))
+    expenses = Expense.objects.filter(owner = user).values_list(
+        'amount', 'description', 'category', 'date', 'entered_amount', 'entered_currency'
+    ).iterator(chunk_size = EXPORT_CHUNK_SIZE)
+    income = UserIncome.objects.filter(owner = user).values_list(
+        'amount', 'description', 'source', 'date', 'entered_amount', 'entered_currency'
+    ).iterator(chunk_size = EXPORT_CHUNK_SIZE)
     
-    for col_num in range(len(columns)):
-        ws.write(row_num, col_num, columns[col_num], font_style)
-        
-    font_style = xlwt.XFStyle()
+    buffer = io.BytesIO()
+    write_xlsx(buffer, [
+        ('Expenses', ['Amount (%s)' % code, 'Description', 'Category', 'Date'], convert_stream(expenses, 0, code)),
+        ('Income', ['Amount (%s)' % code, 'Description', 'Source', 'Date'], convert_stream(income, 0, code)),
+    ])
     
-    # dynamic rows
-    rows = Expense.objects.filter(owner = request.user).values_list('amount', 'description', 'category', 'date')
+    return buffer.getvalue()
+
+
+@login_required(login_url = '/authentication/login')
+@revalidate
+@query_budget(5)
+def export_excel(request):
+    # built once per data version; repeated downloads come from the cache
+    content = cached_export(export_cache_key(request, 'xlsx'), lambda: build_excel(request.user))
     
-    for row in rows:
-        row_num += 1
-        for col_num in range(len(row)):
-            ws.write(row_num, col_num, str(row[col_num]), font_style)
+    response = HttpResponse(content, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response['Content-Disposition'] = 'attachment; filename = Expenses' + str(datetime.datetime.now()) + '.xlsx'
     
-    wb.save(response)
     return response
     
     
+@login_required(login_url = '/authentication/login')
+@query_budget(5)
 def export_pdf(request):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'inline; attachment; filename = Expenses' + str(datetime.datetime.now()) + '.pdf'
-    response['Content-Transfer-Encoding'] = 'binary'
+    # the plain link (without JavaScript, or when the job could not be queued from the page): the PDF
+    # is rendered in the background as well, and the download page waits for it
+    job_id = enqueue_pdf(request.user.pk, render_pdf_html(request.user))
     
-    expenses = Expense.objects.filter(owner = request.user)
-    sum = expenses.aggregate(Sum('amount'))
+    return redirect('export-pdf-download', job_id = job_id)
+
+
+def render_pdf_html(user):
+    code = display_currency(load_preferences(user))
+    expenses = convert_objects(Expense.objects.filter(owner = user), 'amount', code)
     
-    html_string = render_to_string('expenses/pdf-output.html', {'expenses': expenses, 'total': sum['amount__sum']})
-    html = HTML(string = html_string)
-    result = html.write_pdf()
+    # the grand total comes from the monthly rollups instead of rescanning every expense
+    sum = ExpenseMonthlyRollup.objects.filter(owner = user).aggregate(Sum('total'))
+    total = rate_table().convert([sum['total__sum'] or 0], code)[0]
     
-    with tempfile.NamedTemporaryFile(delete = True) as output:
-        output.write(result)
-        output.flush()
+    return render_to_string('expenses/pdf-output.html', {'expenses': expenses, 'total': total,
+                                                         'currency': currency_label(code)})
+
+
+@login_required(login_url = '/authentication/login')
+def export_pdf_job(request):
+    if request.method == 'POST':
+        job_id = enqueue_pdf(request.user.pk, render_pdf_html(request.user))
         
-        # rb is read in binary
-        output = open(output.name, 'rb')
-        response.write(output.read())
+        return JsonResponse({
+            'job_id': job_id,
+            'status_url': reverse('export-pdf-status', args = [job_id]),
+        }, status = 202)
         
-    return response
\ No newline at end of file
+    return JsonResponse({'error': 'POST required.'}, status = 405)
+
+
+@login_required(login_url = '/authentication/login')
+def export_pdf_status(request, job_id):
+    status = job_status(request.user.pk, str(job_id))
+    
+    if status is None:
+        return JsonResponse({'error': 'Unknown or expired export.'}, status = 404)
+    
+    data = {'job_id': str(job_id), 'status': status}
+    if status == 'done':
+        data['download_url'] = reverse('export-pdf-download', args = [job_id])
+        
+    return JsonResponse(data)
+
+
+@login_required(login_url = '/authentication/login')
+def export_pdf_download(request, job_id):
+    status = job_status(request.user.pk, str(job_id))
+    
+    if status is None:
+        raise Http404('Unknown or expired export.')
+    if status == 'pending':
+        # reloaded by the browser every couple of seconds until the file is there
+        response = render(request, 'expenses/pdf-wait.html', status = 202)
+        response['Refresh'] = '2'
+        return response
+    if status == 'failed':
+        messages.error(request, 'The PDF export failed, please try again.')
+        return redirect('expenses')
+    
+    return FileResponse(open(job_path(request.user.pk, str(job_id), '.pdf'), 'rb'),
+                        as_attachment = True, filename = 'Expenses' + str(datetime.datetime.now()) + '.pdf',
+                        content_type = 'application/pdf')
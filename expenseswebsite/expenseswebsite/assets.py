@@ -0,0 +1,172 @@
+import os
+import gzip
+import json
+import mimetypes
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    # without the brotli package only the gzip variants are written
+    brotli = None
+
+
+# text assets worth compressing, and the smallest file worth it
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml')
+COMPRESS_MIN_SIZE = 256
+
+# content encoding -> suffix of its precompressed variant, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# hashed names never change content; anything else is rechecked after a minute
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE_CONTROL = 'public, max-age=60'
+
+
+def compress(content):
+    """(suffix, bytes) of each precompressed variant of content smaller than the original."""
+    variants = [('.gz', gzip.compress(content, 9, mtime = 0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality = 11)))
+    return [(suffix, data) for suffix, data in variants if len(data) < len(content)]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz and .br files next to each hashed text asset.
+
+    The compression happens once, at collectstatic, so serving an asset never compresses anything.
+    """
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+
+        if kwargs.get('dry_run'):
+            return
+        for name in set(self.hashed_files.values()):
+            if not name.endswith(COMPRESSED_EXTENSIONS) or self.size(name) < COMPRESS_MIN_SIZE:
+                continue
+            with self.open(name) as original:
+                content = original.read()
+            for suffix, data in compress(content):
+                with open(self.path(name + suffix), 'wb') as variant:
+                    variant.write(data)
+
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows: each listed one unless its q is 0.
+
+    '*' stands for every coding the header does not name, so "*;q=0" alone allows none.
+    """
+    weights = {}
+    for token in header.split(','):
+        coding, _, params = token.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    wildcard = weights.pop('*', 0)
+    return {encoding for encoding, _ in ENCODINGS if weights.get(encoding, wildcard) > 0}
+
+
+class StaticAsset:
+    def __init__(self, path, immutable):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else MUTABLE_CACHE_CONTROL
+        # encoding -> path of the precompressed variants on disk
+        self.variants = {encoding: path + suffix for encoding, suffix in ENCODINGS if os.path.exists(path + suffix)}
+
+
+def scan_static_root(root):
+    """Relative URL path -> StaticAsset of every collected file (the variants hang off their original)."""
+    try:
+        with open(os.path.join(root, 'staticfiles.json'), 'r') as manifest:
+            hashed = set(json.load(manifest)['paths'].values())
+    except (OSError, ValueError, KeyError):
+        hashed = set()
+
+    suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    assets = {}
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if not name.endswith(suffixes):
+                assets[name] = StaticAsset(path, name in hashed)
+    return assets
+
+
+class StaticFilesMiddleware:
+    # serves STATIC_ROOT (as collected by collectstatic) straight from disk when settings.SERVE_STATIC
+    # is on, ahead of the session and auth middleware: the precompressed variant the client accepts,
+    # far-future cache headers on hashed names. FileResponse hands the open file to the server's
+    # wsgi.file_wrapper, which sends it with sendfile() where the server supports it (gunicorn, uWSGI).
+    # The file list is read once per process, so restart it after collectstatic.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SERVE_STATIC or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = settings.STATIC_URL
+        self.assets = scan_static_root(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.serve(request)
+        return self.get_response(request) if response is None else response
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        return await self.get_response(request) if response is None else response
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        asset = self.assets.get(request.path[len(self.prefix):])
+        if asset is None:
+            return None
+
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), asset.mtime):
+            response = HttpResponseNotModified()
+        else:
+            path = asset.path
+            accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            for encoding, _ in ENCODINGS:
+                if encoding in asset.variants and encoding in accepted:
+                    path = asset.variants[encoding]
+                    break
+            else:
+                encoding = None
+
+            # sets Content-Length from the file itself
+            response = FileResponse(open(path, 'rb'), content_type = asset.content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+
+        response['Last-Modified'] = http_date(asset.mtime)
+        response['Cache-Control'] = asset.cache_control
+        if asset.variants:
+            response['Vary'] = 'Accept-Encoding'
+        return response
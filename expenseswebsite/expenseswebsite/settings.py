@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 from pathlib import Path
 import os
 from django.contrib import messages
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,9 +26,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = '$v8qm8rwt9b7cgi2%h^e%faz&f&i$hpy2s_&rj^!*-6lz4z-ie'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# EXPENSES_DEBUG=0 runs the production configuration: cached templates, hashed and precompressed static files
+DEBUG = os.environ.get('EXPENSES_DEBUG', '1') != '0'
 
-ALLOWED_HOSTS = []
+# comma-separated; only checked when DEBUG is off
+ALLOWED_HOSTS = [host for host in os.environ.get('EXPENSES_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -42,26 +45,39 @@ INSTALLED_APPS = [
     'expenses',
     'userpreferences',
     'userincome',
+    'authentication',
+    'instrumentation',
 ]
 
 MIDDLEWARE = [
+    'instrumentation.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'expenseswebsite.assets.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'userpreferences.middleware.UserPreferenceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'expenseswebsite.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# outside DEBUG each template is parsed once per process and kept
+if not DEBUG:
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'instrumentation.backends.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -88,6 +104,66 @@ DATABASES = {
     }
 }
 
+# EXPENSES_DB=sqlite runs on a local SQLite file instead (e.g. to compare benchmarks between the two)
+if os.environ.get('EXPENSES_DB') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('EXPENSES_SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+    }
+
+
+# Cache tier, picked with EXPENSES_CACHE: 'redis' (shared by every process and server, at
+# EXPENSES_REDIS_URL; needs the redis package), 'file' (shared by the processes of one machine) or
+# 'locmem' (per process). Sessions, logged-in users, the computed data above and the counters behind
+# the login throttles, validation rate limits and data versions all live here.
+CACHE_TIER = os.environ.get('EXPENSES_CACHE', 'file' if DEBUG else 'redis')
+if CACHE_TIER != 'redis' and not DEBUG:
+    # the counters rely on an atomic incr(): the file cache reads and rewrites the file, so
+    # concurrent attempts undercount and the limits let more through; locmem is per process, so a
+    # logout or deactivation would also only reach the process that handled it
+    raise ImproperlyConfigured('EXPENSES_CACHE=%s cannot count attempts atomically across processes; '
+                               'use redis when DEBUG is off.' % CACHE_TIER)
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('EXPENSES_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('EXPENSES_REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_TIER],
+}
+
+# finished exports (up to 5 MB each) are only cached on a tier shared by the processes; in locmem
+# every process would keep its own copies in memory, to be hit by one user's next download at best
+CACHE_EXPORTS = CACHE_TIER != 'locmem'
+
+# sessions are read from the cache and only written through to the database;
+# flash messages travel in a cookie, so a redirect does not rewrite the session
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# the logged-in user is loaded from the cache instead of auth_user on every request
+AUTHENTICATION_BACKENDS = ['authentication.backends.CachedModelBackend']
+
+
+# login and password reset attempts are limited per client and per account (authentication.throttling)
+LOGIN_THROTTLING = True
+
+# rate limits and throttles key on the client's address. Behind a reverse proxy every request comes
+# from the proxy, so the proxies' own addresses are listed here (EXPENSES_TRUSTED_PROXIES, comma
+# separated) and the client is read from CLIENT_IP_HEADER as far back as those proxies vouch for it
+TRUSTED_PROXIES = [ip.strip() for ip in os.environ.get('EXPENSES_TRUSTED_PROXIES', '').split(',') if ip.strip()]
+CLIENT_IP_HEADER = 'HTTP_X_FORWARDED_FOR'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -129,6 +205,44 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'expenseswebsite/static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# collectstatic writes content-hashed copies (css/main.3f2a9c1e.css) with .gz and .br variants next to
+# them; outside DEBUG, StaticFilesMiddleware serves them from STATIC_ROOT with far-future cache headers
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'expenseswebsite.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+SERVE_STATIC = not DEBUG
+
+# Background PDF exports: where finished files are kept, for how long (seconds), and pool size
+PDF_EXPORT_ROOT = os.path.join(BASE_DIR, 'exports')
+PDF_EXPORT_TTL = 60 * 60
+# a job still pending this long after it was queued has lost its worker and is reported as failed
+PDF_EXPORT_DEADLINE = 10 * 60
+PDF_EXPORT_WORKERS = 2
+
+# Currency conversion: amounts are stored in FX_BASE_CURRENCY and shown in each user's preferred
+# currency using the rate table in FX_RATES_FILE (reloaded when the file changes)
+FX_BASE_CURRENCY = 'USD'
+FX_RATES_FILE = os.path.join(BASE_DIR, 'fx_rates.json')
+
+# Expense/income list pagination: 'keyset' (cursor based, constant cost per page) or 'offset'
+LIST_PAGINATION = 'keyset'
+# show the (cached) record count on keyset pages
+LIST_PAGINATION_COUNT = True
+
+# Per-view instrumentation: Server-Timing headers on every response, and whether going over a view's
+# query_budget raises (on in test_settings) instead of logging. /metrics is off unless EXPENSES_METRICS=1,
+# and then answers only the addresses in METRICS_ALLOWED_IPS (behind a proxy every request may come
+# from 127.0.0.1, so it stays off by default even in DEBUG).
+INSTRUMENTATION_SERVER_TIMING = DEBUG
+QUERY_BUDGET_STRICT = False
+METRICS_ENABLED = os.environ.get('EXPENSES_METRICS') == '1'
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
 MESSAGE_TAGS = {
     messages.ERROR: 'danger'
 }
@@ -139,4 +253,11 @@ EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'hundredpercentfake00@gmail.com'
-EMAIL_HOST_PASSWORD = 'pass@word1' 
\ No newline at end of file
+EMAIL_HOST_PASSWORD = 'pass@word1'
+
+# outbox sender pool: threads, emails per SMTP connection, attempts before giving up,
+# and the first retry delay in seconds (doubled after each failure)
+EMAIL_SENDER_WORKERS = 2
+EMAIL_BATCH_SIZE = 50
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BACKOFF = 30
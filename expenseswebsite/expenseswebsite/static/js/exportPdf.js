@@ -0,0 +1,40 @@
+// Variables
+const exportPdfButton = document.querySelector('#exportPdf');
+const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]');
+
+// Polling the export job until the PDF is ready, then downloading it
+const pollExport = (statusUrl) => {
+    fetch(statusUrl)
+      .then((res) => res.json())
+      .then((data) => {
+        if (data.status === 'done') {
+            exportPdfButton.textContent = 'Export PDF';
+            window.location = data.download_url;
+        } else if (data.status === 'pending') {
+            setTimeout(() => pollExport(statusUrl), 1000);
+        } else {
+            exportPdfButton.textContent = 'Export PDF';
+            alert('The PDF export failed, please try again.');
+        }
+      });
+};
+
+// the button is only there when the user has expenses
+if (exportPdfButton) {
+    exportPdfButton.addEventListener("click", (e) => {
+        // falls back to the plain link, which queues the job itself and waits on a page, if this fails
+        e.preventDefault();
+        exportPdfButton.textContent = 'Preparing PDF...';
+
+        fetch("/export_pdf_job", {
+            method: "POST",
+            headers: { "X-CSRFToken": csrfToken.value },
+          })
+            .then((res) => {
+                if (!res.ok) throw new Error(res.status);
+                return res.json();
+            })
+            .then((data) => pollExport(data.status_url))
+            .catch(() => { window.location = exportPdfButton.href; });
+    });
+}
@@ -17,6 +17,10 @@ const showPasswordToggle = document.querySelector(".showPasswordToggle");
 // Submit Button
 const submitButton = document.querySelector(".submit-btn");
 
+// Pending validation calls (one per field)
+let emailTimer;
+let usernameTimer;
+
 
 const handleToggleInput = (e) => {
     if (showPasswordToggle.textContent === 'SHOW') {
@@ -41,24 +45,29 @@ emailField.addEventListener("keyup", (e) => {
   emailField.classList.remove("is-invalid");
   emailFeedbackArea.style.display = "none";
 
+  clearTimeout(emailTimer);
+
   if (emailVal.length > 0) {
-    // API Call to Endpoint (e.g. Postman Call but through JS)
-    fetch("/authentication/validate-email", {
-      body: JSON.stringify({ email: emailVal }),
-      method: "POST",
-    })
-      .then((res) => res.json())
-      .then((data) => {
-        emailSuccessOutput.style.display = "none";
-        if (data.email_error) {
-          submitButton.disabled = true;
-          emailField.classList.add("is-invalid");
-          emailFeedbackArea.style.display = "block";
-          emailFeedbackArea.innerHTML = `<p>${data.email_error}</p>`;
-        } else {
-          submitButton.removeAttribute("disabled");
-        }
-      });
+    // Waiting for a pause in typing before asking the server
+    emailTimer = setTimeout(() => {
+      // API Call to Endpoint (e.g. Postman Call but through JS)
+      fetch("/authentication/validate-email", {
+        body: JSON.stringify({ email: emailVal }),
+        method: "POST",
+      })
+        .then((res) => res.json())
+        .then((data) => {
+          emailSuccessOutput.style.display = "none";
+          if (data.email_error) {
+            submitButton.disabled = true;
+            emailField.classList.add("is-invalid");
+            emailFeedbackArea.style.display = "block";
+            emailFeedbackArea.innerHTML = `<p>${data.email_error}</p>`;
+          } else {
+            submitButton.removeAttribute("disabled");
+          }
+        });
+    }, 300);
   } else {
     emailSuccessOutput.style.display = "none";
   }
@@ -74,25 +83,30 @@ usernameField.addEventListener("keyup", (e) => {
   usernameField.classList.remove("is-invalid");
   usernameFeedbackArea.style.display = "none";
 
+  clearTimeout(usernameTimer);
+
   if (usernameVal.length > 0) {
-    // API Call to Endpoint (e.g. Postman Call but in JS)
-    fetch("/authentication/validate-username", {
-      body: JSON.stringify({ username: usernameVal }),
-      method: "POST",
-    })
-      .then((res) => res.json())
-      .then((data) => {
-        usernameSuccessOutput.style.display = "none";
-        if (data.username_error) {
-          submitButton.disabled = true;
-          usernameField.classList.add("is-invalid");
-          usernameFeedbackArea.style.display = "block";
-          usernameFeedbackArea.innerHTML = `<p>${data.username_error}</p>`;
-        } else {
-          submitButton.removeAttribute("disabled");
-        }
+    // Waiting for a pause in typing before asking the server
+    usernameTimer = setTimeout(() => {
+      // API Call to Endpoint (e.g. Postman Call but in JS)
+      fetch("/authentication/validate-username", {
+        body: JSON.stringify({ username: usernameVal }),
+        method: "POST",
+      })
+        .then((res) => res.json())
+        .then((data) => {
+          usernameSuccessOutput.style.display = "none";
+          if (data.username_error) {
+            submitButton.disabled = true;
+            usernameField.classList.add("is-invalid");
+            usernameFeedbackArea.style.display = "block";
+            usernameFeedbackArea.innerHTML = `<p>${data.username_error}</p>`;
+          } else {
+            submitButton.removeAttribute("disabled");
+          }
         
-      });
+        });
+    }, 300);
   } else {
     usernameSuccessOutput.style.display = "none";
   }
@@ -8,8 +8,10 @@ const noResults = document.querySelector('.no-results');
 
 tableOutput.style.display = 'none';
 
-searchField.addEventListener("keyup", (e) => {
-    const searchValue = e.target.value;
+// Waiting for a pause in typing so every keystroke doesn't hit the server
+let searchTimer;
+
+const runSearch = (searchValue) => {
     
     if (searchValue.trim().length > 0) {
         paginationContainer.style.display = 'none';
@@ -46,4 +48,9 @@ searchField.addEventListener("keyup", (e) => {
         appTable.style.display = 'block';
         paginationContainer.style.display = 'block';
     }
+};
+
+searchField.addEventListener("keyup", (e) => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => runSearch(e.target.value), 250);
 })
\ No newline at end of file
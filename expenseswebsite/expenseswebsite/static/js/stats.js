@@ -38,9 +38,10 @@ const renderChart = (data, labels) => {
 };
 
 const getChartData = () => {
-    fetch('/expense_category_summary').then((res) => res.json()).then((results) => {
+    fetch('/expense_category_summary?months=6').then((res) => res.json()).then((results) => {
         const category_data = results.expense_category_data;
-        const [labels, data] = [Object.keys(category_data), Object.values(category_data)]
+        // totals arrive as exact decimal strings, e.g. "1234.50"
+        const [labels, data] = [Object.keys(category_data), Object.values(category_data).map(Number)]
         renderChart(data, labels);
     })
 }
@@ -51,3 +52,48 @@ document.onload = getChartData();
 const displayChart = document.getElementById("myChart");
 displayChart.height = 50;
 
+
+
+// income vs. expenses over time, with the running balance as a line
+let cashFlowChart = null;
+
+const renderCashFlowChart = (results) => {
+    const buckets = results.buckets;
+    const ctx = document.getElementById('cashFlowChart').getContext('2d');
+
+    if (cashFlowChart) {
+        cashFlowChart.destroy();
+    }
+
+    cashFlowChart = new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: buckets.map((bucket) => bucket.period),
+            datasets: [{
+                label: 'Income (' + results.currency + ')',
+                data: buckets.map((bucket) => Number(bucket.income)),
+                backgroundColor: 'rgba(75, 192, 192, 0.5)',
+            }, {
+                label: 'Expenses (' + results.currency + ')',
+                data: buckets.map((bucket) => Number(bucket.expenses)),
+                backgroundColor: 'rgba(255, 99, 132, 0.5)',
+            }, {
+                label: 'Balance (' + results.currency + ')',
+                data: buckets.map((bucket) => Number(bucket.balance)),
+                type: 'line',
+                fill: false,
+                borderColor: 'rgba(54, 162, 235, 1)',
+            }]
+        },
+    });
+};
+
+const getCashFlowData = () => {
+    const period = document.getElementById('cashFlowPeriod').value;
+
+    // repeat loads are answered with 304 Not Modified until the data changes
+    fetch('/stats/timeseries?period=' + period).then((res) => res.json()).then(renderCashFlowChart);
+};
+
+document.getElementById('cashFlowPeriod').addEventListener('change', getCashFlowData);
+getCashFlowData();
@@ -0,0 +1,15 @@
+# Settings for the test suite: python manage.py test --settings=expenseswebsite.test_settings
+from .settings import *
+
+
+# one process, so the per-process cache is shared by everything a test does, and starts empty
+CACHES = {
+    'default': CACHE_BACKENDS['locmem'],
+}
+CACHE_EXPORTS = False
+
+# the test runner renders with DEBUG off, but without a collectstatic manifest to look names up in
+STORAGES = dict(STORAGES, staticfiles = {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'})
+
+# going over a view's query budget fails the test
+QUERY_BUDGET_STRICT = True
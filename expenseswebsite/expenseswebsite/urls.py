@@ -22,5 +22,6 @@ urlpatterns = [
     path('authentication/', include('authentication.urls')),
     path('preferences/', include('userpreferences.urls')),
     path('income/', include('userincome.urls')),
+    path('metrics/', include('instrumentation.urls')),
     path('admin/', admin.site.urls),
 ]
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class InstrumentationConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'instrumentation'
+
+    def ready(self):
+        # registering the handler that puts the query timer on every new database connection
+        from . import signals
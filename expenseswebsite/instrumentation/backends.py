@@ -0,0 +1,23 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from .metrics import time_template
+
+
+class Template(django_backend.Template):
+
+    def render(self, context = None, request = None):
+        # {% include %}d and extended templates render inside this call, so they are counted once
+        return time_template(lambda: super(Template, self).render(context, request))
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, adding each render's duration to the request's metrics."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,42 @@
+import logging
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(queries):
+    """Declare the most queries a view may run per request.
+
+    The instrumentation middleware logs a warning when a request goes over it, and raises
+    QueryBudgetExceeded instead when settings.QUERY_BUDGET_STRICT is on (as in test runs).
+    Apply it next to the view function, under login_required and the other decorators.
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+
+    return decorator
+
+
+def view_budget(request):
+    match = getattr(request, 'resolver_match', None)
+    # class-based views carry it on the class, function views on the function itself
+    func = getattr(match, 'func', None)
+    return getattr(getattr(func, 'view_class', func), 'query_budget', None)
+
+
+def check_budget(view_name, metrics, budget):
+    """True when the request ran more queries than its view's budget (raising in strict mode)."""
+    if budget is None or metrics.queries <= budget:
+        return False
+
+    message = '%s ran %d queries, over its budget of %d.' % (view_name, metrics.queries, budget)
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+    return True
@@ -0,0 +1,81 @@
+import time
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, override_settings, CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from .generate_data import GENERATED_PREFIX
+from .run_benchmarks import consume, percentile
+
+
+# name -> settings; the first is how sessions, messages and users were loaded before the cache tier
+CONFIGURATIONS = {
+    'db sessions': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.fallback.FallbackStorage',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    },
+    'cached sessions + users': {
+        'SESSION_ENGINE': settings.SESSION_ENGINE,
+        'MESSAGE_STORAGE': settings.MESSAGE_STORAGE,
+        'AUTHENTICATION_BACKENDS': settings.AUTHENTICATION_BACKENDS,
+    },
+}
+
+PAGES = {
+    'expenses-index': '/',
+    'income-index': '/income/',
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare queries per request and latency of the index pages with database-backed sessions and '
+            'users against the cached_db sessions and cached user loader, on the configured cache tier '
+            '(EXPENSES_CACHE). Run "manage.py generate_data" first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type = int, default = 50)
+        parser.add_argument('--user', default = GENERATED_PREFIX + '0')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username = options['user']).first()
+        if user is None:
+            raise CommandError('User %s does not exist; run "manage.py generate_data" first.' % options['user'])
+
+        setup_test_environment(debug = settings.DEBUG)
+        self.stdout.write('%s cache, %s database, %s' % (settings.CACHE_TIER, connection.vendor, user.username))
+        self.stdout.write('%-26s %-16s %8s %9s %9s' % ('configuration', 'page', 'queries', 'p50 ms', 'p95 ms'))
+
+        baseline = {}
+        for name, overrides in CONFIGURATIONS.items():
+            with override_settings(**overrides):
+                # a fresh session, stored by this configuration's engine under its backend
+                client = Client()
+                client.force_login(user)
+                for page, path in PAGES.items():
+                    queries, latencies = self.measure(client, path, options['requests'])
+                    saved = ''
+                    if page in baseline:
+                        saved = '  %d fewer queries' % (baseline[page] - queries)
+                    baseline.setdefault(page, queries)
+                    self.stdout.write('%-26s %-16s %8d %9.1f %9.1f%s' % (
+                        name, page, queries, percentile(latencies, 50), percentile(latencies, 95), saved))
+                client.logout()
+
+    def measure(self, client, path, requests):
+        # warms the page's cached data, so only the per-request session and user work differs
+        consume(client.get(path))
+
+        with CaptureQueriesContext(connection) as captured:
+            consume(client.get(path))
+        # counted now: the next request's request_started signal empties the query log
+        queries = len(captured)
+
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            consume(client.get(path))
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        return queries, latencies
@@ -0,0 +1,87 @@
+import random
+import datetime
+from itertools import islice
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from expenses.models import Category, Expense, ExpenseMonthlyRollup
+from expenses.rollups import rebuild_rollups
+from userincome.models import Source, UserIncome, IncomeMonthlyRollup
+
+
+GENERATED_PREFIX = 'bench_'
+GENERATED_PASSWORD = 'bench-password'
+BATCH_SIZE = 5000
+
+CATEGORIES = ['Food', 'Rent', 'Travel', 'Utilities', 'Coffee', 'Groceries', 'Health', 'Entertainment']
+SOURCES = ['Salary', 'Business', 'Side hustle', 'Interest', 'Gifts']
+WORDS = ['coffee', 'rent', 'train', 'lunch', 'groceries', 'cinema', 'gym', 'books', 'taxi', 'pharmacy', 'salary',
+         'invoice', 'dividend', 'birthday', 'market', 'dinner']
+
+
+def synthetic_records(model, owner, rows, labels, label_field, rng, days):
+    today = datetime.date.today()
+    for i in range(rows):
+        yield model(**{
+            'owner': owner,
+            'amount': '%d.%02d' % (rng.randrange(1, 2000), rng.randrange(100)),
+            'date': today - datetime.timedelta(days = rng.randrange(days)),
+            'description': '%s %s %d' % (rng.choice(WORDS), rng.choice(WORDS), i),
+            label_field: rng.choice(labels),
+        })
+
+
+class Command(BaseCommand):
+    help = ('Create synthetic users with a configurable number of expenses and income rows for benchmarks. '
+            'The same --seed always generates the same data. Users are named %s<n> with password "%s".'
+            % (GENERATED_PREFIX, GENERATED_PASSWORD))
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type = int, default = 5)
+        parser.add_argument('--expenses', type = int, default = 10000, help = 'Expenses per user.')
+        parser.add_argument('--income', type = int, default = 2000, help = 'Income rows per user.')
+        parser.add_argument('--days', type = int, default = 3 * 365, help = 'How far back the dates go.')
+        parser.add_argument('--seed', type = int, default = 42)
+        parser.add_argument('--replace', action = 'store_true', help = 'Delete previously generated users first.')
+
+    def handle(self, *args, **options):
+        existing = User.objects.filter(username__startswith = GENERATED_PREFIX)
+        if existing.exists():
+            if not options['replace']:
+                raise CommandError('Generated users already exist; pass --replace to regenerate them.')
+            existing.delete()
+
+        rng = random.Random(options['seed'])
+        for model, names in ((Category, CATEGORIES), (Source, SOURCES)):
+            missing = set(names) - set(model.objects.values_list('name', flat = True))
+            model.objects.bulk_create([model(name = name) for name in sorted(missing)])
+
+        # one hash for everyone: hashing a password per user would dominate small runs
+        template = User()
+        template.set_password(GENERATED_PASSWORD)
+        User.objects.bulk_create([
+            User(username = '%s%d' % (GENERATED_PREFIX, i), email = '%s%d@example.com' % (GENERATED_PREFIX, i),
+                 password = template.password)
+            for i in range(options['users'])
+        ])
+        owners = list(User.objects.filter(username__startswith = GENERATED_PREFIX).order_by('pk'))
+
+        for owner in owners:
+            with transaction.atomic():
+                for model, rows, labels, label_field in ((Expense, options['expenses'], CATEGORIES, 'category'),
+                                                         (UserIncome, options['income'], SOURCES, 'source')):
+                    records = synthetic_records(model, owner, rows, labels, label_field, rng, options['days'])
+                    # inserted a batch at a time so millions of rows never sit in memory at once
+                    while True:
+                        batch = list(islice(records, BATCH_SIZE))
+                        if not batch:
+                            break
+                        model.objects.bulk_create(batch)
+
+        # bulk_create skips the signals that keep the monthly rollups current
+        owner_ids = [owner.pk for owner in owners]
+        rebuild_rollups(Expense, ExpenseMonthlyRollup, 'category', owner_ids)
+        rebuild_rollups(UserIncome, IncomeMonthlyRollup, 'source', owner_ids)
+
+        self.stdout.write('Generated %d users with %d expenses and %d income rows each.' % (
+            len(owners), options['expenses'], options['income']))
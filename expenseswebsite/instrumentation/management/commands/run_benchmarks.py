@@ -0,0 +1,202 @@
+import json
+import time
+import platform
+import tracemalloc
+import subprocess
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, CaptureQueriesContext
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from .generate_data import GENERATED_PREFIX, GENERATED_PASSWORD
+
+
+def json_post(path, data):
+    return lambda client, user: client.post(path, json.dumps(data), content_type = 'application/json')
+
+
+def nth_page(path, page):
+    """Request for page `page` of a list. Keyset pages have no number, so the page's cursor is found
+    once per user by following the next links from the first page; offset pages take ?page=N."""
+    cursors = {}
+
+    def request(client, user):
+        if settings.LIST_PAGINATION != 'keyset':
+            return client.get('%s?page=%d' % (path, page))
+        if user.pk not in cursors:
+            cursor = None
+            for _ in range(page - 1):
+                response = client.get('%s?cursor=%s' % (path, cursor) if cursor else path)
+                cursor = response.context['page_obj'].next_cursor or cursor
+            cursors[user.pk] = cursor
+        return client.get('%s?cursor=%s' % (path, cursors[user.pk]) if cursors[user.pk] else path)
+
+    return request
+
+
+def login(client, user):
+    return client.post('/authentication/login', {'username': user.username, 'password': GENERATED_PASSWORD})
+
+
+# name -> request(client, user); each runs as the generated user, logged in
+SCENARIOS = {
+    'expenses-index': lambda client, user: client.get('/'),
+    'expenses-index-page-5': nth_page('/', 5),
+    'income-index': lambda client, user: client.get('/income/'),
+    'search-expenses': json_post('/search-expenses', {'searchText': 'coffee'}),
+    'search-income': json_post('/income/search-income', {'searchText': 'salary'}),
+    'category-summary': lambda client, user: client.get('/expense_category_summary?months=6'),
+    'stats-timeseries': lambda client, user: client.get('/stats/timeseries?period=week'),
+    'export-csv': lambda client, user: client.get('/export_csv'),
+    'export-income-csv': lambda client, user: client.get('/income/export_csv'),
+    'export-excel': lambda client, user: client.get('/export_excel'),
+    'export-pdf': lambda client, user: client.get('/export_pdf'),
+    'login-page': lambda client, user: client.get('/authentication/login'),
+    'login': login,
+    'logout': lambda client, user: client.post('/authentication/logout'),
+    'validate-username': json_post('/authentication/validate-username', {'username': 'benchnobody'}),
+    'validate-email': json_post('/authentication/validate-email', {'email': 'bench_nobody@example.com'}),
+}
+
+# run after each request of a scenario, outside the measurement
+AFTER = {
+    'logout': lambda client, user: client.force_login(user),
+}
+
+
+def consume(response):
+    # streamed exports do their work while the body is read
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True,
+                              cwd = settings.BASE_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the main pages, search, summary, exports and auth flows in-process against the '
+            'configured database (set EXPENSES_DB=sqlite to use SQLite instead of PostgreSQL). Reports latency '
+            'percentiles, queries per request and peak Python memory, and can write and compare JSON results. '
+            'Run "manage.py generate_data" first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs = '+', choices = sorted(SCENARIOS), default = list(SCENARIOS))
+        parser.add_argument('--requests', type = int, default = 30, help = 'Measured requests per scenario.')
+        parser.add_argument('--warmup', type = int, default = 3)
+        parser.add_argument('--cold', action = 'store_true', help = 'Clear the cache before every request.')
+        parser.add_argument('--user', default = GENERATED_PREFIX + '0')
+        parser.add_argument('--output', help = 'Write the results to this JSON file.')
+        parser.add_argument('--compare', help = 'JSON results of an earlier run to show the change against.')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username = options['user']).first()
+        if user is None:
+            raise CommandError('User %s does not exist; run "manage.py generate_data" first.' % options['user'])
+
+        # allows the test client's host and keeps emails in memory
+        setup_test_environment(debug = settings.DEBUG)
+        client = Client()
+        client.force_login(user)
+        baseline = self.load_baseline(options['compare'])
+
+        results = {
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'user': user.username,
+            'expenses': user.expense_set.count(),
+            'income': user.userincome_set.count(),
+            'requests': options['requests'],
+            'cold_cache': options['cold'],
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'scenarios': {},
+        }
+
+        self.stdout.write('%s database, %s: %d expenses, %d income rows' % (
+            results['database'], user.username, results['expenses'], results['income']))
+        self.stdout.write('%-22s %9s %9s %9s %9s %8s %10s  %s' % (
+            'scenario', 'mean ms', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'peak MB', 'statuses'))
+
+        for name in options['scenarios']:
+            result = self.run_scenario(name, client, user, options)
+            results['scenarios'][name] = result
+            self.stdout.write('%-22s %9.1f %9.1f %9.1f %9.1f %8.1f %10.2f  %s%s' % (
+                name, result['mean_ms'], result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries'],
+                result['peak_mb'], ' '.join('%s=%d' % item for item in sorted(result['statuses'].items())),
+                self.change(baseline, name, result)))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent = 2)
+            self.stdout.write('Results written to %s' % options['output'])
+
+    def run_scenario(self, name, client, user, options):
+        request, after = SCENARIOS[name], AFTER.get(name, lambda client, user: None)
+        for _ in range(options['warmup']):
+            consume(request(client, user))
+            after(client, user)
+
+        latencies, statuses = [], {}
+        for _ in range(options['requests']):
+            if options['cold']:
+                cache.clear()
+            started = time.perf_counter()
+            response = consume(request(client, user))
+            latencies.append((time.perf_counter() - started) * 1000)
+            after(client, user)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        # counted in a separate request so tracing and query logging do not slow the timed ones; under the
+        # test client async views run their queries on this thread, so the one connection sees them all
+        if options['cold']:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                consume(request(client, user))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        after(client, user)
+
+        latencies.sort()
+        return {
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries': len(queries),
+            'peak_mb': round(peak / (1024 * 1024), 3),
+            'statuses': statuses,
+        }
+
+    def load_baseline(self, path):
+        if not path:
+            return None
+        with open(path, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        self.stdout.write('Comparing with %s (commit %s, %s)' % (path, baseline.get('commit'), baseline.get('database')))
+        return baseline['scenarios']
+
+    def change(self, baseline, name, result):
+        before = (baseline or {}).get(name)
+        if not before:
+            return ''
+        return '  p50 %+.0f%%, queries %+d' % (
+            (result['p50_ms'] / before['p50_ms'] - 1) * 100 if before['p50_ms'] else 0,
+            result['queries'] - before['queries'])
@@ -0,0 +1,123 @@
+import time
+import threading
+from collections import deque
+from contextvars import ContextVar
+
+
+# latencies kept per view for the percentiles on the metrics endpoint
+METRICS_SAMPLE_SIZE = 1000
+
+
+class RequestMetrics:
+    """What one request spent: queries, database time, template rendering time and total latency (ms)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.total_ms = 0.0
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        return 'db;dur=%.1f;desc="%d queries", tpl;dur=%.1f, total;dur=%.1f' % (
+            self.db_ms, self.queries, self.template_ms, self.total_ms)
+
+
+# the metrics of the request being handled; sync_to_async copies the context into its thread,
+# so queries run on behalf of async views are counted too
+current_metrics = ContextVar('current_metrics', default = None)
+
+
+def time_query(execute, sql, params, many, context):
+    """connection.execute_wrapper adding each query to the current request's metrics."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_ms += (time.perf_counter() - started) * 1000
+
+
+def time_template(render):
+    """Run render() and add its duration to the current request's template time."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return render()
+
+    started = time.perf_counter()
+    try:
+        return render()
+    finally:
+        metrics.template_ms += (time.perf_counter() - started) * 1000
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.over_budget = 0
+        self.latencies = deque(maxlen = METRICS_SAMPLE_SIZE)
+
+    def add(self, metrics, over_budget):
+        self.requests += 1
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.db_ms += metrics.db_ms
+        self.template_ms += metrics.template_ms
+        self.over_budget += over_budget
+        self.latencies.append(metrics.total_ms)
+
+    def as_dict(self, budget = None):
+        latencies = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'queries_mean': round(self.queries / self.requests, 2),
+            'queries_max': self.max_queries,
+            'query_budget': budget,
+            'over_budget': self.over_budget,
+            'db_ms_mean': round(self.db_ms / self.requests, 2),
+            'template_ms_mean': round(self.template_ms / self.requests, 2),
+            'latency_ms_p50': round(percentile(latencies, 50), 2),
+            'latency_ms_p95': round(percentile(latencies, 95), 2),
+            'latency_ms_p99': round(percentile(latencies, 99), 2),
+        }
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# per-process totals by view name; each worker of a multi-process server keeps its own
+_stats = {}
+_budgets = {}
+_stats_lock = threading.Lock()
+
+
+def record(view_name, metrics, budget = None, over_budget = False):
+    with _stats_lock:
+        _stats.setdefault(view_name, ViewStats()).add(metrics, over_budget)
+        if budget is not None:
+            _budgets[view_name] = budget
+
+
+def snapshot():
+    with _stats_lock:
+        return {name: stats.as_dict(_budgets.get(name)) for name, stats in sorted(_stats.items())}
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+        _budgets.clear()
@@ -0,0 +1,55 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .budgets import view_budget, check_budget, QueryBudgetExceeded
+from .metrics import RequestMetrics, current_metrics, record
+
+
+class InstrumentationMiddleware:
+    # measures each request's queries, database time, template rendering time and total latency,
+    # adds them to the per-view totals behind /metrics and, when enabled, to a Server-Timing header.
+    # Streamed bodies are produced after the response leaves here, so their queries are not counted.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        budget = view_budget(request)
+
+        try:
+            over_budget = check_budget(view_name, metrics, budget)
+        except QueryBudgetExceeded:
+            record(view_name, metrics, budget, True)
+            raise
+        record(view_name, metrics, budget, over_budget)
+
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
@@ -0,0 +1,11 @@
+from django.dispatch import receiver
+from django.db.backends.signals import connection_created
+from .metrics import time_query
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # installed once per connection rather than per request: the connections used by async views live
+    # in sync_to_async threads, which a wrapper set up by the middleware's own thread would never see
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
@@ -0,0 +1,7 @@
+from . import views
+from django.urls import path
+
+
+urlpatterns = [
+    path('', views.metrics_view, name = "metrics"),
+]
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from . import metrics
+
+
+def metrics_view(request):
+    """Per-view request counts, queries, database/template time and latency percentiles of this process.
+
+    Only answered when settings.METRICS_ENABLED is on, and then only to addresses in
+    settings.METRICS_ALLOWED_IPS; ?reset=1 starts the totals over.
+    """
+    if not settings.METRICS_ENABLED or request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404()
+
+    views = metrics.snapshot()
+    if request.GET.get('reset'):
+        metrics.reset()
+
+    return JsonResponse({'views': views})
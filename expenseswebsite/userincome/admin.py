@@ -1,6 +1,14 @@
 from django.contrib import admin
-from .models import UserIncome, Source
+from .models import UserIncome, Source, RecurringIncome
 
 
-admin.site.register(UserIncome)
-admin.site.register(Source)
\ No newline at end of file
+class UserIncomeAdmin(admin.ModelAdmin):
+
+    def delete_queryset(self, request, queryset):
+        # one at a time, so each delete takes its amount out of the rollups (a queryset delete does not)
+        for income in queryset:
+            income.delete()
+
+admin.site.register(UserIncome, UserIncomeAdmin)
+admin.site.register(Source)
+admin.site.register(RecurringIncome)
\ No newline at end of file
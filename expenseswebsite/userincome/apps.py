@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UserincomeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userincome'
+
+    def ready(self):
+        # registering the signal handlers
+        from . import signals
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+# Trigram indexes let the search view's icontains lookups (UPPER(col) LIKE UPPER('%...%'))
+# use an index on PostgreSQL. Other databases (e.g. SQLite) fall back to a scan.
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS userincome_userincome_description_trgm '
+                          'ON userincome_userincome USING gin (UPPER(description::text) gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS userincome_userincome_source_trgm '
+                          'ON userincome_userincome USING gin (UPPER(source::text) gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS userincome_userincome_description_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS userincome_userincome_source_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
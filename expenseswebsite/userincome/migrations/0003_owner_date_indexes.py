@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0002_search_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', 'source', 'date'], name='income_owner_source_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', '-date', '-id'], include=('amount', 'source'), name='income_list_covering_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncMonth
+
+
+def populate_rollups(apps, schema_editor):
+    # the rollup rebuild as of this migration, on the historical models (not expenses.rollups, which moves on)
+    model = apps.get_model('userincome', 'UserIncome')
+    rollup_model = apps.get_model('userincome', 'IncomeMonthlyRollup')
+    grouped = model.objects.annotate(month = TruncMonth('date')).values('owner_id', 'month', 'source').annotate(
+        total = Sum('amount'), count = Count('id')).order_by()
+    rollup_model.objects.bulk_create([
+        rollup_model(owner_id = row['owner_id'], month = row['month'], total = row['total'], count = row['count'],
+                     source = row['source'])
+        for row in grouped.iterator()
+    ], batch_size = 1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0003_owner_date_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncomeMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('source', models.CharField(max_length=255)),
+                ('total', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'month', 'source'), name='income_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
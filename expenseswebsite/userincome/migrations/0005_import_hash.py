@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0004_monthly_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userincome',
+            name='import_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='userincome',
+            constraint=models.UniqueConstraint(fields=('owner', 'import_hash'), name='income_import_hash_unique'),
+        ),
+    ]
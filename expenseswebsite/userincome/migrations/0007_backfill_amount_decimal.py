@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from django.db import migrations, transaction, models
+from django.db.models.functions import Cast
+
+
+BATCH_SIZE = 5000
+
+
+def backfill_amounts(apps, schema_editor):
+    # expenses.money.convert_amounts as of this migration, on the historical model
+    model = apps.get_model('userincome', 'UserIncome')
+    bounds = model.objects.aggregate(low = models.Min('pk'), high = models.Max('pk'))
+    if bounds['low'] is None:
+        return
+
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        with transaction.atomic():
+            model.objects.filter(pk__gte = start, pk__lt = start + BATCH_SIZE, amount_decimal__isnull = True).update(
+                amount_decimal = Cast('amount', models.DecimalField(max_digits = 14, decimal_places = 2)))
+
+
+class Migration(migrations.Migration):
+    # step 2 of 3: converts in short batches (see the convert_amounts command, which can do this
+    # ahead of time while the site is up); only rows not converted yet are touched here
+    atomic = False
+
+    dependencies = [
+        ('userincome', '0006_amount_decimal'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_amounts, migrations.RunPython.noop),
+    ]
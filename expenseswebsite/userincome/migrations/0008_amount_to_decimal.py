@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from django.db import migrations, models
+from django.db.models import Sum, Count
+from django.db.models.functions import Cast, TruncMonth
+
+
+def catch_up_amounts(apps, schema_editor):
+    # rows old code wrote after the backfill ran still lack a decimal amount; the float column is
+    # about to go, so they are converted here, in the same transaction as the column swap
+    model = apps.get_model('userincome', 'UserIncome')
+    model.objects.filter(amount_decimal__isnull = True).update(
+        amount_decimal = Cast('amount', models.DecimalField(max_digits = 14, decimal_places = 2)))
+
+
+def populate_rollups(apps, schema_editor):
+    # the float running totals are recomputed exactly from the converted amounts (historical models,
+    # not expenses.rollups, which moves on)
+    model = apps.get_model('userincome', 'UserIncome')
+    rollup_model = apps.get_model('userincome', 'IncomeMonthlyRollup')
+    grouped = model.objects.annotate(month = TruncMonth('date')).values('owner_id', 'month', 'source').annotate(
+        total = Sum('amount'), count = Count('id')).order_by()
+    rollup_model.objects.all().delete()
+    rollup_model.objects.bulk_create([
+        rollup_model(owner_id = row['owner_id'], month = row['month'], total = row['total'], count = row['count'],
+                     source = row['source'])
+        for row in grouped.iterator()
+    ], batch_size = 1000)
+
+
+class Migration(migrations.Migration):
+    # step 3 of 3: the decimal column replaces the float one
+
+    dependencies = [
+        ('userincome', '0007_backfill_amount_decimal'),
+    ]
+
+    operations = [
+        migrations.RunPython(catch_up_amounts, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='userincome',
+            name='income_list_covering_idx',
+        ),
+        migrations.RemoveField(
+            model_name='userincome',
+            name='amount',
+        ),
+        migrations.RenameField(
+            model_name='userincome',
+            old_name='amount_decimal',
+            new_name='amount',
+        ),
+        migrations.AlterField(
+            model_name='userincome',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', '-date', '-id'], include=['amount', 'source'], name='income_list_covering_idx'),
+        ),
+        migrations.AlterField(
+            model_name='incomemonthlyrollup',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:27
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0008_amount_to_decimal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringIncome',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('description', models.TextField()),
+                ('source', models.CharField(max_length=255)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('yearly', 'Yearly')], default='monthly', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('start_date', models.DateField(default=django.utils.timezone.now)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('occurrences', models.IntegerField(default=0)),
+                ('next_date', models.DateField(blank=True)),
+                ('active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userincome',
+            name='recurrence_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='userincome',
+            constraint=models.UniqueConstraint(fields=('recurrence_key',), name='income_recurrence_key_unique'),
+        ),
+        migrations.AddField(
+            model_name='recurringincome',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='recurringincome',
+            index=models.Index(condition=models.Q(('active', True)), fields=['next_date', 'owner', 'id'], name='recurring_income_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recurringincome',
+            constraint=models.CheckConstraint(condition=models.Q(('interval__gte', 1)), name='recurring_income_interval_positive'),
+        ),
+    ]
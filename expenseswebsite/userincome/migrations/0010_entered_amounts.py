@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0009_recurring_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userincome',
+            name='entered_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='userincome',
+            name='entered_currency',
+            field=models.CharField(blank=True, default='', max_length=3),
+        ),
+    ]
@@ -1,24 +1,125 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.validators import MinValueValidator
 from django.utils.timezone import now
 from django.contrib.auth.models import User
+from expenses.money import MONEY_MAX_DIGITS, MONEY_DECIMAL_PLACES
+from expenses.rollups import row_deleting
+from expenses.schedules import FREQUENCIES, occurrence_date, schedule_of
 
 
 class UserIncome(models.Model):
-    amount = models.FloatField()
+    amount = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES)
     date = models.DateField(default = now)
     description = models.TextField()
     owner = models.ForeignKey(to = User, on_delete=models.CASCADE)
     source = models.CharField(max_length = 255)
+    # the amount as typed and the currency it was typed in; amount holds it in FX_BASE_CURRENCY at the
+    # rate of the day it was entered, and every total is summed from that
+    entered_amount = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES,
+                                         blank = True, null = True)
+    entered_currency = models.CharField(max_length = 3, blank = True, default = '')
+    # content hash of rows created by a file import, used to skip rows imported before
+    import_hash = models.CharField(max_length = 64, blank = True, null = True)
+    # "<rule id>:<occurrence>" of rows created by a recurring rule, so a re-run cannot create them twice
+    recurrence_key = models.CharField(max_length = 64, blank = True, null = True)
     
     def __str__(self):
         return self.source
     
+    def save(self, *args, **kwargs):
+        # the rollup update runs from post_save: it commits or rolls back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            row_deleting.send(sender = UserIncome, instance = self)
+            return super().delete(*args, **kwargs)
+    
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields = ['owner', 'source', 'date'], name = 'income_owner_source_date_idx'),
+            # walks the list page in order and carries its short columns (PostgreSQL only). description is
+            # left out: it is unbounded, and a btree entry over ~2.7 KB cannot be stored at all
+            models.Index(fields = ['owner', '-date', '-id'], include = ['amount', 'source'],
+                         name = 'income_list_covering_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields = ['owner', 'import_hash'], name = 'income_import_hash_unique'),
+            models.UniqueConstraint(fields = ['recurrence_key'], name = 'income_recurrence_key_unique'),
+        ]
         
         
 class Source(models.Model):
     name = models.CharField(max_length = 255)
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class IncomeMonthlyRollup(models.Model):
+    # running per-user, per-month, per-source totals, kept in step with UserIncome by signals
+    owner = models.ForeignKey(to = User, on_delete=models.CASCADE)
+    month = models.DateField()
+    source = models.CharField(max_length = 255)
+    total = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES, default = 0)
+    count = models.IntegerField(default = 0)
+    
+    def __str__(self):
+        return '%s %s' % (self.month, self.source)
+    
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(fields = ['owner', 'month', 'source'], name = 'income_rollup_unique'),
+        ]
+
+
+class RecurringIncome(models.Model):
+    # salaries, rents received...: materialized into UserIncome rows by "manage.py materialize_recurring"
+    owner = models.ForeignKey(to = User, on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits = MONEY_MAX_DIGITS, decimal_places = MONEY_DECIMAL_PLACES)
+    description = models.TextField()
+    source = models.CharField(max_length = 255)
+    frequency = models.CharField(max_length = 10, choices = FREQUENCIES, default = 'monthly')
+    interval = models.PositiveSmallIntegerField(default = 1, validators = [MinValueValidator(1)])
+    start_date = models.DateField(default = now)
+    end_date = models.DateField(blank = True, null = True)
+    # occurrences materialized so far, and the date of the next one
+    occurrences = models.IntegerField(default = 0)
+    next_date = models.DateField(blank = True)
+    active = models.BooleanField(default = True)
+    
+    # start_date, frequency and interval as last loaded or saved
+    loaded_schedule = None
+    
+    def __str__(self):
+        return '%s (%s)' % (self.description, self.frequency)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        rule = super().from_db(db, field_names, values)
+        rule.loaded_schedule = schedule_of(rule)
+        return rule
+    
+    def save(self, *args, **kwargs):
+        # next_date is derived: set from the schedule when the rule is created, and recomputed when its
+        # start, frequency or interval are edited (past the occurrences already materialized)
+        if self.next_date is None or schedule_of(self) != self.loaded_schedule:
+            self.next_date = occurrence_date(self.start_date, self.frequency, self.interval, self.occurrences)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'next_date'}
+        super().save(*args, **kwargs)
+        self.loaded_schedule = schedule_of(self)
+    
+    class Meta:
+        indexes = [
+            # the materializer's scan: due rules, oldest first and each user's together
+            models.Index(fields = ['next_date', 'owner', 'id'], condition = models.Q(active = True),
+                         name = 'recurring_income_due_idx'),
+        ]
+        constraints = [
+            # an interval of 0 would repeat the same date forever
+            models.CheckConstraint(condition = models.Q(interval__gte = 1), name = 'recurring_income_interval_positive'),
+        ]
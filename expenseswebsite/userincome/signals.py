@@ -0,0 +1,53 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_init, pre_save, post_save
+from .models import UserIncome, IncomeMonthlyRollup
+from expenses.pagination import invalidate_count
+from expenses.versions import bump_data_version
+from expenses.rollups import snapshot, new_deltas, add_delta, apply_deltas, row_deleting
+
+
+def income_changed(owner_id):
+    invalidate_count('income', owner_id)
+    bump_data_version(owner_id)
+
+
+@receiver(post_init, sender = UserIncome)
+def remember_loaded_values(sender, instance, **kwargs):
+    # what the row looked like when loaded, so an edit can move its amount between rollup rows
+    instance._rollup_snapshot = snapshot(instance, 'source')
+
+
+@receiver(pre_save, sender = UserIncome)
+@receiver(row_deleting, sender = UserIncome)
+def load_previous_values(sender, instance, **kwargs):
+    # instances loaded with deferred fields have no snapshot; read the stored row before it changes
+    if instance.pk is not None and instance._rollup_snapshot is None:
+        instance._rollup_snapshot = UserIncome.objects.filter(pk = instance.pk).values(
+            'owner_id', 'date', 'amount', 'source').first()
+
+
+@receiver(post_save, sender = UserIncome)
+def income_saved(sender, instance, created, **kwargs):
+    deltas = new_deltas()
+    previous = None if created else instance._rollup_snapshot
+    
+    if previous:
+        add_delta(deltas, UserIncome, 'source', previous, -1)
+    # deferred fields are not written by save(), so read them back from the row
+    current = snapshot(instance, 'source') or UserIncome.objects.filter(pk = instance.pk).values(
+        'owner_id', 'date', 'amount', 'source').first()
+    add_delta(deltas, UserIncome, 'source', current, 1)
+    apply_deltas(IncomeMonthlyRollup, 'source', deltas)
+    
+    instance._rollup_snapshot = current
+    income_changed(current['owner_id'])
+
+
+@receiver(row_deleting, sender = UserIncome)
+def income_deleted(sender, instance, **kwargs):
+    # registered after load_previous_values, so the snapshot is there
+    deltas = new_deltas()
+    add_delta(deltas, UserIncome, 'source', instance._rollup_snapshot, -1)
+    apply_deltas(IncomeMonthlyRollup, 'source', deltas)
+    
+    income_changed(instance._rollup_snapshot['owner_id'])
@@ -1,3 +1,91 @@
-from django.test import TestCase
+import json
+import datetime
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.core.exceptions import ValidationError
+from django.contrib.auth.models import User
+from userpreferences.models import UserPreference
+from expenses.tests import create_records, fresh_rollups, stored_rollups
+from .models import UserIncome, IncomeMonthlyRollup, RecurringIncome
 
-# Create your tests here.
+
+@override_settings(QUERY_BUDGET_STRICT = True)
+class QueryBudgetTests(TestCase):
+    # in strict mode going over a view's query_budget raises QueryBudgetExceeded out of the test client
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budgets', 'budgets@example.com', 'budgets-password')
+        UserPreference.objects.create(user = cls.user, currency = 'EUR - Euro')
+        create_records(cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_index(self):
+        page = self.get('/income/?per_page=10').context['page_obj']
+        self.get('/income/?per_page=10&cursor=%s' % page.next_cursor)
+
+    def test_search(self):
+        response = self.client.post('/income/search-income', json.dumps({'searchText': 'income'}),
+                                    content_type = 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json())
+
+    def test_export_csv(self):
+        self.assertIn(b'income 29', b''.join(self.get('/income/export_csv').streaming_content))
+
+
+class RollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('rollups', 'rollups@example.com', 'rollups-password')
+        create_records(cls.user, count = 10)
+
+    def assertRollupsMatch(self):
+        self.assertEqual(stored_rollups(IncomeMonthlyRollup, 'source', self.user),
+                         fresh_rollups(UserIncome, 'source', self.user))
+
+    def test_create_move_and_delete(self):
+        income = UserIncome.objects.create(owner = self.user, amount = '1500', date = datetime.date(2024, 1, 31),
+                                           source = 'Salary', description = 'January')
+        self.assertRollupsMatch()
+
+        income.amount, income.date, income.source = '1600', datetime.date(2024, 2, 1), 'Bonus'
+        income.save()
+        self.assertRollupsMatch()
+
+        UserIncome.objects.only('id').get(pk = income.pk).delete()
+        self.assertRollupsMatch()
+
+
+class RecurringRuleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recurring', 'recurring@example.com', 'recurring-password')
+
+    def test_zero_interval_is_rejected(self):
+        rule = RecurringIncome(owner = self.user, amount = '5000', description = 'Salary', source = 'Salary', interval = 0)
+        with self.assertRaises(ValidationError):
+            rule.full_clean()
+        with self.assertRaises(IntegrityError):
+            rule.save()
+
+    def test_next_date_recomputed_when_schedule_changes(self):
+        rule = RecurringIncome.objects.create(owner = self.user, amount = '5000', description = 'Salary', source = 'Salary',
+                                              start_date = datetime.date(2024, 1, 15))
+        self.assertEqual(rule.next_date, datetime.date(2024, 1, 15))
+
+        rule = RecurringIncome.objects.get(pk = rule.pk)
+        rule.frequency = 'yearly'
+        rule.start_date = datetime.date(2024, 2, 29)
+        rule.save()
+        rule.refresh_from_db()
+        self.assertEqual(rule.next_date, datetime.date(2024, 2, 29))
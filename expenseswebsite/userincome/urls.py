@@ -6,7 +6,10 @@ from django.views.decorators.csrf import csrf_exempt
 urlpatterns = [
     path('', views.index, name = "income"),
     path('add-income', views.add_income, name = "add-income"),
+    path('import-income', views.import_income, name = "import-income"),
     path('edit-income/<int:id>', views.income_edit, name = "income-edit"),    
     path('income-delete/<int:id>', views.delete_income, name = "income-delete"), 
+    path('bulk-income', views.bulk_income, name = "bulk-income"),
     path('search-income', csrf_exempt(views.search_income), name = "search_income"),  
+    path('export_csv', views.export_csv, name = "export-income-csv"),
 ]
\ No newline at end of file
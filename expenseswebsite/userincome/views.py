@@ -1,46 +1,85 @@
 import json
+import datetime
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.http import JsonResponse
 from .models import Source, UserIncome
-from django.core.paginator import Paginator
-from django.shortcuts import render, redirect
-from userpreferences.models import UserPreference
+from expenses.money import to_money
+from expenses.search import search_queryset
+from expenses.bulk import apply_bulk
+from expenses.decorators import async_login_required
+from expenses.importers import import_records, read_rows, ImportFileError
+from expenses.pagination import paginate, PAGE_SIZES
+from expenses.exports import stream_csv, export_cache_key, EXPORT_CHUNK_SIZE
+from expenses.versions import revalidate
+from django.shortcuts import render, redirect, get_object_or_404
+from userpreferences.fx import rate_table, display_currency, currency_label, convert_objects, convert_rows, convert_stream
 from django.contrib.auth.decorators import login_required
+from instrumentation.budgets import query_budget
 
 
-def search_income(request):
+@async_login_required
+@query_budget(4)
+async def search_income(request):
     if request.method == 'POST':
-        search_str = json.loads(request.body).get('searchText')
+        data = json.loads(request.body)
         
-        income = UserIncome.objects.filter(
-                   amount__istartswith = search_str, owner = request.user) | UserIncome.objects.filter(
-                   date__istartswith = search_str, owner = request.user) | UserIncome.objects.filter(
-                   description__icontains = search_str, owner = request.user) | UserIncome.objects.filter(
-                   source__icontains = search_str, owner = request.user) 
+        code = await sync_to_async(display_currency)(request.user_preferences)
         
-        data = income.values()
-        return JsonResponse(list(data), safe = False)
+        income = search_queryset(UserIncome.objects.filter(owner = request.user), data.get('searchText'),
+                                 ['description', 'source'], data.get('limit'), data.get('offset'), code)
+        
+        return JsonResponse(convert_rows([row async for row in income], 'amount', code), safe = False)
 
 
 @login_required(login_url = '/authentication/login')
+@revalidate(pages = True)
+@query_budget(5)
 def index(request):
-    categories = Source.objects.all()
     income = UserIncome.objects.filter(owner = request.user)
-    paginator = Paginator(income, 10)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
-    if UserPreference.objects.filter(user = request.user).exists():
-        currency = UserPreference.objects.get(user = request.user).currency
-    else:
-        currency = 'United States Dollar'
+    page_obj = paginate(request, income, 'income')
+    code = display_currency(request.user_preferences)
+    # every amount on the page is converted in one step
+    page_obj.object_list = convert_objects(page_obj.object_list, 'amount', code)
     context = {
-        'income': income,
         'page_obj': page_obj,
-        'currency': currency,
+        'page_sizes': PAGE_SIZES,
+        'has_records': bool(page_obj.object_list) or page_obj.has_previous(),
+        'currency': currency_label(code),
     }
     return render(request, 'income/index.html', context)
 
 
+@login_required(login_url = '/authentication/login')
+def import_income(request):
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        
+        if not upload:
+            messages.error(request, 'Please choose a CSV or Excel file to import.')
+            return redirect('income')
+        
+        try:
+            result = import_records('income', request.user, read_rows(upload, upload.name, 'Income'),
+                                    currency = display_currency(request.user_preferences))
+        except ImportFileError as ex:
+            if request.GET.get('format') == 'json':
+                return JsonResponse({'error': str(ex)}, status = 400)
+            messages.error(request, str(ex))
+            return redirect('income')
+        
+        if request.GET.get('format') == 'json':
+            return JsonResponse(result.as_dict())
+        
+        messages.success(request, 'Imported %d records (%d duplicates skipped).' % (result.created, result.duplicates))
+        
+        # only the first few problems are shown; the JSON format lists them all
+        for row, error in result.errors[:5]:
+            messages.error(request, 'Row %d: %s' % (row, error))
+            
+    return redirect('income')
+
+
 @login_required(login_url = '/authentication/login')
 def add_income(request):
     sources = Source.objects.all()
@@ -60,6 +99,13 @@ def add_income(request):
             messages.error(request, 'Please enter an amount.')
             return render(request, 'income/add_income.html', context)
         
+        # amounts are typed in the user's currency, and kept as typed alongside their base currency value
+        try:
+            amounts = rate_table().entered(amount, display_currency(request.user_preferences))
+        except ValueError:
+            messages.error(request, 'Please enter a valid amount.')
+            return render(request, 'income/add_income.html', context)
+        
         # obtain the description
         description = request.POST['description']        
         
@@ -73,15 +119,18 @@ def add_income(request):
         # obtain the source
         source = request.POST['source']
         
-        UserIncome.objects.create(owner = request.user, amount = amount, date = date, source = source, description = description)
+        UserIncome.objects.create(owner = request.user, date = date, source = source, description = description, **amounts)
         messages.success(request, 'Record has been created successfully!')
         return redirect('income')
 
 
 @login_required(login_url = '/authentication/login')
 def income_edit(request, id):
-    income = UserIncome.objects.get(pk = id)
+    income = get_object_or_404(UserIncome, pk = id, owner = request.user)
     sources = Source.objects.all()
+    # the form shows (and takes) the amount in the user's currency
+    code = display_currency(request.user_preferences)
+    convert_objects([income], 'amount', code)
     context = {
         'income': income,
         'values': income,
@@ -97,6 +146,15 @@ def income_edit(request, id):
             messages.error(request, 'Please enter an amount.')
             return render(request, 'income/edit_income.html', context)
         
+        try:
+            # the form shows the amount as typed (or converted, if it was typed in another currency);
+            # it is only stored again, at today's rate, when the user changed it
+            entered = to_money(amount)
+            amounts = {} if entered == income.display_amount else rate_table().entered(entered, code)
+        except ValueError:
+            messages.error(request, 'Please enter a valid amount.')
+            return render(request, 'income/edit_income.html', context)
+        
         # obtain the description
         description = request.POST['description']        
         
@@ -110,19 +168,55 @@ def income_edit(request, id):
         # obtain the category
         source = request.POST['source']
         
-        # Updating expense
-        income.owner = request.user
-        income.amount = amount
-        income.date = date
-        income.source = source
-        income.description = description
-        income.save()
+        # only the columns that changed are written (and a save is skipped when nothing did)
+        values = dict(amounts, **{
+            'date': UserIncome._meta.get_field('date').to_python(date),
+            'source': source,
+            'description': description,
+        })
+        changed = [field for field, value in values.items() if getattr(income, field) != value]
+        for field in changed:
+            setattr(income, field, values[field])
+        if changed:
+            income.save(update_fields = changed)
         messages.success(request, 'Record has been updated successfully!')
         return redirect('income')
     
     
+@login_required(login_url = '/authentication/login')
 def delete_income(request, id):
-    income = UserIncome.objects.get(pk = id)
+    income = get_object_or_404(UserIncome, pk = id, owner = request.user)
     income.delete()
     messages.success(request, 'Record deleted!')
-    return redirect('income')
\ No newline at end of file
+    return redirect('income')
+
+
+@async_login_required
+async def bulk_income(request):
+    # {"action": "delete" | "update", "ids": [...] or "filter": {...}, "changes": {...}}, applied in one statement
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Use POST.'}, status = 405)
+    
+    try:
+        data = json.loads(request.body)
+        code = await sync_to_async(display_currency)(request.user_preferences)
+        result = await sync_to_async(apply_bulk)('income', request.user, data, code)
+    except ValueError as ex:
+        return JsonResponse({'error': str(ex)}, status = 400)
+    
+    return JsonResponse(result)
+
+
+@login_required(login_url = '/authentication/login')
+@revalidate
+@query_budget(3)
+def export_csv(request):
+    filename = 'Income' + str(datetime.datetime.now()) + '.csv'
+    
+    code = display_currency(request.user_preferences)
+    rows = UserIncome.objects.filter(owner = request.user).values_list(
+        'amount', 'description', 'source', 'date', 'entered_amount', 'entered_currency'
+    ).iterator(chunk_size = EXPORT_CHUNK_SIZE)
+    
+    return stream_csv(filename, ['Amount (%s)' % code, 'Description', 'Source', 'Date'], convert_stream(rows, 0, code),
+                      compress = request.GET.get('gzip') == '1', cache_key = export_cache_key(request, 'income_csv'))
\ No newline at end of file
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UserpreferencesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userpreferences'
+
+    def ready(self):
+        # registering the signal handlers and parsing the currency table once at startup
+        from . import signals, currencies
@@ -0,0 +1,20 @@
+import os
+import json
+from types import MappingProxyType
+from collections import namedtuple
+from django.conf import settings
+
+
+Currency = namedtuple('Currency', ['name', 'value'])
+
+
+def load_currencies():
+    file_path = os.path.join(settings.BASE_DIR, 'currencies.json')
+    
+    with open(file_path, 'r') as json_file:
+        return json.load(json_file)
+
+
+# parsed once when the module is first imported; read-only from then on
+CURRENCIES = MappingProxyType(load_currencies())
+CURRENCY_LIST = tuple(Currency(k, v) for k, v in CURRENCIES.items())
@@ -0,0 +1,157 @@
+import os
+import json
+import math
+import threading
+from array import array
+from decimal import Decimal
+from itertools import islice
+from django.conf import settings
+from .currencies import CURRENCIES
+from expenses.money import np, to_money, cents_to_money
+
+
+# rows converted per vectorized step when streaming exports
+FX_BATCH_SIZE = 2000
+
+# every currency code gets a fixed slot in the rate array, in currencies.json order
+CURRENCY_CODES = tuple(CURRENCIES)
+CURRENCY_INDEX = {code: i for i, code in enumerate(CURRENCY_CODES)}
+
+
+class RateTable:
+    """Exchange rates of every known currency, held as one array of doubles indexed by currency code.
+
+    rates[CURRENCY_INDEX[code]] is the price of one unit of the table's base currency in `code`;
+    currencies missing from the rate file hold NaN and cannot be converted to.
+    """
+
+    def __init__(self, base, rates, as_of = None, version = None):
+        self.base = base
+        self.as_of = as_of
+        # changes whenever the rate file does; part of the ETag of every converted response
+        self.version = version
+        self.rates = array('d', [math.nan]) * len(CURRENCY_CODES)
+        for code, rate in rates.items():
+            if code in CURRENCY_INDEX:
+                self.rates[CURRENCY_INDEX[code]] = float(rate)
+
+    def rate(self, code):
+        index = CURRENCY_INDEX.get(code)
+        return math.nan if index is None else self.rates[index]
+
+    def has(self, code):
+        return not math.isnan(self.rate(code))
+
+    def factor(self, code, source = None):
+        """Multiplier turning an amount in `source` (default: the stored amounts' currency) into `code`."""
+        return self.rate(code) / self.rate(source or settings.FX_BASE_CURRENCY)
+
+    def convert(self, amounts, code, source = None):
+        """Convert a sequence of amounts from `source` (default: stored amounts) into `code` in one step.
+
+        Amounts are normally Decimals; anything else (an aggregate's 0, a float) goes through to_money.
+        """
+        amounts = [amount if isinstance(amount, Decimal) else to_money(amount) for amount in amounts]
+        factor = self.factor(code, source)
+        if factor == 1 or not amounts:
+            return amounts
+
+        cents = [int(amount.scaleb(2)) for amount in amounts]
+        if np is not None:
+            # multiplied as float64 and rounded back to whole cents in one pass over the batch
+            converted = np.rint(np.asarray(cents, dtype = np.int64) * factor).astype(np.int64).tolist()
+        else:
+            converted = [round(value * factor) for value in cents]
+
+        return [cents_to_money(value) for value in converted]
+
+    def to_base(self, amount, code):
+        """An amount typed in `code` in the base currency, at today's rate (ValueError if it is not an amount)."""
+        return self.convert([to_money(amount)], settings.FX_BASE_CURRENCY, code)[0]
+
+    def entered(self, amount, code):
+        """Field values storing an amount typed in `code`: as typed, and in the base currency at today's rate."""
+        amount = to_money(amount)
+        return {'amount': self.to_base(amount, code), 'entered_amount': amount, 'entered_currency': code}
+
+
+_table = None
+_table_mtime = None
+_table_lock = threading.Lock()
+
+
+def load_rate_table(path):
+    with open(path, 'r') as rates_file:
+        data = json.load(rates_file)
+    return RateTable(data['base'], data['rates'], data.get('as_of'), os.stat(path).st_mtime)
+
+
+def rate_table():
+    """The rate table from settings.FX_RATES_FILE, parsed once and reloaded when the file changes."""
+    global _table, _table_mtime
+
+    path = settings.FX_RATES_FILE
+    mtime = os.stat(path).st_mtime
+    if mtime != _table_mtime:
+        with _table_lock:
+            if mtime != _table_mtime:
+                _table, _table_mtime = load_rate_table(path), mtime
+    return _table
+
+
+def display_currency(preferences):
+    """Currency code amounts are shown in: the preferred one when it has a rate, else the base currency."""
+    # preferences store "EUR - Euro"
+    code = str(getattr(preferences, 'currency', None) or '').split(' - ')[0].strip()
+    return code if rate_table().has(code) else settings.FX_BASE_CURRENCY
+
+
+def currency_label(code):
+    return '%s - %s' % (code, CURRENCIES.get(code, code))
+
+
+def as_entered(converted, entered_amount, entered_currency, code):
+    # a row shown in the currency it was typed in shows what was typed, not a round trip through the
+    # base currency at today's rate
+    return entered_amount if entered_currency == code and entered_amount is not None else converted
+
+
+def convert_objects(objects, attr, code, target = 'display_amount'):
+    """Set obj.<target> on each model instance to its <attr> converted into code; returns the list.
+
+    Records typed in code (entered_amount / entered_currency) get their typed amount instead.
+    """
+    objects = list(objects)
+    for obj, amount in zip(objects, rate_table().convert([getattr(obj, attr) for obj in objects], code)):
+        setattr(obj, target, as_entered(amount, getattr(obj, 'entered_amount', None),
+                                         getattr(obj, 'entered_currency', None), code))
+    return objects
+
+
+def convert_rows(rows, key, code):
+    """Convert the amount under rows[i][key] in place for a list of dicts; returns rows.
+
+    entered_amount and entered_currency, when the rows carry them, are used as in convert_objects and removed.
+    """
+    for row, amount in zip(rows, rate_table().convert([row[key] for row in rows], code)):
+        row[key] = as_entered(amount, row.pop('entered_amount', None), row.pop('entered_currency', None), code)
+    return rows
+
+
+def convert_mapping(mapping, code):
+    return dict(zip(mapping, rate_table().convert(list(mapping.values()), code)))
+
+
+def convert_stream(rows, position, code, batch_size = FX_BATCH_SIZE):
+    """Lazily convert column `position` of an iterator of tuples, a batch at a time (for streamed exports).
+
+    Each tuple ends with entered_amount and entered_currency, which are used as in convert_objects and dropped.
+    """
+    table = rate_table()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        for row, amount in zip(batch, table.convert([row[position] for row in batch], code)):
+            yield row[:position] + (as_entered(amount, row[-2], row[-1], code),) + row[position + 1:-2]
@@ -0,0 +1,51 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from .models import UserPreference
+
+
+PREFERENCE_CACHE_TIMEOUT = 60 * 60
+
+
+def preference_cache_key(user_id):
+    return 'user_preference_%s' % user_id
+
+
+def load_preferences(user):
+    """The user's UserPreference, or an unsaved one if they have not picked anything yet."""
+    if not user.is_authenticated:
+        return None
+    
+    key = preference_cache_key(user.pk)
+    preferences = cache.get(key)
+    
+    if preferences is None:
+        preferences = UserPreference.objects.filter(user_id = user.pk).first() or UserPreference(user_id = user.pk)
+        cache.set(key, preferences, PREFERENCE_CACHE_TIMEOUT)
+        
+    return preferences
+
+
+def invalidate_preferences(user_id):
+    cache.delete(preference_cache_key(user_id))
+
+
+class UserPreferenceMiddleware:
+    # exposes request.user_preferences, loaded (at most once) the first time a view reads it.
+    # Works in both modes so async views under ASGI are not pushed through a thread by this middleware.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.user_preferences = SimpleLazyObject(lambda: load_preferences(request.user))
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
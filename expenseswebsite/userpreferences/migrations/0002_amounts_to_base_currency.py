@@ -0,0 +1,121 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:40
+
+import json
+import datetime
+from decimal import Decimal, ROUND_HALF_EVEN
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncMonth
+
+
+BATCH_SIZE = 1000
+CENT = Decimal('0.01')
+
+
+def base_factors(apps):
+    """Owner id -> (currency code, Decimal turning the amounts they typed into the base currency).
+
+    Owners whose preference is the base currency, or a currency without a rate (shown in the base
+    currency all along), are left out.
+    """
+    with open(settings.FX_RATES_FILE, 'r') as rates_file:
+        data = json.load(rates_file)
+    rates = {code: Decimal(str(rate)) for code, rate in data['rates'].items()}
+    rates[data['base']] = Decimal('1')
+
+    preference_model = apps.get_model('userpreferences', 'UserPreference')
+    factors = {}
+    for owner_id, currency in preference_model.objects.exclude(currency = None).values_list('user_id', 'currency'):
+        # preferences store "EUR - Euro"
+        code = currency.split(' - ')[0].strip()
+        if code != settings.FX_BASE_CURRENCY and rates.get(code) and settings.FX_BASE_CURRENCY in rates:
+            factors[owner_id] = (code, rates[settings.FX_BASE_CURRENCY] / rates[code])
+    return factors
+
+
+def convert_amounts(model, owner_id, code, factor):
+    # what was typed is kept next to the converted amount, which is what the reverse restores
+    rows = list(model.objects.filter(owner_id = owner_id, entered_amount = None).only('id', 'amount'))
+    for row in rows:
+        row.entered_amount, row.entered_currency = row.amount, code
+        row.amount = (row.amount * factor).quantize(CENT, ROUND_HALF_EVEN)
+    model.objects.bulk_update(rows, ['amount', 'entered_amount', 'entered_currency'], batch_size = BATCH_SIZE)
+
+
+def restore_amounts(model, owner_id):
+    rows = list(model.objects.filter(owner_id = owner_id).exclude(entered_amount = None).only('id', 'entered_amount'))
+    for row in rows:
+        row.amount, row.entered_amount, row.entered_currency = row.entered_amount, None, ''
+    model.objects.bulk_update(rows, ['amount', 'entered_amount', 'entered_currency'], batch_size = BATCH_SIZE)
+
+
+def rebuild_rollups(model, rollup_model, group_field, owner_id):
+    grouped = model.objects.filter(owner_id = owner_id).annotate(month = TruncMonth('date')).values(
+        'month', group_field).annotate(total = Sum('amount'), count = Count('id')).order_by()
+    rollup_model.objects.filter(owner_id = owner_id).delete()
+    rollup_model.objects.bulk_create([
+        rollup_model(owner_id = owner_id, month = row['month'], total = row['total'], count = row['count'],
+                     **{group_field: row[group_field]})
+        for row in grouped.iterator()
+    ], batch_size = BATCH_SIZE)
+
+
+def recount_budgets(apps, owner_id):
+    # budget amounts were always entered in the base currency; only their spend comes from the expenses
+    budget_model = apps.get_model('expenses', 'Budget')
+    rollup_model = apps.get_model('expenses', 'ExpenseMonthlyRollup')
+    for budget in budget_model.objects.filter(owner_id = owner_id):
+        start = budget.period_start
+        if budget.period == 'yearly':
+            end = start.replace(year = start.year + 1)
+        else:
+            end = (start + datetime.timedelta(days = 32)).replace(day = 1)
+        budget.spent = rollup_model.objects.filter(owner_id = owner_id, category = budget.category, month__gte = start,
+                                                   month__lt = end).aggregate(total = Sum('total'))['total'] or 0
+        budget.save(update_fields = ['spent'])
+
+
+def rebuild_totals(apps, owner_id):
+    expense_model = apps.get_model('expenses', 'Expense')
+    income_model = apps.get_model('userincome', 'UserIncome')
+    rebuild_rollups(expense_model, apps.get_model('expenses', 'ExpenseMonthlyRollup'), 'category', owner_id)
+    rebuild_rollups(income_model, apps.get_model('userincome', 'IncomeMonthlyRollup'), 'source', owner_id)
+    recount_budgets(apps, owner_id)
+
+
+def amounts_to_base_currency(apps, schema_editor):
+    # amounts used to be stored as typed, in each user's preferred currency; since conversion was
+    # added they are summed in FX_BASE_CURRENCY, so existing rows of users with another currency get
+    # a base amount at the rates of the day this runs, and keep what was typed in entered_amount
+    # (historical models throughout)
+    for owner_id, (code, factor) in base_factors(apps).items():
+        convert_amounts(apps.get_model('expenses', 'Expense'), owner_id, code, factor)
+        convert_amounts(apps.get_model('userincome', 'UserIncome'), owner_id, code, factor)
+        rebuild_totals(apps, owner_id)
+
+
+def amounts_as_entered(apps, schema_editor):
+    # back to storing amounts as typed; the owners are the ones holding an entered amount, however
+    # their preference changed since
+    expense_model = apps.get_model('expenses', 'Expense')
+    income_model = apps.get_model('userincome', 'UserIncome')
+    owners = set(expense_model.objects.exclude(entered_amount = None).values_list('owner_id', flat = True))
+    owners.update(income_model.objects.exclude(entered_amount = None).values_list('owner_id', flat = True))
+    for owner_id in owners:
+        restore_amounts(expense_model, owner_id)
+        restore_amounts(income_model, owner_id)
+        rebuild_totals(apps, owner_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userpreferences', '0001_initial'),
+        ('expenses', '0012_entered_amounts'),
+        ('userincome', '0010_entered_amounts'),
+    ]
+
+    operations = [
+        migrations.RunPython(amounts_to_base_currency, amounts_as_entered),
+    ]
@@ -0,0 +1,13 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from .models import UserPreference
+from .middleware import invalidate_preferences
+from expenses.versions import bump_data_version
+
+
+@receiver(post_save, sender = UserPreference)
+@receiver(post_delete, sender = UserPreference)
+def preference_changed(sender, instance, **kwargs):
+    invalidate_preferences(instance.user_id)
+    # amounts are shown in the preferred currency, so cached responses are out of date too
+    bump_data_version(instance.user_id)
@@ -1,3 +1,23 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from .models import UserPreference
 
-# Create your tests here.
+
+@override_settings(QUERY_BUDGET_STRICT = True)
+class QueryBudgetTests(TestCase):
+    # in strict mode going over a view's query_budget raises QueryBudgetExceeded out of the test client
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budgets', 'budgets@example.com', 'budgets-password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_index(self):
+        self.assertEqual(self.client.get('/preferences/').status_code, 200)
+
+    def test_save(self):
+        response = self.client.post('/preferences/', {'currency': 'EUR - Euro'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserPreference.objects.get(user = self.user).currency, 'EUR - Euro')
@@ -1,36 +1,31 @@
 from django.shortcuts import render
-from django.conf import settings
-from .models import UserPreference
 from django.contrib import messages
-import os, json
+from .currencies import CURRENCY_LIST
+from .fx import display_currency, currency_label
+from django.contrib.auth.decorators import login_required
+from instrumentation.budgets import query_budget
 
 
+@login_required(login_url = '/authentication/login')
+@query_budget(3)
 def index(request):
-    currency_data = []
-    file_path = os.path.join(settings.BASE_DIR, 'currencies.json')
-
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file)
-        for k, v in data.items():
-            currency_data.append({'name': k, 'value': v})
-
-    exists = UserPreference.objects.filter(user=request.user).exists()
-    user_preferences = None
+    user_preferences = request.user_preferences
     
-    if exists:
-        user_preferences = UserPreference.objects.get(user=request.user)
     if request.method == 'GET':
-        return render(request, 'preferences/index.html', {'currencies': currency_data,
+        return render(request, 'preferences/index.html', {'currencies': CURRENCY_LIST,
                                                           'user_preferences': user_preferences})
     else:
         currency = request.POST['currency']
         
-        if exists:
-            user_preferences.currency = currency
-            user_preferences.save()
-        else:
-            UserPreference.objects.create(user=request.user, currency=currency)
+        # saves the existing preferences, or creates them the first time
+        user_preferences.currency = currency
+        user_preferences.save()
             
         messages.success(request, 'Changes saved')
-        return render(request, 'preferences/index.html', {'currencies': currency_data,
-                                                        'user_preferences': user_preferences})
\ No newline at end of file
+        
+        code = display_currency(user_preferences)
+        if not currency.startswith(code):
+            messages.warning(request, 'There is no exchange rate for this currency yet, so amounts are shown in %s.'
+                             % currency_label(code))
+        return render(request, 'preferences/index.html', {'currencies': CURRENCY_LIST,
+                                                        'user_preferences': user_preferences})